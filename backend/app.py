@@ -1,8 +1,23 @@
-from flask import Flask, request, jsonify
-import config, uuid, mysql.connector, hashlib
-from mysql.connector import errorcode
+from flask import Flask, request, jsonify, Response, stream_with_context
+import config, hashlib, time, random, json, base64, csv, io, atexit
 from functools import wraps
 from datetime import datetime, timedelta
+from connectionPool import ConnectionPool
+from auth import CredentialCache, TokenRevocations, issueToken, verifyToken, isUsableSecret, minimumSecretLength
+from componentRegistry import ComponentRegistry
+from codeFreezeTimeline import CodeFreezeTimeline, MidnightScheduler
+from storage import createStorage
+from events import EventHub, formatEvent
+from queueCache import QueueCache
+from ids import newID
+from passwords import PasswordHasher
+from queueStats import waitBucket, buildReport
+from releaseModel import ReleaseModel
+from bus import createBus
+from journal import Journal
+from historyWriter import HistoryWriter
+from queueStore import queueColumns, rankEntries
+from metrics import Histogram, RequestMetrics, InstrumentedCursor, renderGauges, latencyBuckets, queryBuckets
 
 app = Flask(__name__)
 
@@ -14,49 +29,77 @@ def p(p):
     print(p)
 
 
-""" Wrapped method to setup endpoint """
+""" Wrapped method to setup endpoint. Leases a connection from the pool and always hands it back once the endpoint returns. The cursor is instrumented, and the route's time, database time, statement count and connection wait are recorded for /metrics """
 def getStarted(f):
     @wraps(f)
     def getSetUp(*args, **kwargs):
 
-        db = create_db_connection()
-        cursor = db.cursor()
+        started = time.perf_counter()
+        requestMetrics = RequestMetrics(request.url_rule.rule if request.url_rule else f.__name__, config.slowQuerySeconds)
+
+        db = pool.acquire()
+        acquired = time.perf_counter()
+        cursor = InstrumentedCursor(db.cursor(), requestMetrics) if db else False
 
-        return f(db, cursor, *args, **kwargs)
+        try:
+            return f(db, cursor, *args, **kwargs)
+        finally:
+            if db:
+                db.close()
+            recordRequest(requestMetrics, acquired - started, time.perf_counter() - started)
     return getSetUp
 
 
-""" Method to create connection with the database. Returns the database connection if successful. Returns False if there is an error and prints the error """
+requestSeconds = Histogram("mqapi_request_seconds", "Time spent handling a request, including waiting for a connection.", "route", latencyBuckets)
+requestDBSeconds = Histogram("mqapi_request_db_seconds", "Time spent executing statements and fetching rows per request.", "route", latencyBuckets)
+requestQueries = Histogram("mqapi_request_queries", "Statements executed per request.", "route", queryBuckets)
+connectionAcquireSeconds = Histogram("mqapi_connection_acquire_seconds", "Time spent waiting for a pooled connection per request.", "route", latencyBuckets)
+
+
+""" Method to record a finished request in the /metrics histograms. Takes in the request's RequestMetrics, the seconds spent acquiring a connection and the total seconds """
+def recordRequest(requestMetrics, acquireSeconds, totalSeconds):
+    requestSeconds.observe(requestMetrics.route, totalSeconds)
+    requestDBSeconds.observe(requestMetrics.route, requestMetrics.dbSeconds)
+    requestQueries.observe(requestMetrics.route, requestMetrics.queries)
+    connectionAcquireSeconds.observe(requestMetrics.route, acquireSeconds)
+
+
+""" Method to create connection with the database. Returns the database connection if successful. Returns False if there is an error """
 def create_db_connection():
-    try:
-        db = mysql.connector.connect(host=config.host, user=config.user, password=config.password, database=config.database)
-        return db
-    except mysql.connector.Error as err:
-        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
-            return False
-        elif err.errno == errorcode.ER_BAD_DB_ERROR:
-            return False
-        else:
-            return False
+    return storage.connect()
+
 
+storage = createStorage(config)
+pool = ConnectionPool(create_db_connection, config.poolSize, config.poolTimeout, config.poolMaxIdle, config.poolHealthCheckAfter)
+credentialCache = CredentialCache(config.credentialCacheSize, config.credentialCacheTTL)
+passwordHasher = PasswordHasher(config.passwordHashAlgorithm, config.scryptCost, config.scryptBlockSize, config.scryptParallelism, config.pbkdf2Iterations, config.passwordHashWorkers, config.salts)
+tokenRevocations = TokenRevocations(config.tokenLifetime)
 
-""" Method to get the names of all componants users can queue in. Returns an array of all queue names as strings. Takes in the cursor """
+# Session tokens are turned off rather than signed with a secret anyone could guess
+tokensEnabled = isUsableSecret(config.tokenSecret)
+if not tokensEnabled:
+    print("tokenSecret is shorter than " + str(minimumSecretLength) + " characters. /login and bearer tokens are disabled until it is set", flush=True)
+
+
+queueStore = storage.queues
+componentRegistry = ComponentRegistry(queueStore.loadNames, config.componentRefreshInterval)
+codeFreezeTimeline = CodeFreezeTimeline(lambda cursor: storage.codeFreezes(cursor, ["begins", "ends", "inEffect"], False, False), config.codeFreezeRefreshInterval)
+eventHub = EventHub(config.eventBufferSize)
+queueCache = QueueCache(config.queueCacheTTL)
+releaseModel = ReleaseModel(config.releaseModelWindow)
+bus = createBus(config)
+journal = Journal(config.journalPath, config.journalGroupWindow) if config.journalPath else None
+historyWriter = HistoryWriter(storage, pool, config.historyQueueSize, config.historyBatchSize, config.historyBatchInterval, config.historySpillPath, config.historyMaxRetries, config.historyPutTimeout, config.historyDeadLetterPath)
+
+
+""" Method to get the names of all componants users can queue in. Served from the componant registry. Returns an array of all queue names as strings. Takes in the cursor """
 def getQueueNames(cursor):
-    cursor.execute("SHOW TABLES;")
-    queues = cursor.fetchall()
-    returnable = []
-    for q in queues:
-        if q[0] not in ('Users', 'masterQueue'):
-            returnable.append(q[0])
-    return returnable
+    return componentRegistry.names(cursor)
 
 
-""" Method to hash password provided by user. Takes in username, password, and salts from confid file. Returns a hashed password """
-def password_hash(user, password):
-    password = hashlib.md5((password+user).encode())
-    for salt in config.salts:
-        password = hashlib.md5((password.hexdigest()+salt).encode())
-    return password.hexdigest()
+""" Method to check if a componant exists. Returns a boolean. Takes in the cursor and the componant name """
+def isQueueName(cursor, componant):
+    return componentRegistry.contains(cursor, componant)
 
 
 """ Method to create activation token for a new user. Takes in username. Returns an activation token """
@@ -118,35 +161,21 @@ def tiny_to_bool(x):
         return True
 
 
-""" Method to check if a generated UUID is already present in the database. Returns a boolean. Takes in the cursor and a UUID in one of the optional arguements """
-def checkUUID(cursor, employeeUUID=False, ticketUUID=False, freezeUUID=False):
-    if employeeUUID:
-        cursor.execute("SELECT COUNT(*) from Users WHERE `UUID` = %s", (employeeUUID,))
-    elif ticketUUID:
-        cursor.execute("SELECT COUNT(*) from masterQueue WHERE `UUID` = %s", (ticketUUID,))
-    elif freezeUUID:
-        cursor.execute("SELECT COUNT(*) from CodeFreezes WHERE `UUID` = %s", (employeeUUID,))
-
-    if cursor.fetchall()[0][0] == 1:
-        return True
-    else:
-        return False
-
-
 """ Method to check if a user exists in the database """
 def checkForUser(cursor, email, hashedPassword=False):
     
-    cursor.execute("SELECT COUNT(*) from `Users` WHERE `email` = %s", (email,))
-    if cursor.fetchall()[0][0] == 1:
+    if storage.countUsers(cursor, email=email) == 1:
         return True
     else:
         return False
 
 
-""" Method to close the database connection. Takes in the cursor and the db connection. Return is void """
+""" Method to close the database connection. With pooling this hands the connection back to the pool. Takes in the cursor and the db connection. Return is void """
 def closeConnection(db, cursor):
-    cursor.close()
-    db.close()
+    if cursor:
+        cursor.close()
+    if db:
+        db.close()
 
 
 """ Method to test the users input string. Ta """
@@ -167,27 +196,306 @@ def testUserInputString(db, cursor, string, key, length):
         return False
 
 
-""" Method to log a user in. Returns a boolean. Takes in the cursor, the users email and password, and an optional boolean indicating if the user needs admin privileges """
-def loginUser(cursor, email, password, admin=False):
-    cursor.execute("SELECT isAdmin from `Users` WHERE `email` = %s AND `password` = %s", (email, password_hash(email, password)))
-    result = cursor.fetchall()
+""" Method to log a user in. Verified credentials are served from the credential cache, so only a miss hashes the password and hits the database. A password stored with legacy MD5 or an outdated work factor is rehashed with the current settings in the background once it has been verified, so the login doesn't wait for a second hash. Returns a boolean. Takes in the db connection, the cursor, the users email and password, and an optional boolean indicating if the user needs admin privileges """
+def loginUser(db, cursor, email, password, admin=False):
+    isAdmin = credentialCache.get(email, password)
 
-    if len(result) == 0:
-        return False
-    elif admin and result[0][0] == 1:
+    if isAdmin is None:
+        generation = credentialCache.generation(email)
+        result = storage.findUsers(cursor, ["isAdmin", "password"], email=email)
+
+        if len(result) != 1 or not passwordHasher.verify(email, password, result[0][1]):
+            return False
+
+        isAdmin = rememberLogin(email, password, result[0], generation)
+
+    return hasAccess(isAdmin, admin)
+
+
+""" Method to finish a login whose password has just been checked against the database. Rehashes an outdated hash in the background and caches the login. Takes in the users email, their password, their (isAdmin, password) row and the credential cache generation read before it. Returns isAdmin """
+def rememberLogin(email, password, user, generation):
+    if passwordHasher.needsRehash(user[1]):
+        passwordHasher.rehashLater(password, lambda hashedPassword: storeRehash(email, user[1], hashedPassword))
+
+    credentialCache.put(email, password, user[0], generation)
+    return user[0]
+
+
+""" Method to check a logged in user may use an endpoint. Returns a boolean. Takes in the users isAdmin value and a boolean indicating if the endpoint needs admin privileges """
+def hasAccess(isAdmin, admin):
+    if admin and isAdmin == 1:
         return True
-    elif not admin and len(result) == 1:
+    elif not admin:
         return True
     else:
         print("Unexpected")
         return False
         
 
-""" Method to check if there is a general code freeze in effect. Returns True if there is a code freeze. Takes in the cursor """
+""" Method to replace a user's password hash with an upgraded one, unless the password was changed since the old hash was read. Runs on a password hashing thread, so it leases its own connection. Takes in the users email, the old hash and the new hash """
+def storeRehash(email, oldHash, newHash):
+    db = pool.acquire()
+    if not db:
+        return
+    cursor = db.cursor()
+    try:
+        runTransaction(db, lambda: storage.updateUser(cursor, email, {"password": newHash}, password=oldHash))
+    finally:
+        closeConnection(db, cursor)
+
+
+""" Method to authenticate the current request. Accepts either an "Authorization: Bearer" session token from /login, verified without the database, or the email and password in the JSON body. If a token is used the body's email is optional but must match the token. Returns a boolean. Takes in the db connection, the cursor and an optional boolean indicating if the user needs admin privileges """
+def authenticate(db, cursor, admin=False):
+    header = request.headers.get('Authorization', '')
+
+    if not header.startswith('Bearer '):
+        return loginUser(db, cursor, request.json['email'], request.json['password'], admin)
+
+    email = tokenUser(header, request.json, admin)
+    if email is None:
+        return False
+
+    request.json['email'] = email
+    return True
+
+
+""" Method to check an "Authorization: Bearer" header. Takes in the header, the request's JSON body and a boolean indicating if the user needs admin privileges. Returns the token's email, or None if the token isn't accepted """
+def tokenUser(header, body, admin):
+    if not tokensEnabled:
+        return None
+
+    # Until the persisted revocations are loaded any token might be revoked, so none is accepted
+    if not tokenRevocations.loaded and not loadTokenRevocations():
+        return None
+
+    claims = verifyToken(config.tokenSecret, header[len('Bearer '):].strip())
+
+    if claims is None or tokenRevocations.isRevoked(claims):
+        return None
+    if body.get('email', claims['email']) != claims['email']:
+        return None
+    if admin and not claims['isAdmin']:
+        return None
+
+    return claims['email']
+
+
+""" Method to load the persisted token revocations. Leases its own connection. Returns a boolean indicating if they were loaded """
+def loadTokenRevocations():
+    db = pool.acquire()
+    if not db:
+        return False
+    cursor = db.cursor()
+    try:
+        tokenRevocations.load(storage.tokenRevocations(cursor, time.time() - config.tokenLifetime))
+        return True
+    except Exception:
+        return False
+    finally:
+        closeConnection(db, cursor)
+
+
+""" Method to forget everything held in memory about a user after their row in Users changes. Drops cached logins and, unless revokeTokens is unset, revokes their session tokens, here and on every other node, and persists the revocation so it outlives a restart. Changes to columns tokens don't carry, such as bypassCodeFreeze, should leave the tokens alone. Takes in the db connection and cursor, only used to persist a revocation, the users email and optionally whether to revoke their tokens """
+def userChanged(db, cursor, email, revokeTokens=True):
+    revokedAt = forgetUser(email, revokeTokens)
+    bus.publish({"type": "user", "email": email, "revokeTokens": revokeTokens})
+    if revokedAt is not None:
+        runTransaction(db, lambda: storage.revokeTokens(cursor, email, revokedAt, revokedAt - config.tokenLifetime))
+
+
+""" Method to forget a user's cached logins and optionally revoke their tokens on this node. Returns when the tokens were revoked, or None if they weren't """
+def forgetUser(email, revokeTokens=True):
+    credentialCache.invalidate(email)
+    if revokeTokens:
+        return tokenRevocations.revoke(email)
+    return None
+
+
+""" Method to reload the code freeze timeline on its next lookup, here and on every other node """
+def codeFreezesChanged():
+    codeFreezeTimeline.invalidate()
+    bus.publish({"type": "freeze"})
+
+
+""" Method to reload the componant list on its next lookup on every other node. This node has already reloaded it """
+def componantsChanged():
+    bus.publish({"type": "componants"})
+
+
+""" Method to build the journal record for an entry joining a queue. Takes in the op, the componant and the entry's queueEntries values. Returns a dictionary """
+def queueRecord(op, componant, entryData):
+    return {"op": op, "componant": componant, "entry": dict(zip(queueColumns, entryData))}
+
+
+""" Method to append committed queue mutations to the audit journal, if one is configured. With config.journalSync set it waits for the group commit that puts them on disk, so no response is sent for a change the journal could lose. Takes in a list of records (see journal.py) """
+def journalMutations(records):
+    if journal is None or not records:
+        return
+    for record in records:
+        done = journal.append(record)
+    if config.journalSync:
+        done.wait()
+
+
+ticketInQueueResponse = ("Ticket already in queue. There may only be one occurance of a ticket at a time", 403)
+
+
+""" Raised inside a transaction to roll it back and return the given response instead """
+class TransactionAbort(Exception):
+    def __init__(self, response):
+        Exception.__init__(self, response[0])
+        self.response = response
+
+
+""" Method to run work as a single transaction. Commits if work returns, rolls back if it raises. Errors the storage backend marks as retryable, such as deadlocks and lock wait timeouts, and primary key collisions are retried up to config.transactionRetries times, so work must generate its IDs inside the transaction. A TransactionAbort returns its response, and a duplicate key error returns duplicateResponse if one is given. Takes in the db connection, a function taking no arguments and an optional duplicateResponse. Returns whatever work returns """
+def runTransaction(db, work, duplicateResponse=None):
+    attempt = 0
+    while True:
+        if db.in_transaction:
+            db.commit()
+
+        try:
+            result = work()
+            db.commit()
+            return result
+        except TransactionAbort as abort:
+            db.rollback()
+            return abort.response
+        except Exception as err:
+            db.rollback()
+            if storage.isDuplicate(err) and not storage.isDuplicateID(err) and duplicateResponse is not None:
+                return duplicateResponse
+            if (storage.isRetryable(err) or storage.isDuplicateID(err)) and attempt < config.transactionRetries:
+                attempt += 1
+                time.sleep(random.uniform(0, config.transactionRetryDelay * attempt))
+                continue
+            raise
+
+
+""" Method to call after a componant's queue changes. Updates the release estimates, invalidates cached checkQueue responses and tells subscribers, here and on every other node. Takes in the cursor, the componant, the event type, the ticket that changed and, for exits, when the entry was opened and whether it was releasing """
+def queueChanged(cursor, componant, eventType, ticket=None, opened=None, released=False):
+    at = datetime.now()
+    applyQueueChange(cursor, componant, eventType, ticket, at, opened, released)
+    bus.publish(queueMessage(componant, eventType, ticket, at, opened, released))
+
+
+""" Method to build the bus message telling other nodes about a queue change. Takes in the details passed to queueChanged with the time of the change. Returns a dictionary """
+def queueMessage(componant, eventType, ticket, at, opened, released):
+    message = {"type": "queue", "componant": componant, "event": eventType, "ticket": ticket, "at": at.isoformat()}
+    if opened is not None:
+        message.update(opened=opened.isoformat(), released=released)
+    return message
+
+
+""" Method to apply a queue change to this node's release model, checkQueue cache and subscribers. The event carries the ranked queue as checkQueue would return it with simple set, so subscribers never need to poll; it is only built if someone is subscribed. Takes in the cursor, or None to lease a connection if one is needed, and the details passed to queueChanged with the time of the change """
+def applyQueueChange(cursor, componant, eventType, ticket, at, opened, released):
+    recordQueueChange(componant, eventType, at, opened, released)
+
+    if not eventHub.hasSubscribers(componant):
+        return
+
+    if cursor is None:
+        db = pool.acquire()
+        if not db:
+            return
+        try:
+            publishQueueEvent(db.cursor(), componant, eventType, ticket)
+        finally:
+            db.close()
+    else:
+        publishQueueEvent(cursor, componant, eventType, ticket)
+
+
+""" Method to update the release model and invalidate cached checkQueue responses after a queue change. Takes in the componant, the event type, the time of the change and, for exits, when the entry was opened and whether it was releasing """
+def recordQueueChange(componant, eventType, at, opened, released):
+    if eventType == "releasing":
+        releaseModel.recordReleasing(componant, at)
+    elif eventType == "exited" and opened is not None:
+        releaseModel.recordExit(componant, opened, at, released)
+
+    queueCache.bump(componant)
+
+
+def publishQueueEvent(cursor, componant, eventType, ticket):
+    names, entries = queueStore.entries(cursor, componant, True)
+    publishQueueEntries(componant, eventType, ticket, entries)
+
+
+""" Method to tell subscribers about a queue change. Takes in the componant, the event type, the ticket that changed and the componant's (email, ticket, position) rows ordered by position """
+def publishQueueEntries(componant, eventType, ticket, entries):
+    queue = releaseModel.annotate(componant, rankEntries([{"ticket": e[1], "email": e[0], "position": e[2]} for e in entries]), datetime.now())
+
+    eventHub.publish(componant, eventType, {"componant": componant, "ticket": ticket, "queue": queue})
+
+
+""" Method to apply a message another node published on the bus. Takes in the message """
+def applyBusMessage(message):
+    if message['type'] == "queue":
+        opened = datetime.fromisoformat(message['opened']) if message.get('opened') else None
+        applyQueueChange(None, message['componant'], message['event'], message.get('ticket'), datetime.fromisoformat(message['at']), opened, message.get('released', False))
+    elif message['type'] == "user":
+        forgetUser(message['email'], message.get('revokeTokens', True))
+    elif message['type'] == "freeze":
+        codeFreezeTimeline.invalidate()
+    elif message['type'] == "componants":
+        componentRegistry.invalidate()
+
+
+""" Method to get the masterQueue columns to return. Takes in the cursor and whether to return the simple view. Returns a list of column names """
+def masterQueueColumns(cursor, simple):
+    return ["email", "ticket", "componant", "active", "opened", "closed"] if simple else storage.columns(cursor, "masterQueue")
+
+
+""" Method to turn a masterQueue row into the dictionary returned to the user. In the simple view active is a boolean and closed is left out while the entry is active. Takes in the column names selected, the row and whether to return the simple view. Returns a dictionary """
+def masterQueueEntry(names, e, simple):
+    if not simple:
+        return dict(zip(names, e))
+
+    entry = {
+        "ticket": e[1],
+        "email": e[0],
+        "componant": e[2],
+        "active": tiny_to_bool(e[3]),
+        "opened": e[4],
+    }
+    if not e[3]:
+        entry['closed'] =  e[5]
+    return entry
+
+
+""" Method to create the opaque cursor for the next page of masterQueue history. Takes in the opened datetime and UUID of the last entry returned. Returns a string """
+def encodeHistoryCursor(opened, UUID):
+    return base64.urlsafe_b64encode(json.dumps([opened.strftime("%Y-%m-%d %H:%M:%S"), UUID]).encode()).decode()
+
+
+""" Method to read a cursor created by encodeHistoryCursor. Returns the opened datetime string and UUID """
+def decodeHistoryCursor(historyCursor):
+    opened, UUID = json.loads(base64.urlsafe_b64decode(historyCursor.encode()))
+    datetime.strptime(opened, "%Y-%m-%d %H:%M:%S")
+    return opened, UUID
+
+
+""" Method to check if there is a general code freeze in effect. Served from the code freeze timeline. Returns True if there is a code freeze. Takes in the cursor """
 def checkForCodeFreeze(cursor):
     
-    cursor.execute("SELECT COUNT(*) FROM `CodeFreezes` WHERE begins <= CURDATE() AND ends >= CURDATE() AND inEffect = true;")
-    return True if (cursor.fetchall())[0][0] != 0 else False 
+    return codeFreezeTimeline.inEffect(cursor)
+
+
+""" Method run just after midnight, and at startup, to flip inEffect on for code freezes covering today and off for those that have ended, then reload the timeline """
+def updateCodeFreezes():
+    db = pool.acquire()
+    if not db:
+        return
+    cursor = db.cursor()
+    try:
+        storage.updateCodeFreezes(cursor)
+        db.commit()
+        codeFreezeTimeline.load(cursor)
+    finally:
+        closeConnection(db, cursor)
+
+
+codeFreezeScheduler = MidnightScheduler(updateCodeFreezes)
 
 
 
@@ -220,16 +528,55 @@ def index(db, cursor):
 
 # User management endpoints
 
+@app.route('/login', methods=['POST'])
+@getStarted
+def login(db, cursor):
+    if not tokensEnabled:
+        closeConnection(db, cursor)
+        return "Session tokens are disabled on this server", 503
+
+    if db:
+        try:
+            if not loginUser(db, cursor, request.json['email'], request.json['password']):
+                closeConnection(db, cursor)
+                return "Login Failed", 400
+
+            user = storage.findUsers(cursor, ["UUID", "isAdmin"], email=request.json['email'])
+
+            # A user deleted since their login was cached or their token was issued
+            if len(user) == 0:
+                closeConnection(db, cursor)
+                return "User not found", 401
+
+            user = user[0]
+
+            claims = {
+                "uuid": user[0],
+                "email": request.json['email'],
+                "isAdmin": tiny_to_bool(user[1]),
+            }
+
+            returnable = {
+                "token": issueToken(config.tokenSecret, claims, config.tokenLifetime),
+                "expiresIn": config.tokenLifetime,
+            }
+
+            closeConnection(db, cursor)
+            return jsonify(returnable), 200
+        except:
+            closeConnection(db, cursor)
+            return "something went wrong", 520
+    else:
+        closeConnection(db, cursor)
+        return jsonify({'Error': "Database Connection Error"}), 502
+
+
 @app.route('/registerNewUser', methods=['POST'])
 @getStarted
 def registerNewUser(db, cursor):
 
     if db:
 
-        UUID = str(uuid.uuid4().hex)
-        while checkUUID(cursor, employeeUUID=UUID):
-            UUID = str(uuid.uuid4().hex)
-
         if checkForUser(cursor, request.json['email']):
             closeConnection(db, cursor)
             return "email is already in use", 400
@@ -247,32 +594,24 @@ def registerNewUser(db, cursor):
             closeConnection(db, cursor)
             return testUserInputString(db, cursor, request.json['team'].lower(), 'team', 45), 400
 
-        hashedPassword = password_hash(request.json['email'], request.json['password'])
+        hashedPassword = passwordHasher.hash(request.json['password'])
 
-        cursor.execute("SELECT firstName, lastName FROM `Users` WHERE (`isAdmin` = 1)")
-        adminsQueryResults = cursor.fetchall()
+        adminsQueryResults = storage.findUsers(cursor, ["firstName", "lastName"], isAdmin=1)
 
         if len(adminsQueryResults) == 0:
 
-            addUser = ("INSERT INTO Users (`UUID`, `firstName`, `lastName`, `email`, `password`, `team`, `isAdmin`, `isDisabled`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
-            userData = (UUID, request.json['firstName'].lower(), request.json['lastName'].lower(), request.json['email'], hashedPassword, request.json['team'], 1, 0)
+            userData = {"firstName": request.json['firstName'].lower(), "lastName": request.json['lastName'].lower(), "email": request.json['email'], "password": hashedPassword, "team": request.json['team'], "isAdmin": 1, "isDisabled": 0}
 
-            # Execute and commit query
-            cursor.execute(addUser, userData)
-            db.commit()
+            runTransaction(db, lambda: storage.addUser(cursor, dict(userData, UUID=newID())))
 
             closeConnection(db, cursor)
             return "No admins currently exist. You are now the active admin. Please create more admins if needed and contact the API's engineers if this is an unexpected result.", 200
 
         activationsCodes = createActivationCode(str(request.json['firstName'] + request.json['lastName'] + request.json['email']))
 
-        # Create query
-        addUser = ("INSERT INTO Users (`UUID`, `firstName`, `lastName`, `email`, `password`, `team`, `isAdmin`, `isDisabled`, `activationToken`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)")
-        userData = (UUID, request.json['firstName'].lower(), request.json['lastName'].lower(), request.json['email'], hashedPassword, request.json['team'], 0, 1, activationsCodes[1])
+        userData = {"firstName": request.json['firstName'].lower(), "lastName": request.json['lastName'].lower(), "email": request.json['email'], "password": hashedPassword, "team": request.json['team'], "isAdmin": 0, "isDisabled": 1, "activationToken": activationsCodes[1]}
 
-        # Execute and commit query
-        cursor.execute(addUser, userData)
-        db.commit()
+        runTransaction(db, lambda: storage.addUser(cursor, dict(userData, UUID=newID())))
 
         admins = []
         for a in adminsQueryResults:
@@ -302,17 +641,17 @@ def toggleAdmin(db, cursor):
     if db:
         try:
 
-            cursor.execute("SELECT COUNT(*) FROM Users WHERE isAdmin = 1")
-            adminCount = cursor.fetchall()[0][0]
+            adminCount = storage.countUsers(cursor, isAdmin=1)
 
             if adminCount == 0:
             
-                if not loginUser(cursor, request.json['email'], request.json['password']):
+                if not authenticate(db, cursor):
                     closeConnection(db, cursor)
                     return "Login Failed", 400
 
-                cursor.execute("UPDATE `Users` SET `isAdmin` = 1 WHERE (`email` = %s)", (request.json['targetEmail'],))
+                storage.updateUser(cursor, request.json['targetEmail'], {"isAdmin": 1})
                 db.commit()
+                userChanged(db, cursor, request.json['targetEmail'])
 
                 closeConnection(db, cursor)
                 return "Emergency admin succesfully created", 200
@@ -320,7 +659,7 @@ def toggleAdmin(db, cursor):
             else:
 
 
-                if not loginUser(cursor, request.json['email'], request.json['password'], True):
+                if not authenticate(db, cursor, True):
                     closeConnection(db, cursor)
                     return "Login Failed", 400
 
@@ -328,21 +667,22 @@ def toggleAdmin(db, cursor):
                     closeConnection(db, cursor)
                     return "Cannot toggle as you are the only admin. Create another admin first", 403
 
-                cursor.execute("SELECt COUNT(*), isAdmin FROM `Users` WHERE `email` = %s", (request.json['targetEmail'],))
-                userFound = cursor.fetchall()[0]
+                userFound = storage.findUsers(cursor, ["isAdmin"], email=request.json['targetEmail'])
 
-                if userFound[0] == 0:
+                if len(userFound) == 0:
                     closeConnection(db, cursor)
                     return "Target not found", 403
 
-                if userFound[1] == 1:
-                    cursor.execute("UPDATE `Users` SET `isAdmin` = 0 WHERE (`email` = %s)", (request.json['targetEmail'],))
+                if userFound[0][0] == 1:
+                    storage.updateUser(cursor, request.json['targetEmail'], {"isAdmin": 0})
                     db.commit()
+                    userChanged(db, cursor, request.json['targetEmail'])
                     closeConnection(db, cursor)
                     return "Target is no longer an Admin", 200
                 else:
-                    cursor.execute("UPDATE `Users` SET `isAdmin` = 1 WHERE (`email` = %s)", (request.json['targetEmail'],))
+                    storage.updateUser(cursor, request.json['targetEmail'], {"isAdmin": 1})
                     db.commit()
+                    userChanged(db, cursor, request.json['targetEmail'])
                     closeConnection(db, cursor)
                     return "Target is now an Admin", 200
 
@@ -360,28 +700,25 @@ def deleteSelf(db, cursor):
     if db:
         try:
 
-            if not loginUser(cursor, request.json['email'], request.json['password']):
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT COUNT(*), isAdmin FROM `Users` WHERE (`email` = %s)", (request.json['email'],))
-            userFound = cursor.fetchall()[0]
+            userFound = storage.findUsers(cursor, ["UUID", "isAdmin"], email=request.json['email'])
 
-            if userFound[0] == 0:
+            if len(userFound) == 0:
                 closeConnection(db, cursor)
                 return "User not found", 403
 
-            if userFound[1] == 1:
+            if userFound[0][1] == 1:
 
-                cursor.execute("SELECT COUNT(*) FROM `Users` WHERE (`isAdmin` = 1)")
-                if cursor.fetchall()[0][0] == 1:
+                if storage.countUsers(cursor, isAdmin=1) == 1:
                     closeConnection(db, cursor)
                     return "Deleting yourself would leave no Admins. Please create a new admin first", 403
 
-            cursor.execute("SELECT UUID FROM Users WHERE email = %s", (request.json['email'],))
-            userUUID = cursor.fetchall()[0][0]
-            cursor.execute("DELETE FROM `Users` WHERE (`UUID` = %s);", (userUUID,))
+            storage.deleteUser(cursor, userFound[0][0])
             db.commit()
+            userChanged(db, cursor, request.json['email'])
 
             closeConnection(db, cursor)
             return "You are deleted", 200
@@ -409,7 +746,7 @@ def deleteUser(db, cursor):
     if db:
         try:
 
-            if not loginUser(cursor, request.json['email'], request.json['password'], True):
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
@@ -417,17 +754,15 @@ def deleteUser(db, cursor):
                 closeConnection(db, cursor)
                 return "This endpoint is not fo deleting oneslef", 403
 
-            cursor.execute("SELECT COUNT(*) FROM `Users` WHERE (`email` = %s)", (request.json['targetEmail'],))
-            userFound = cursor.fetchall()[0]
+            userFound = storage.findUsers(cursor, ["UUID"], email=request.json['targetEmail'])
 
-            if userFound[0] == 0:
+            if len(userFound) == 0:
                 closeConnection(db, cursor)
                 return "User not found", 403
 
-            cursor.execute("SELECT UUID FROM Users WHERE email = %s", (request.json['targetEmail'],))
-            userUUID = cursor.fetchall()[0][0]
-            cursor.execute("DELETE FROM `Users` WHERE (`UUID` = %s);", (userUUID,))
+            storage.deleteUser(cursor, userFound[0][0])
             db.commit()
+            userChanged(db, cursor, request.json['targetEmail'])
 
             closeConnection(db, cursor)
             return "User deleted", 200
@@ -454,12 +789,11 @@ def deleteUser(db, cursor):
 def approveUser(db, cursor):
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password'], True):
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT UUID, isDisabled, approvedBy, activationToken FROM `Users` WHERE (`email` = %s)", (request.json['userEmail'],))
-            foundUser = cursor.fetchall()
+            foundUser = storage.findUsers(cursor, ["UUID", "isDisabled", "approvedBy", "activationToken"], email=request.json['userEmail'])
 
             if len(foundUser) == 0:
                 closeConnection(db, cursor)
@@ -471,8 +805,7 @@ def approveUser(db, cursor):
             foundUser = foundUser[0]
 
             if not tiny_to_bool(foundUser[1]):
-                cursor.execute("SELECT firstName, lastName FROM `Users` WHERE `email` = %s", (request.json['email'],))
-                approver = cursor.fetchall()[0]
+                approver = storage.findUsers(cursor, ["firstName", "lastName"], email=request.json['email'])[0]
                 closeConnection(db, cursor)
                 return "User already approved by " + approver[0].capitalize() + " " + approver[1].capitalize() + " (" + foundUser[2] + "). If this is erroneous please message them", 400
 
@@ -480,8 +813,9 @@ def approveUser(db, cursor):
                 closeConnection(db, cursor)
                 return "Bad activation token", 400
 
-            cursor.execute("UPDATE `Users` SET `isDisabled` = 0, `approvedBy` = %s WHERE (`email` = %s)", (request.json['email'], request.json['userEmail'],))
+            storage.updateUser(cursor, request.json['userEmail'], {"isDisabled": 0, "approvedBy": request.json['email']})
             db.commit()
+            userChanged(db, cursor, request.json['userEmail'])
             
             closeConnection(db, cursor)
             return "User is approved", 200
@@ -516,63 +850,113 @@ def getQueues(db, cursor):
         return jsonify({'Error': "Database Connection Error"}), 502
 
 
-@app.route('/checkQueue', methods=['GET'])
+@app.route('/refreshQueueNames', methods=['PUT'])
 @getStarted
-def checkQueue(db, cursor):
+def refreshQueueNames(db, cursor):
     if db:
         try:
-            
-            queueName = request.json['componant'].lower()
-            
-            if not request.json['simple']:
-                cursor.execute("SELECT * FROM `" + queueName + "`")
-            else:
-                cursor.execute("SELECT email, ticket, position FROM `" + queueName + "`")
-            
-            entries = cursor.fetchall()
-
-            if len(entries) == 0:
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
-                return queueName.lower() + " is empty", 200
-    
-            entriesArray = []
-            entry = {}
-            
-            if not request.json['simple']: 
+                return "Login Failed", 400
 
-                cursor.execute("DESCRIBE `" + queueName + "`")
-                names = cursor.fetchall()
-                
-                for e in entries:
-                    for i in range(0, len(e)):
-                        entry[names[i][0]] = e[i]
-                    entriesArray.append(entry.copy())
+            json_dump = jsonify(componentRegistry.load(cursor))
+            componantsChanged()
 
-                returnable = sorted(entriesArray, key=lambda x: x['position'])
+            closeConnection(db, cursor)
+            return json_dump, 200
+        except:
+            closeConnection(db, cursor)
+            return "something went wrong", 520
+    else:
+        closeConnection(db, cursor)
+        return jsonify({'Error': "Database Connection Error"}), 502
 
-                returnable[0]['position'] = "Releasing" if returnable[0]['position'] == 0 else returnable[0]['position']
-                
-                json_dump = jsonify(returnable)
 
-            else:
+@app.route('/addComponant', methods=['POST'])
+@getStarted
+def addComponant(db, cursor):
+    if db:
+        try:
+            if not authenticate(db, cursor, True):
+                closeConnection(db, cursor)
+                return "Login Failed", 400
 
-                for e in entries:
-                    entry = {
-                        "ticket": e[1],
-                        "email": e[0],
-                        "position": e[2],
-                    }
-                    
-                    entriesArray.append(entry.copy())
-                returnable = sorted(entriesArray, key=lambda x: x['position'])
+            componant = request.json['componant'].lower()
 
-                returnable[0]['position'] = "Releasing" if returnable[0]['position'] == 0 else returnable[0]['position']
+            if isQueueName(cursor, componant):
+                closeConnection(db, cursor)
+                return "Componant already exists", 403
 
-                json_dump = jsonify(returnable)
+            if not storage.addComponant(cursor, componant):
+                closeConnection(db, cursor)
+                return "Componants are tables in perTable storage. Create the table instead", 400
+            db.commit()
 
+            json_dump = jsonify(componentRegistry.load(cursor))
+            componantsChanged()
 
             closeConnection(db, cursor)
             return json_dump, 200
+        except:
+            closeConnection(db, cursor)
+            return "something went wrong", 520
+    else:
+        closeConnection(db, cursor)
+        return jsonify({'Error': "Database Connection Error"}), 502
+
+
+@app.route('/queueEvents/<componant>', methods=['GET'])
+def queueEvents(componant):
+
+    componant = componant.lower()
+    subscriber = eventHub.subscribe(componant)
+
+    def stream():
+        try:
+            yield "retry: " + str(int(config.eventHeartbeat * 1000)) + "\n\n"
+            while True:
+                event = subscriber.next(config.eventHeartbeat)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield formatEvent(event)
+        finally:
+            eventHub.unsubscribe(subscriber)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/checkQueue', methods=['GET'])
+@getStarted
+def checkQueue(db, cursor):
+    if db:
+        try:
+            
+            queueName = request.json['componant'].lower()
+            simple = bool(request.json['simple'])
+
+            # Only known componants reach the cache and the per componant tables, so a request can't grow either with made up names
+            if not isQueueName(cursor, queueName):
+                closeConnection(db, cursor)
+                return "Unknown componant", 400
+
+            cached = queueCache.get(queueName, simple)
+
+            if cached is None:
+                version = queueCache.version(queueName)
+                body, mimetype = buildCheckQueueResponse(cursor, queueName, simple)
+                cached = queueCache.put(queueName, simple, version, body, mimetype)
+
+            closeConnection(db, cursor)
+
+            body, mimetype, etag = cached
+            response = Response(body, status=200, mimetype=mimetype)
+            response.set_etag(etag)
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+            return response
 
         except:
             closeConnection(db, cursor)
@@ -581,6 +965,23 @@ def checkQueue(db, cursor):
     else:
         closeConnection(db, cursor)
         return 'an error occured', 500
+
+
+""" Method to build the checkQueue response for a componant from the database. Takes in the cursor, the componant and whether to return the simple view. Returns the response body as bytes and its mimetype """
+def buildCheckQueueResponse(cursor, queueName, simple):
+    names, entries = queueStore.entries(cursor, queueName, simple)
+    return renderCheckQueue(queueName, names, entries)
+
+
+""" Method to build the checkQueue response from a componant's entries. Takes in the componant, the column names and the rows ordered by position. Returns the response body as bytes and its mimetype """
+def renderCheckQueue(queueName, names, entries):
+    if len(entries) == 0:
+        return (queueName.lower() + " is empty").encode(), 'text/html'
+
+    # Rows come back ordered by position, so one pass builds and ranks them
+    json_dump = jsonify(releaseModel.annotate(queueName, rankEntries([dict(zip(names, e)) for e in entries]), datetime.now()))
+
+    return json_dump.get_data(), json_dump.mimetype
     
 
 @app.route('/enterQueue', methods=['POST'])
@@ -589,12 +990,17 @@ def enterQueue(db, cursor):
     if db:
         try:
             
-            if not loginUser(cursor, request.json['email'], request.json['password']):
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT isAdmin, bypassCodeFreeze, team FROM `Users` WHERE `email` = %s", (request.json['email'],))
-            userDetails = cursor.fetchall()[0]
+            userDetails = storage.findUsers(cursor, ["isAdmin", "bypassCodeFreeze", "team"], email=request.json['email'])
+
+            if len(userDetails) == 0:
+                closeConnection(db, cursor)
+                return "User not found", 401
+
+            userDetails = userDetails[0]
 
             canBypassCodeFreezes = False if not tiny_to_bool(userDetails[0]) and not tiny_to_bool(userDetails[1]) else True
         
@@ -610,44 +1016,155 @@ def enterQueue(db, cursor):
                 return "Description is too long. Please limit it to 400 charracters or less", 403
 
 
-            if request.json['componant'].lower() not in getQueueNames(cursor):
+            if not isQueueName(cursor, request.json['componant'].lower()):
                 closeConnection(db, cursor)
                 return "Unknown componant", 403
 
-            if canBypassCodeFreezes:
-                cursor.execute("UPDATE `Users` SET `bypassCodeFreeze` = 0 WHERE `email` = %s", (request.json['email'],))
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
+
+            now = datetime.now()
+            currentDT = now.strftime("%Y-%m-%d %H:%M:%S")
+            journalRecords = []
+            historyRows = []
+
+            def work():
+                UUID = newID()
+                # Locking the tail serialises enqueues on this componant until commit
+                queueStore.lockTail(cursor, componant)
+
+                if queueStore.countTicket(cursor, componant, ticket, forUpdate=True) != 0:
+                    raise TransactionAbort(ticketInQueueResponse)
 
-            cursor.execute("SELECT COUNT(*) FROM `" + request.json['componant'].lower() + "` WHERE `ticket` = %s", (request.json['ticket'],))
-            occurancesOfTicket = cursor.fetchall()[0][0]
+                lastPosition, numberWaiting = queueStore.tail(cursor, componant, forUpdate=True)
 
-            if occurancesOfTicket != 0:
+                if canBypassCodeFreezes:
+                    storage.updateUser(cursor, request.json['email'], {"bypassCodeFreeze": 0})
+
+                entryData = (UUID, ticket, request.json['description'], request.json['email'], userDetails[2], currentDT, lastPosition+1)
+
+                queueStore.insert(cursor, componant, entryData)
+                journalRecords[:] = [queueRecord("enter", componant, entryData)]
+
+                entryData = (UUID, ticket, request.json['description'], request.json['componant'], request.json['email'], userDetails[2], bool_to_tiny(True), currentDT)
+
+                historyRows[:] = [entryData]
+                return "Successfully in queue. your posiiton is " + str(numberWaiting+1), 200
+
+            response = runTransaction(db, work, duplicateResponse=ticketInQueueResponse)
+
+            if response[1] == 200:
+                journalMutations(journalRecords)
+                historyWriter.add(historyRows)
+                queueChanged(cursor, componant, "entered", ticket)
+
+            # Using up a bypass only changes bypassCodeFreeze, which tokens don't carry, so the caller's tokens stay valid
+            if response[1] == 200 and tiny_to_bool(userDetails[1]):
+                userChanged(db, cursor, request.json['email'], revokeTokens=False)
+            
+            closeConnection(db, cursor)
+            return response
+        except:
+            closeConnection(db, cursor)
+            return "something went wrong", 520
+    else:
+        closeConnection(db, cursor)
+        return jsonify({'Error': "Database Connection Error"}), 502
+
+
+@app.route('/enterQueues', methods=['POST'])
+@getStarted
+def enterQueues(db, cursor):
+    if db:
+        try:
+            
+            if not authenticate(db, cursor):
+                closeConnection(db, cursor)
+                return "Login Failed", 400
+
+            userDetails = storage.findUsers(cursor, ["isAdmin", "bypassCodeFreeze", "team"], email=request.json['email'])
+
+            if len(userDetails) == 0:
+                closeConnection(db, cursor)
+                return "User not found", 401
+
+            userDetails = userDetails[0]
+
+            canBypassCodeFreezes = False if not tiny_to_bool(userDetails[0]) and not tiny_to_bool(userDetails[1]) else True
+        
+            if datetime.now().weekday() in (4, 5, 6) and not canBypassCodeFreezes:
+                closeConnection(db, cursor)
+                return "Releases may only be done Monday -> Thursday. Please enter the queue again on Monday morning", 400
+        
+            if checkForCodeFreeze(cursor) and not canBypassCodeFreezes:
+                closeConnection(db, cursor)
+                return "There is a code freeze in effect. New entries cannot be added to the queue until the code freeze ends", 403
+
+            if len(request.json['description']) > 400:
                 closeConnection(db, cursor)
-                return "Ticket already in queue. There may only be one occurance of a ticket at a time", 403
+                return "Description is too long. Please limit it to 400 charracters or less", 403
+
+            # Sorted so concurrent batches always take the componant locks in the same order
+            componants = sorted(set(c.lower() for c in request.json['componants']))
 
+            if len(componants) == 0:
+                closeConnection(db, cursor)
+                return "No componants given", 400
 
-            cursor.execute("SELECT COUNT(*) FROM `" + request.json['componant'].lower() + "`")
-            numberInQueue = cursor.fetchall()
+            for componant in componants:
+                if not isQueueName(cursor, componant):
+                    closeConnection(db, cursor)
+                    return "Unknown componant: " + componant, 403
 
-            UUID = str(uuid.uuid4().hex)
-            while checkUUID(cursor, ticketUUID=UUID):
-                UUID = str(uuid.uuid4().hex)
+            ticket = request.json['ticket'].upper()
 
             now = datetime.now()
             currentDT = now.strftime("%Y-%m-%d %H:%M:%S")
 
-            entryQuery = ("INSERT INTO `" + request.json['componant'].lower() + "` (`UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s)")
-            entryData = (UUID, request.json['ticket'].upper(), request.json['description'], request.json['email'], userDetails[2], currentDT, numberInQueue[0][0]+1)
+            journalRecords = []
+            historyRows = []
 
-            cursor.execute(entryQuery, entryData)
+            def work():
+                UUIDs = {componant: newID() for componant in componants}
+                queueEntries = []
+                masterEntries = []
+                positions = {}
 
-            entryQuery = ("INSERT INTO masterQueue (`UUID`, `ticket`, `description`, `componant`, `email`, `teamName`, `active`, `opened`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
-            entryData = (UUID, request.json['ticket'].upper(), request.json['description'], request.json['componant'], request.json['email'], userDetails[2], bool_to_tiny(True), currentDT)
+                for componant in componants:
+                    queueStore.lockTail(cursor, componant)
+
+                    if queueStore.countTicket(cursor, componant, ticket, forUpdate=True) != 0:
+                        raise TransactionAbort(("Ticket already in " + componant + ". There may only be one occurance of a ticket at a time", 403))
+
+                    lastPosition, numberWaiting = queueStore.tail(cursor, componant, forUpdate=True)
+                    positions[componant] = numberWaiting + 1
+
+                    queueEntries.append((componant, (UUIDs[componant], ticket, request.json['description'], request.json['email'], userDetails[2], currentDT, lastPosition+1)))
+                    masterEntries.append((UUIDs[componant], ticket, request.json['description'], componant, request.json['email'], userDetails[2], bool_to_tiny(True), currentDT))
+
+                if canBypassCodeFreezes:
+                    storage.updateUser(cursor, request.json['email'], {"bypassCodeFreeze": 0})
+
+                queueStore.insertMany(cursor, queueEntries)
+                journalRecords[:] = [queueRecord("enter", c, e) for c, e in queueEntries]
+                historyRows[:] = masterEntries
+
+                return jsonify(positions), 200
+
+            response = runTransaction(db, work, duplicateResponse=ticketInQueueResponse)
+
+            if response[1] == 200:
+                journalMutations(journalRecords)
+                historyWriter.add(historyRows)
+                for componant in componants:
+                    queueChanged(cursor, componant, "entered", ticket)
+
+            # Using up a bypass only changes bypassCodeFreeze, which tokens don't carry, so the caller's tokens stay valid
+            if response[1] == 200 and tiny_to_bool(userDetails[1]):
+                userChanged(db, cursor, request.json['email'], revokeTokens=False)
 
-            cursor.execute(entryQuery, entryData)
-            db.commit()
-            
             closeConnection(db, cursor)
-            return "Successfully in queue. your posiiton is " + str(numberInQueue[0][0]+1), 200
+            return response
         except:
             closeConnection(db, cursor)
             return "something went wrong", 520
@@ -661,7 +1178,7 @@ def enterQueue(db, cursor):
 def updateTicketDescription(db, cursor):
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password']):
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
@@ -669,17 +1186,23 @@ def updateTicketDescription(db, cursor):
                 closeConnection(db, cursor)
                 return "Description is too long. Please limit it to 400 charracters or less", 403
 
-            query = "SELECT COUNT(*) FROM `" + request.json['componant'] + "` WHERE (`ticket` = %s AND `email` = %s)"
-            cursor.execute(query, (request.json['ticket'], request.json['email'],))
-            
-            if cursor.fetchall()[0][0] == 0:
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
+
+            if not isQueueName(cursor, componant):
+                closeConnection(db, cursor)
+                return "Unknown componant", 403
+
+            if queueStore.countTicket(cursor, componant, ticket, request.json['email']) == 0:
                 closeConnection(db, cursor)
                 return "No matching ticket found", 403
 
-            query = "UPDATE `" + request.json['componant'] + "` SET `description` = %s WHERE (`ticket` = %s AND `email` = %s);"
-            cursor.execute(query, (request.json['description'], request.json['ticket'], request.json['email'],))
+            queueStore.updateDescription(cursor, componant, ticket, request.json['email'], request.json['description'])
             db.commit()
 
+            journalMutations([{"op": "describe", "componant": componant, "ticket": ticket, "email": request.json['email'], "description": request.json['description']}])
+            queueChanged(cursor, componant, "updated", ticket)
+
 
 
             closeConnection(db, cursor)
@@ -699,7 +1222,7 @@ def exitQueue(db, cursor):
 
         try:
 
-            if loginUser(cursor, request.json['email'], request.json['password']) == False:
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
@@ -707,38 +1230,44 @@ def exitQueue(db, cursor):
                 closeConnection(db, cursor)
                 return "Reason is too long. Please limit it to 400 charracters or less", 403
 
-            if request.json['componant'].lower() not in getQueueNames(cursor):
+            if not isQueueName(cursor, request.json['componant'].lower()):
                 closeConnection(db, cursor)
                 return "Unknown componant", 403
 
-            cursor.execute("SELECT UUID, position FROM `" + request.json['componant'].lower() + "` WHERE `ticket` = %s", (request.json['ticket'],))
-            entry = cursor.fetchall()
-
-            if len(entry) != 1:
-                closeConnection(db, cursor)
-                return "No matching ticket found", 403
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
 
-            UUID = entry[0][0]
-            position = entry[0][1]
-                
             now = datetime.now()
             currentDT = now.strftime("%Y-%m-%d %H:%M:%S")
+            exited = {}
+            journalRecords = []
+
+            def work():
+                entry = queueStore.findTicket(cursor, componant, ticket, forUpdate=True)
 
-            cursor.execute("SELECT COUNT(*) FROM `" + request.json['componant'].lower() + "` WHERE (`position` IN (0, 1))")
-            queueHeadCount = cursor.fetchall()[0][0]
+                if len(entry) != 1:
+                    raise TransactionAbort(("No matching ticket found", 403))
+
+                UUID, position, teamName, opened, storedTicket = entry[0]
                 
-            cursor.execute("DELETE FROM `" + request.json['componant'].lower() + "` WHERE `UUID` = %s", (UUID,))
-            db.commit()
-            
-            if queueHeadCount != 2:
-                cursor.execute("UPDATE `" + request.json['componant'].lower() + "` SET position = position - 1 WHERE (`position` > %s)", (position,))
-                db.commit()
-            
-            cursor.execute("UPDATE `masterQueue` SET `active` = 0, `closed` = %s, `reasonClosed` = %s WHERE (`UUID` = %s);", (currentDT, request.json['reason'], UUID,))
-            db.commit()
+                queueStore.delete(cursor, componant, UUID)
+                journalRecords[:] = [{"op": "exit", "componant": componant, "UUID": UUID, "ticket": storedTicket, "closed": currentDT, "reason": request.json['reason']}]
+
+                waitSeconds = max(0, int((now - opened).total_seconds()))
+                storage.recordExit(cursor, componant, now.strftime("%Y-%m-%d"), teamName, request.json['reason'], waitBucket(waitSeconds), waitSeconds)
+                exited.update(UUID=UUID, opened=opened, released=position == 0)
+
+                return "Queue exited", 200
+
+            response = runTransaction(db, work)
+
+            if response[1] == 200:
+                journalMutations(journalRecords)
+                historyWriter.close(exited['UUID'], currentDT, request.json['reason'])
+                queueChanged(cursor, componant, "exited", ticket, exited.get('opened'), exited.get('released', False))
             
             closeConnection(db, cursor)
-            return "Queue exited", 200
+            return response
 
         except:
             closeConnection(db, cursor)
@@ -754,29 +1283,44 @@ def exitQueue(db, cursor):
 def releasing(db, cursor):
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password']):
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT UUID, position FROM `" + request.json['componant'] + "` WHERE (`email` = %s AND `ticket` = %s);", (request.json['email'], request.json['ticket'],))
-            entry = cursor.fetchall()
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
 
-            if len(entry) == 0:
+            if not isQueueName(cursor, componant):
                 closeConnection(db, cursor)
-                return "No tickets found in your name", 400
-            elif len(entry) > 1:
-                closeConnection(db, cursor)
-                return "Erroneous number of ticket found", 400
+                return "Unknown componant", 403
 
-            if entry[0][1] != 1:
-                closeConnection(db, cursor)
-                return "It is not your turn to release. Please create a priority ticket, after deleting this ticket, if you need to bypass the queue", 400
+            journalRecords = []
 
-            cursor.execute("UPDATE `" + request.json['componant'] + "` SET `position` = 0 WHERE (`UUID` = %s)", (entry[0][0],))
-            db.commit()
+            def work():
+                queueStore.lockTail(cursor, componant)
+
+                entry = queueStore.findTicket(cursor, componant, ticket, request.json['email'], forUpdate=True)
+
+                if len(entry) == 0:
+                    raise TransactionAbort(("No tickets found in your name", 400))
+                elif len(entry) > 1:
+                    raise TransactionAbort(("Erroneous number of ticket found", 400))
+
+                if entry[0][1] == 0 or queueStore.rank(cursor, componant, entry[0][1], forUpdate=True) != 1:
+                    raise TransactionAbort(("It is not your turn to release. Please create a priority ticket, after deleting this ticket, if you need to bypass the queue", 400))
+
+                queueStore.setPosition(cursor, componant, entry[0][0], 0)
+                journalRecords[:] = [{"op": "releasing", "componant": componant, "UUID": entry[0][0], "ticket": entry[0][4]}]
+                return "Done", 200
+
+            response = runTransaction(db, work)
+
+            if response[1] == 200:
+                journalMutations(journalRecords)
+                queueChanged(cursor, componant, "releasing", ticket)
 
             closeConnection(db, cursor)
-            return "Done", 200
+            return response
         except:
             closeConnection(db, cursor)
             return "something went wrong", 520
@@ -791,12 +1335,17 @@ def priorityQueueEntry(db, cursor):
     if db:
         try:
 
-            if not loginUser(cursor, request.json['email'], request.json['password']):
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT isAdmin, bypassCodeFreeze, team FROM `Users` WHERE `email` = %s", (request.json['email'],))
-            userDetails = cursor.fetchall()[0]
+            userDetails = storage.findUsers(cursor, ["isAdmin", "bypassCodeFreeze", "team"], email=request.json['email'])
+
+            if len(userDetails) == 0:
+                closeConnection(db, cursor)
+                return "User not found", 401
+
+            userDetails = userDetails[0]
 
             canBypassCodeFreezes = False if not tiny_to_bool(userDetails[0]) and not tiny_to_bool(userDetails[1]) else True
         
@@ -811,55 +1360,69 @@ def priorityQueueEntry(db, cursor):
                 closeConnection(db, cursor)
                 return "Description is too long. Please limit it to 400 charracters or less", 403
 
-            if request.json['componant'].lower() not in getQueueNames(cursor):
+            if not isQueueName(cursor, request.json['componant'].lower()):
                 closeConnection(db, cursor)
                 return "Unknown componant", 403
 
-            if canBypassCodeFreezes:
-                cursor.execute("UPDATE `Users` SET `bypassCodeFreeze` = 0 WHERE `email` = %s", (request.json['email'],))
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
+
+            now = datetime.now()
+            currentDT = now.strftime("%Y-%m-%d %H:%M:%S")
+
+            journalRecords = []
+            historyRows = []
 
-            cursor.execute("SELECT COUNT(*) FROM `" + request.json['componant'].lower() + "` WHERE `ticket` = %s", (request.json['ticket'],))
-            occurancesOfTicket = cursor.fetchall()[0][0]
+            def work():
+                UUID = newID()
+                queueStore.lockTail(cursor, componant)
 
-            if occurancesOfTicket != 0:
-                closeConnection(db, cursor)
-                return "Ticket already in queue. There may only be one occurance of a ticket at a time", 403
+                if queueStore.countTicket(cursor, componant, ticket, forUpdate=True) != 0:
+                    raise TransactionAbort(ticketInQueueResponse)
 
+                takenPosition = queueStore.head(cursor, componant, forUpdate=True)
 
-            cursor.execute("SELECT position, email FROM `" + request.json['componant'].lower() + "` WHERE (`position` IN (0, 1))")
-            takenPosition = cursor.fetchall()
+                # More than one entry may be releasing, so split the head into releasing entries and the one next in line rather than counting rows
+                releasing = [t for t in takenPosition if t[0] == 0]
+                waiting = [t for t in takenPosition if t[0] != 0]
 
-            if len(takenPosition) == 2:
-                cursor.execute("SELECT firstName, lastName FROM `Users` WHERE (`email` = %s)", (takenPosition[1][1],))
-                user = cursor.fetchall()
-                closeConnection(db, cursor)
-                return "" + user[0][0].capitalize() + " " + user[0][1].capitalize() + " is already awaiting a priority release. Please discuss with them which ticket should take priority", 403
+                # Someone is releasing and someone else is already next in line, so there is no room for a priority entry
+                if len(releasing) != 0 and len(waiting) != 0:
+                    user = storage.findUsers(cursor, ["firstName", "lastName"], email=waiting[0][1])
+                    raise TransactionAbort(("" + user[0][0].capitalize() + " " + user[0][1].capitalize() + " is already awaiting a priority release. Please discuss with them which ticket should take priority", 403))
 
-            UUID = str(uuid.uuid4().hex)
-            while checkUUID(cursor, ticketUUID=UUID):
-                UUID = str(uuid.uuid4().hex)
+                if canBypassCodeFreezes:
+                    storage.updateUser(cursor, request.json['email'], {"bypassCodeFreeze": 0})
 
-            now = datetime.now()
-            currentDT = now.strftime("%Y-%m-%d %H:%M:%S")
+                # Behind a release nobody is waiting, so position 1 is the head of the line. Otherwise the entry starts releasing straight away, ahead of anyone waiting
+                ticketPosition = 1 if len(releasing) != 0 else 0
 
-            ticketPosition = 1 if takenPosition[0][0] == 0 else 0
+                entryData = (UUID, ticket, request.json['description'], request.json['email'], userDetails[2], currentDT, ticketPosition)
 
-            entryQuery = ("INSERT INTO `" + request.json['componant'].lower() + "` (`UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s)")
-            entryData = (UUID, request.json['ticket'].upper(), request.json['description'], request.json['email'], userDetails[2], currentDT, ticketPosition)
+                queueStore.insert(cursor, componant, entryData)
+                journalRecords[:] = [queueRecord("priority", componant, entryData)]
 
-            cursor.execute(entryQuery, entryData)
+                entryData = (UUID, ticket, request.json['description'], request.json['componant'], request.json['email'], userDetails[2], bool_to_tiny(True), currentDT)
 
-            entryQuery = ("INSERT INTO masterQueue (`UUID`, `ticket`, `description`, `componant`, `email`, `teamName`, `active`, `opened`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
-            entryData = (UUID, request.json['ticket'].upper(), request.json['description'], request.json['componant'], request.json['email'], userDetails[2], bool_to_tiny(True), currentDT)
+                historyRows[:] = [entryData]
 
-            cursor.execute(entryQuery, entryData)
-            db.commit()
+                if ticketPosition != 0:
+                    return "There is currently a ticket being released. You are next in line once they have released.", 200
+                return "Your priority ticket has been added to the queue and is set to releasing.", 200
+
+            response = runTransaction(db, work, duplicateResponse=ticketInQueueResponse)
+
+            if response[1] == 200:
+                journalMutations(journalRecords)
+                historyWriter.add(historyRows)
+                queueChanged(cursor, componant, "priority", ticket)
+
+            # Using up a bypass only changes bypassCodeFreeze, which tokens don't carry, so the caller's tokens stay valid
+            if response[1] == 200 and tiny_to_bool(userDetails[1]):
+                userChanged(db, cursor, request.json['email'], revokeTokens=False)
             
             closeConnection(db, cursor)
-
-            if ticketPosition == 1:
-                return "There is currently a ticket being released. You are next in line once they have released.", 200
-            return "Your priority ticket has been added to the queue and is set to releasing.", 200
+            return response
 
         except:
             closeConnection(db, cursor)
@@ -877,52 +1440,19 @@ def checkMasterQueue(db, cursor):
     if db:
         try:
 
-            query = "SELECT "
-            query += "email, ticket, componant, active, opened, closed FROM `masterQueue`" if request.json['simple'] else  "* FROM `masterQueue`"
+            names = masterQueueColumns(cursor, request.json['simple'])
     
-            if request.json['daysBack']:
-                if isinstance(request.json['daysBack'], int):
-                    # Yes I know...SQL Injection and shit....ugh
-                    query += " WHERE opened >= ( CURDATE() - INTERVAL " + str(request.json['daysBack']) + " DAY )"
-                else:
-                    return "Type error. daysBack needs to be an int", 400
+            if request.json['daysBack'] and not isinstance(request.json['daysBack'], int):
+                closeConnection(db, cursor)
+                return "Type error. daysBack needs to be an int", 400
 
-            cursor.execute(query)
-            entries = cursor.fetchall()
+            entries = storage.history(cursor, names, request.json['daysBack'], request.json['byComponant'])
 
             if len(entries) == 0:
                 closeConnection(db, cursor)
                 return "Master queue is empty", 200
-            
-            entriesArray = []
-            entry = {}
-            
-            if request.json['simple']: 
-
-                for e in entries:
-                    entry = {
-                        "ticket": e[1],
-                        "email": e[0],
-                        "componant": e[2],
-                        "active": tiny_to_bool(e[3]),
-                        "opened": e[4],
-                    }
-                    if not e[3]:
-                        entry['closed'] =  e[5]
-                    entriesArray.append(entry.copy())
 
-            else:
-                cursor.execute("DESCRIBE `masterQueue`")
-                names = cursor.fetchall()
-                
-                for e in entries:
-                    for i in range(0, len(e)):
-                        entry[names[i][0]] = e[i]
-                    entriesArray.append(entry.copy())
-
-
-            returnable = sorted(entriesArray, key=lambda x: x['componant']) if request.json['byComponant'] else sorted(entriesArray, key=lambda x: x['opened'])
-            json_dump = jsonify(returnable)
+            json_dump = jsonify([masterQueueEntry(names, e, request.json['simple']) for e in entries])
 
             closeConnection(db, cursor)
             return json_dump, 200
@@ -936,25 +1466,188 @@ def checkMasterQueue(db, cursor):
         return 'an error occured', 500
     
 
+@app.route('/masterQueueHistory', methods=['GET'])
+@getStarted
+def masterQueueHistory(db, cursor):
+    if db:
+        try:
+
+            # Every option is optional, so a GET with no body lists the first page
+            options = request.get_json(silent=True) or {}
+            if not isinstance(options, dict):
+                closeConnection(db, cursor)
+                return "Type error. The body needs to be a JSON object", 400
+
+            simple = options.get('simple', False)
+            limit = options.get('limit', config.historyPageSize)
+            newestFirst = options.get('newestFirst', False)
+
+            if not isinstance(simple, bool) or not isinstance(newestFirst, bool):
+                closeConnection(db, cursor)
+                return "Type error. simple and newestFirst need to be booleans", 400
+
+            if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+                closeConnection(db, cursor)
+                return "Type error. limit needs to be a positive int", 400
+            limit = min(limit, config.historyMaxPageSize)
+
+            names = masterQueueColumns(cursor, simple)
+            selected = names + [n for n in ("opened", "UUID") if n not in names]
+
+            filters = {}
+
+            for key, column in (('componant', 'componant'), ('email', 'email'), ('team', 'teamName')):
+                if options.get(key) is not None:
+                    if not isinstance(options[key], str):
+                        closeConnection(db, cursor)
+                        return "Type error. " + key + " needs to be a string", 400
+                    filters[column] = options[key]
+
+            if options.get('active') is not None:
+                if not isinstance(options['active'], bool):
+                    closeConnection(db, cursor)
+                    return "Type error. active needs to be a boolean", 400
+                filters['active'] = bool_to_tiny(options['active'])
+
+            daysBack = options.get('daysBack')
+            if daysBack is not None and (isinstance(daysBack, bool) or not isinstance(daysBack, int) or daysBack < 0):
+                closeConnection(db, cursor)
+                return "Type error. daysBack needs to be a non negative int", 400
+
+            after = None
+            if options.get('cursor'):
+                try:
+                    after = decodeHistoryCursor(options['cursor'])
+                except (ValueError, TypeError, AttributeError):
+                    closeConnection(db, cursor)
+                    return "Bad cursor", 400
+
+            entries = storage.historyPage(cursor, selected, filters, daysBack, after, newestFirst, limit + 1)
+
+            nextCursor = None
+            if len(entries) > limit:
+                entries = entries[:limit]
+                last = entries[-1]
+                nextCursor = encodeHistoryCursor(last[selected.index("opened")], last[selected.index("UUID")])
+
+            returnable = {
+                "entries": [masterQueueEntry(names, e, simple) for e in entries],
+                "nextCursor": nextCursor,
+            }
+
+            closeConnection(db, cursor)
+            return jsonify(returnable), 200
+
+        except:
+            closeConnection(db, cursor)
+            return "something went wrong", 520
+
+    else:
+        closeConnection(db, cursor)
+        return 'an error occured', 500
+
+
+@app.route('/exportMasterQueue', methods=['GET'])
+def exportMasterQueue():
+
+    options = request.get_json(silent=True) or {}
+    exportFormat = options.get('format', 'ndjson')
+
+    if exportFormat not in ('ndjson', 'csv'):
+        return "Unknown format. Use ndjson or csv", 400
+
+    # The connection is held for as long as the response streams, so it is leased here rather than through getStarted
+    started = time.perf_counter()
+    requestMetrics = RequestMetrics(request.url_rule.rule, config.slowQuerySeconds)
+
+    db = pool.acquire()
+    acquired = time.perf_counter()
+    if not db:
+        return jsonify({'Error': "Database Connection Error"}), 502
+
+    def stream():
+        cursor = InstrumentedCursor(db.cursor(), requestMetrics)
+        try:
+            names = storage.columns(cursor, "masterQueue")
+
+            if exportFormat == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(names)
+
+            for rows in storage.historyBatches(cursor, names, config.exportBatchSize):
+                if exportFormat == 'csv':
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    yield "".join(json.dumps(dict(zip(names, r)), default=str) + "\n" for r in rows)
+
+            if exportFormat == 'csv' and buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            closeConnection(db, cursor)
+            recordRequest(requestMetrics, acquired - started, time.perf_counter() - started)
+
+    mimetype = 'text/csv' if exportFormat == 'csv' else 'application/x-ndjson'
+    return Response(stream(), mimetype=mimetype, headers={'Content-Disposition': 'attachment; filename=masterQueue.' + exportFormat})
+
+
+@app.route('/queueStats', methods=['GET'])
+@getStarted
+def queueStats(db, cursor):
+    if db:
+        try:
+
+            options = request.get_json(silent=True) or {}
+
+            daysBack = options.get('daysBack')
+            if daysBack is not None and not isinstance(daysBack, int):
+                closeConnection(db, cursor)
+                return "Type error. daysBack needs to be an int", 400
+
+            componant = options.get('componant')
+            if componant is not None:
+                componant = componant.lower()
+                if not isQueueName(cursor, componant):
+                    closeConnection(db, cursor)
+                    return "Unknown componant", 403
+
+            waitRows, reasonRows = storage.queueStats(cursor, daysBack, componant)
+            returnable = buildReport(waitRows, reasonRows, config.statsTopReasons)
+
+            closeConnection(db, cursor)
+            return jsonify(returnable), 200
+
+        except:
+            closeConnection(db, cursor)
+            return "something went wrong", 520
+
+    else:
+        closeConnection(db, cursor)
+        return 'an error occured', 500
+
+
 @app.route('/emptyAllQueues', methods=['DELETE'])
 @getStarted
 def emptyAllQueues(db, cursor):
 
-    cursor.execute("SET SQL_SAFE_UPDATES = 0")
-    db.commit()
+    componants = getQueueNames(cursor)
 
-    queues = getQueueNames(cursor)
+    # Rows still waiting to be written would otherwise land in masterQueue after it is emptied
+    if not historyWriter.flush(config.historyFlushTimeout):
+        closeConnection(db, cursor)
+        return "masterQueue writes are behind, try again shortly", 503
 
-    for componant in queues:
-        cursor.execute("DELETE FROM `" + componant + "`")
-        db.commit()
+    def work():
+        storage.emptyAll(cursor, componants)
 
-    query = "DELETE FROM `masterQueue`"
-    cursor.execute(query)
-    db.commit()
+    runTransaction(db, work)
+    journalMutations([{"op": "empty", "componants": componants}])
 
-    cursor.execute("SET SQL_SAFE_UPDATES = 1")
-    db.commit()
+    for componant in componants:
+        queueChanged(cursor, componant, "emptied")
 
     closeConnection(db, cursor)
     return "Success", 200
@@ -969,24 +1662,19 @@ def createCodeFreeze(db, cursor):
 
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password'], True):
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            UUID = str(uuid.uuid4().hex)
-            while checkUUID(cursor, ticketUUID=UUID):
-                UUID = str(uuid.uuid4().hex)
-
             inEffect = True if request.json['startIn'] == 0 else False
 
             startOfCodeFreeze = (datetime.now() + timedelta(days=request.json['startIn'])).strftime("%Y-%m-%d")
             endOfCodeFreeze = (datetime.now() + timedelta(days=request.json['startIn']) + timedelta(days=request.json['duration'])).strftime("%Y-%m-%d")
 
-            entryQuery = ("INSERT INTO codeFreezes (`UUID`, `begins`, `duration`, `ends`, `inEffect`) VALUES (%s, %s, %s, %s, %s)")
-            entryData = (UUID, startOfCodeFreeze, request.json['duration'], endOfCodeFreeze, inEffect)
+            entryData = (startOfCodeFreeze, request.json['duration'], endOfCodeFreeze, inEffect)
 
-            cursor.execute(entryQuery, entryData)
-            db.commit()
+            runTransaction(db, lambda: storage.addCodeFreeze(cursor, (newID(),) + entryData))
+            codeFreezesChanged()
 
             closeConnection(db, cursor)
             return "Done", 200
@@ -1005,16 +1693,13 @@ def endActiveCodeFreeze(db, cursor):
 
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password'], True):
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT UUID FROM `CodeFreezes` WHERE `inEffect` = 1")
-            UUIDs = cursor.fetchall()
-
-            for UUID in UUIDs:
-                cursor.execute("UPDATE `CodeFreezes` SET `inEffect` = 0 WHERE (`UUID` = %s)", (UUID[0],))    
+            storage.endActiveCodeFreezes(cursor)
             db.commit()
+            codeFreezesChanged()
 
             closeConnection(db, cursor)
             return "Done", 200
@@ -1033,30 +1718,19 @@ def checkFreezes(db, cursor):
     if db:
         try:
 
-            if not loginUser(cursor, request.json['email'], request.json['password']):
+            if not authenticate(db, cursor):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("DESCRIBE `CodeFreezes`")
-            tableNames = cursor.fetchall()
-
-            query = "SELECT * FROM `CodeFreezes`"
-
-            query += " WHERE `inEffect` = 1" if tiny_to_bool(request.json['activeOnly']) else " WHERE (`begins` > CURDATE() AND `inEffect` = 0)" if tiny_to_bool(request.json['futureOnly']) else ""
+            tableNames = storage.columns(cursor, "CodeFreezes")
 
-            cursor.execute(query)
-            freezes = cursor.fetchall()
+            freezes = storage.codeFreezes(cursor, tableNames, tiny_to_bool(request.json['activeOnly']), tiny_to_bool(request.json['futureOnly']))
 
             if len(freezes) == 0:
                 closeConnection(db, cursor)
                 return "No relevent freezes found", 200
 
-            returnable = []
-            entry = {}
-            for f in freezes:
-                for i in range(0, len(tableNames)):
-                    entry[tableNames[i][0]] = f[i]
-                returnable.append(entry.copy())
+            returnable = [dict(zip(tableNames, f)) for f in freezes]
 
             json_dump = jsonify(returnable)
 
@@ -1075,12 +1749,13 @@ def checkFreezes(db, cursor):
 def endFreeze(db, cursor):
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password'], True):
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("DELETE FROM `CodeFreezes` WHERE (`UUID` = %s)", (request.json['codeFreezeUUID'],))
+            storage.deleteCodeFreeze(cursor, request.json['codeFreezeUUID'])
             db.commit()
+            codeFreezesChanged()
 
             closeConnection(db, cursor)
             return "Done", 200
@@ -1097,13 +1772,11 @@ def endFreeze(db, cursor):
 def allowEmployeeBypassCodeFreeze(db, cursor):
     if db:
         try:
-            if not loginUser(cursor, request.json['email'], request.json['password'], True):
+            if not authenticate(db, cursor, True):
                 closeConnection(db, cursor)
                 return "Login Failed", 400
 
-            cursor.execute("SELECT UUID, isAdmin, bypassCodeFreeze, firstName, lastName FROM `Users` WHERE `email` = %s", (request.json['employeeEmail'],))
-            
-            employee = cursor.fetchall()
+            employee = storage.findUsers(cursor, ["UUID", "isAdmin", "bypassCodeFreeze", "firstName", "lastName"], email=request.json['employeeEmail'])
 
             if len(employee) != 1:
                 closeConnection(db, cursor)
@@ -1116,14 +1789,16 @@ def allowEmployeeBypassCodeFreeze(db, cursor):
                 return "Employee is admin and doesn't need override", 200
 
             if tiny_to_bool(employee[2]):
-                cursor.execute("UPDATE `Users` SET `bypassCodeFreeze` = 0 WHERE (`UUID` = %s)", (employee[0],))
+                storage.updateUser(cursor, request.json['employeeEmail'], {"bypassCodeFreeze": 0})
                 db.commit()
+                userChanged(db, cursor, request.json['employeeEmail'])
 
                 closeConnection(db, cursor)
                 return ("" + employee[3] + " " + employee[4] + " no longer has permission to release today"), 200
 
-            cursor.execute("UPDATE `Users` SET `bypassCodeFreeze` = 1 WHERE (`UUID` = %s)", (employee[0],))
+            storage.updateUser(cursor, request.json['employeeEmail'], {"bypassCodeFreeze": 1})
             db.commit()
+            userChanged(db, cursor, request.json['employeeEmail'])
 
             closeConnection(db, cursor)
             return ("" + employee[3] + " " + employee[4] + " has permission to release today"), 200
@@ -1137,6 +1812,42 @@ def allowEmployeeBypassCodeFreeze(db, cursor):
 
 
 
+# Monitoring endpoints
+
+@app.route('/poolStats', methods=['GET'])
+def poolStats():
+    return jsonify(pool.stats()), 200
+
+
+@app.route('/eventStats', methods=['GET'])
+def eventStats():
+    return jsonify(eventHub.stats()), 200
+
+
+@app.route('/queueCacheStats', methods=['GET'])
+def queueCacheStats():
+    return jsonify({"hits": queueCache.hits, "misses": queueCache.misses}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    lines = []
+    for histogram in (requestSeconds, requestDBSeconds, requestQueries, connectionAcquireSeconds):
+        lines += histogram.render()
+    lines += renderGauges("mqapi_pool_", pool.stats())
+    lines += renderGauges("mqapi_bus_", bus.stats())
+    if journal is not None:
+        lines += renderGauges("mqapi_journal_", journal.stats())
+    lines += renderGauges("mqapi_history_writer_", historyWriter.stats())
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/authCacheStats', methods=['GET'])
+def authCacheStats():
+    return jsonify({"hits": credentialCache.hits, "misses": credentialCache.misses}), 200
+
+
+
 # Endpoint skeleton
 
 # @app.route('/', methods=[''])
@@ -1144,7 +1855,7 @@ def allowEmployeeBypassCodeFreeze(db, cursor):
 # def methodName(db, cursor):
 #     if db:
 #         try:
-#             if not loginUser(cursor, request.json['email'], request.json['password'], True):
+#             if not authenticate(db, cursor, True):
 #                 closeConnection(db, cursor)
 #                 return "Login Failed", 400
 #             closeConnection(db, cursor)
@@ -1157,5 +1868,37 @@ def allowEmployeeBypassCodeFreeze(db, cursor):
 #         return jsonify({'Error': "Database Connection Error"}), 502
 
 
+""" Method to load in memory state from the database when the process starts, so the first requests don't pay for it. Failures are ignored and the state is loaded lazily instead """
+def warmUp():
+    historyWriter.start()
+    atexit.register(historyWriter.stop, config.historyStopTimeout)
+
+    db = pool.acquire()
+    if not db:
+        return
+    passwordWidth = None
+    try:
+        cursor = db.cursor()
+        passwordWidth = storage.columnWidth(cursor, "Users", "password")
+        componentRegistry.load(cursor)
+        storage.columns(cursor, "masterQueue")
+        storage.columns(cursor, "CodeFreezes")
+        releaseModel.load(storage.history(cursor, ["componant", "opened", "closed"], config.releaseModelDays, False))
+    except Exception:
+        pass
+    finally:
+        db.close()
+
+    # A hash cut short by the column would lock its user out, so don't serve logins until the column has been widened
+    if passwordWidth is not None and passwordWidth < passwordHasher.storedLength():
+        raise RuntimeError("Users.password holds " + str(passwordWidth) + " characters but password hashes need " + str(passwordHasher.storedLength()) + ". Run python migrateQueues.py widenPasswords")
+
+    codeFreezeScheduler.start()
+    bus.start(applyBusMessage)
+
+
+warmUp()
+
+
 if __name__ == '__main__':
     app.run(port=4400)
\ No newline at end of file
@@ -0,0 +1,437 @@
+""" ASGI entry point for the API. Run with an ASGI server, for example
+
+    uvicorn asgi:application --port 4400
+
+/queueEvents streams are served on the event loop, so an open subscription costs a coroutine rather than a worker thread. With the mysql backend /checkQueue, /enterQueue and /exitQueue are served on the event loop too, on a pool of config.asyncPoolSize aiomysql connections, so a request waiting on the database holds a coroutine rather than a thread. Their statements are in asyncStorage.AsyncStore, and they share app.py's caches, journal, masterQueue writer and metrics. Every other route, and every route on the other backends, is handed to the Flask app on a pool of config.asgiWorkerThreads threads, the same code the WSGI server runs """
+import asyncio, config, io, sys, time, random
+from datetime import datetime
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from flask import request, jsonify, Response
+from app import app, eventHub, pool, historyWriter, journal, bus, storage, queueCache, credentialCache, passwordHasher, componentRegistry, codeFreezeTimeline, tokensEnabled
+from app import TransactionAbort, ticketInQueueResponse, renderCheckQueue, tokenUser, loadTokenRevocations, rememberLogin, hasAccess, userChanged, queueRecord, recordQueueChange, publishQueueEntries, queueMessage, recordRequest, tiny_to_bool, bool_to_tiny
+from events import formatEvent
+from ids import newID
+from metrics import RequestMetrics
+from queueStats import waitBucket
+
+
+flaskApplication = WSGIMiddleware(app, workers=config.asgiWorkerThreads)
+
+if config.storageBackend == "mysql" and config.asyncPoolSize > 0:
+    from asyncStorage import AsyncMySQL, AsyncSession, AsyncStore
+    asyncDatabase = AsyncMySQL(config)
+    asyncStore = AsyncStore(storage)
+else:
+    asyncDatabase = None
+
+
+async def waitForDisconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+""" Method to stream a componant's events as text/event-stream until the client goes away """
+async def queueEvents(receive, send, componant):
+    subscriber = eventHub.subscribeAsync(componant.lower(), asyncio.get_event_loop())
+    disconnected = asyncio.ensure_future(waitForDisconnect(receive))
+
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")],
+        })
+        await send({"type": "http.response.body", "body": ("retry: " + str(int(config.eventHeartbeat * 1000)) + "\n\n").encode(), "more_body": True})
+
+        while not disconnected.done():
+            event = await subscriber.next(config.eventHeartbeat)
+            chunk = ": keepalive\n\n" if event is None else formatEvent(event)
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    finally:
+        eventHub.unsubscribe(subscriber)
+        disconnected.cancel()
+
+
+
+# Routes served on the event loop. Each mirrors its endpoint in app.py, awaiting the database where that one blocks
+
+""" Wrapped method to setup an endpoint served on the event loop, as getStarted does for app.py. Leases an async connection, hands the endpoint a session on it, or None if none could be had, and records the request for /metrics """
+def getStartedAsync(f):
+    @wraps(f)
+    async def getSetUp():
+
+        started = time.perf_counter()
+        requestMetrics = RequestMetrics(request.url_rule.rule if request.url_rule else f.__name__, config.slowQuerySeconds)
+
+        connection = await asyncDatabase.acquire()
+        acquired = time.perf_counter()
+
+        try:
+            return await f(AsyncSession(asyncDatabase, connection, requestMetrics) if connection else None)
+        finally:
+            if connection:
+                await asyncDatabase.release(connection)
+            recordRequest(requestMetrics, acquired - started, time.perf_counter() - started)
+    return getSetUp
+
+
+""" Method to log a user in without blocking the event loop. Mirrors loginUser in app.py. Returns a boolean. Takes in the session, the users email and password, and an optional boolean indicating if the user needs admin privileges """
+async def loginUserAsync(session, email, password, admin=False):
+    isAdmin = credentialCache.get(email, password)
+
+    if isAdmin is None:
+        generation = credentialCache.generation(email)
+        result = await asyncStore.findUsers(session, ["isAdmin", "password"], email)
+
+        if len(result) != 1 or not await passwordHasher.verifyAsync(email, password, result[0][1]):
+            return False
+
+        isAdmin = rememberLogin(email, password, result[0], generation)
+
+    return hasAccess(isAdmin, admin)
+
+
+""" Method to authenticate the current request without blocking the event loop. Mirrors authenticate in app.py. Returns a boolean. Takes in the session and an optional boolean indicating if the user needs admin privileges """
+async def authenticateAsync(session, admin=False):
+    header = request.headers.get('Authorization', '')
+
+    if not header.startswith('Bearer '):
+        return await loginUserAsync(session, request.json['email'], request.json['password'], admin)
+
+    email = tokenUser(header, request.json, admin)
+    if email is None:
+        return False
+
+    request.json['email'] = email
+    return True
+
+
+""" Method to run work as a single transaction on the event loop. Mirrors runTransaction in app.py, with the same retries. Takes in the session, a coroutine function taking no arguments and an optional duplicateResponse. Returns whatever work returns """
+async def runTransactionAsync(session, work, duplicateResponse=None):
+    attempt = 0
+    while True:
+        if session.inTransaction():
+            await session.commit()
+
+        try:
+            result = await work()
+            await session.commit()
+            return result
+        except TransactionAbort as abort:
+            await session.rollback()
+            return abort.response
+        except Exception as err:
+            await session.rollback()
+            if session.database.isDuplicate(err) and not session.database.isDuplicateID(err) and duplicateResponse is not None:
+                return duplicateResponse
+            if (session.database.isRetryable(err) or session.database.isDuplicateID(err)) and attempt < config.transactionRetries:
+                attempt += 1
+                await asyncio.sleep(random.uniform(0, config.transactionRetryDelay * attempt))
+                continue
+            raise
+
+
+""" Method to append committed queue mutations to the audit journal without blocking the event loop. Mirrors journalMutations in app.py. Takes in a list of records """
+async def journalMutationsAsync(records):
+    if journal is None or not records:
+        return
+    for record in records:
+        done = journal.appendAsync(record)
+    if config.journalSync:
+        await done
+
+
+""" Method to call after a componant's queue changes on the event loop. Mirrors queueChanged in app.py, reading the queue for subscribers through the session. Takes in the session and the details queueChanged takes """
+async def queueChangedAsync(session, componant, eventType, ticket=None, opened=None, released=False):
+    at = datetime.now()
+    recordQueueChange(componant, eventType, at, opened, released)
+
+    if eventHub.hasSubscribers(componant):
+        names, entries = await asyncStore.entries(session, componant, True)
+        publishQueueEntries(componant, eventType, ticket, entries)
+
+    bus.publish(queueMessage(componant, eventType, ticket, at, opened, released))
+
+
+""" Method to check if a componant exists, loading the componant registry through the session if it is stale. Takes in the session and the componant name. Returns a boolean """
+async def isQueueNameAsync(session, componant):
+    if componentRegistry.isStale():
+        componentRegistry.update(await asyncStore.loadNames(session))
+    return componentRegistry.contains(None, componant)
+
+
+""" Method to check if there is a general code freeze in effect, loading the code freeze timeline through the session if it is stale. Takes in the session. Returns a boolean """
+async def checkForCodeFreezeAsync(session):
+    if codeFreezeTimeline.isStale():
+        codeFreezeTimeline.update(await asyncStore.codeFreezes(session))
+    return codeFreezeTimeline.inEffect(None)
+
+
+""" Method to hand masterQueue work to the background writer. The writer can make callers wait while its queue is full, so it is called off the event loop. Takes in the writer method and its arguments """
+async def writeHistory(method, *args):
+    await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+
+@getStartedAsync
+async def checkQueue(session):
+    if session:
+        try:
+
+            queueName = request.json['componant'].lower()
+            simple = bool(request.json['simple'])
+
+            if not await isQueueNameAsync(session, queueName):
+                return "Unknown componant", 400
+
+            cached = queueCache.get(queueName, simple)
+
+            if cached is None:
+                version = queueCache.version(queueName)
+                names, entries = await asyncStore.entries(session, queueName, simple)
+                body, mimetype = renderCheckQueue(queueName, names, entries)
+                cached = queueCache.put(queueName, simple, version, body, mimetype)
+
+            body, mimetype, etag = cached
+            response = Response(body, status=200, mimetype=mimetype)
+            response.set_etag(etag)
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+            return response
+
+        except Exception:
+            return "something went wrong", 520
+
+    else:
+        return 'an error occured', 500
+
+
+@getStartedAsync
+async def enterQueue(session):
+    if session:
+        try:
+
+            if not await authenticateAsync(session):
+                return "Login Failed", 400
+
+            userDetails = await asyncStore.findUsers(session, ["isAdmin", "bypassCodeFreeze", "team"], request.json['email'])
+
+            if len(userDetails) == 0:
+                return "User not found", 401
+
+            userDetails = userDetails[0]
+
+            canBypassCodeFreezes = False if not tiny_to_bool(userDetails[0]) and not tiny_to_bool(userDetails[1]) else True
+
+            if datetime.now().weekday() in (4, 5, 6) and not canBypassCodeFreezes:
+                return "Releases may only be done Monday -> Thursday. Please enter the queue again on Monday morning", 400
+
+            if await checkForCodeFreezeAsync(session) and not canBypassCodeFreezes:
+                return "There is a code freeze in effect. New entries cannot be added to the queue until the code freeze ends", 403
+
+            if len(request.json['description']) > 400:
+                return "Description is too long. Please limit it to 400 charracters or less", 403
+
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
+
+            if not await isQueueNameAsync(session, componant):
+                return "Unknown componant", 403
+
+            currentDT = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            journalRecords = []
+            historyRows = []
+
+            async def work():
+                UUID = newID()
+                # Locking the tail serialises enqueues on this componant until commit
+                await asyncStore.lockTail(session, componant)
+
+                if await asyncStore.countTicket(session, componant, ticket, forUpdate=True) != 0:
+                    raise TransactionAbort(ticketInQueueResponse)
+
+                lastPosition, numberWaiting = await asyncStore.tail(session, componant, forUpdate=True)
+
+                if canBypassCodeFreezes:
+                    await asyncStore.updateUser(session, request.json['email'], {"bypassCodeFreeze": 0})
+
+                entryData = (UUID, ticket, request.json['description'], request.json['email'], userDetails[2], currentDT, lastPosition+1)
+
+                await asyncStore.insert(session, componant, entryData)
+                journalRecords[:] = [queueRecord("enter", componant, entryData)]
+
+                historyRows[:] = [(UUID, ticket, request.json['description'], request.json['componant'], request.json['email'], userDetails[2], bool_to_tiny(True), currentDT)]
+                return "Successfully in queue. your posiiton is " + str(numberWaiting+1), 200
+
+            response = await runTransactionAsync(session, work, duplicateResponse=ticketInQueueResponse)
+
+            if response[1] == 200:
+                await journalMutationsAsync(journalRecords)
+                await writeHistory(historyWriter.add, historyRows)
+                await queueChangedAsync(session, componant, "entered", ticket)
+
+            # Using up a bypass only changes bypassCodeFreeze, which tokens don't carry, so the caller's tokens stay valid
+            if response[1] == 200 and tiny_to_bool(userDetails[1]):
+                userChanged(None, None, request.json['email'], revokeTokens=False)
+
+            return response
+        except Exception:
+            return "something went wrong", 520
+    else:
+        return jsonify({'Error': "Database Connection Error"}), 502
+
+
+@getStartedAsync
+async def exitQueue(session):
+    if session:
+
+        try:
+
+            if not await authenticateAsync(session):
+                return "Login Failed", 400
+
+            if len(request.json['reason']) > 100:
+                return "Reason is too long. Please limit it to 400 charracters or less", 403
+
+            componant = request.json['componant'].lower()
+            ticket = request.json['ticket'].upper()
+
+            if not await isQueueNameAsync(session, componant):
+                return "Unknown componant", 403
+
+            now = datetime.now()
+            currentDT = now.strftime("%Y-%m-%d %H:%M:%S")
+            exited = {}
+            journalRecords = []
+
+            async def work():
+                entry = await asyncStore.findTicket(session, componant, ticket, forUpdate=True)
+
+                if len(entry) != 1:
+                    raise TransactionAbort(("No matching ticket found", 403))
+
+                UUID, position, teamName, opened, storedTicket = entry[0]
+
+                await asyncStore.delete(session, componant, UUID)
+                journalRecords[:] = [{"op": "exit", "componant": componant, "UUID": UUID, "ticket": storedTicket, "closed": currentDT, "reason": request.json['reason']}]
+
+                waitSeconds = max(0, int((now - opened).total_seconds()))
+                await asyncStore.recordExit(session, componant, now.strftime("%Y-%m-%d"), teamName, request.json['reason'], waitBucket(waitSeconds), waitSeconds)
+                exited.update(UUID=UUID, opened=opened, released=position == 0)
+
+                return "Queue exited", 200
+
+            response = await runTransactionAsync(session, work)
+
+            if response[1] == 200:
+                await journalMutationsAsync(journalRecords)
+                await writeHistory(historyWriter.close, exited['UUID'], currentDT, request.json['reason'])
+                await queueChangedAsync(session, componant, "exited", ticket, exited.get('opened'), exited.get('released', False))
+
+            return response
+
+        except Exception:
+            return "something went wrong", 520
+
+    else:
+        return jsonify({'Error': "Database Connection Error"}), 502
+
+
+asyncRoutes = {
+    ("GET", "/checkQueue"): checkQueue,
+    ("POST", "/enterQueue"): enterQueue,
+    ("DELETE", "/exitQueue"): exitQueue,
+}
+
+
+async def readBody(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+""" Method to build the WSGI environ Flask would see for an ASGI request. Takes in the scope and the request body. Returns a dictionary """
+def wsgiEnviron(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else "HTTP_" + name
+        value = value.decode("latin-1")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+""" Method to serve a request with one of the routes above. The request is pushed as a Flask request context, so flask.request and jsonify work as they do in app.py, and the route's return value becomes a response the way Flask would make it """
+async def serveAsync(endpoint, scope, receive, send):
+    body = await readBody(receive)
+
+    with app.request_context(wsgiEnviron(scope, body)):
+        response = app.make_response(await endpoint())
+
+    await send({"type": "http.response.start", "status": response.status_code, "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]})
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if asyncDatabase is not None:
+                await asyncDatabase.start()
+            # Token checks on the loop would otherwise load the revocations with a blocking read on first use
+            if tokensEnabled:
+                await asyncio.get_running_loop().run_in_executor(None, loadTokenRevocations)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Drain or spill unwritten masterQueue rows while the pool can still hand out connections
+            await asyncio.get_running_loop().run_in_executor(None, historyWriter.stop, config.historyStopTimeout)
+            if asyncDatabase is not None:
+                await asyncDatabase.close()
+            pool.closeAll()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    if scope["type"] == "http" and scope["method"] == "GET" and scope["path"].startswith("/queueEvents/"):
+        componant = scope["path"][len("/queueEvents/"):]
+        if componant and "/" not in componant:
+            return await queueEvents(receive, send, componant)
+
+    if scope["type"] == "http" and asyncDatabase is not None:
+        endpoint = asyncRoutes.get((scope["method"], scope["path"]))
+        if endpoint is not None:
+            return await serveAsync(endpoint, scope, receive, send)
+
+    return await flaskApplication(scope, receive, send)
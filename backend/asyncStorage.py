@@ -0,0 +1,185 @@
+""" Async access to the MySQL server for the routes asgi.py serves on the event loop. AsyncStore holds the statements those routes make and AsyncSession runs them on a request's aiomysql connection """
+import asyncio, time
+import aiomysql
+from pymysql.err import MySQLError
+from pymysql.constants import ER
+from queueStore import PerTableQueueStore, queueColumns
+
+
+
+""" A request's connection from the async pool. Takes in the AsyncMySQL it came from, the connection and the request's RequestMetrics """
+class AsyncSession:
+
+    def __init__(self, database, connection, requestMetrics):
+        self.database = database
+        self.connection = connection
+        self.requestMetrics = requestMetrics
+
+
+    """ Method to run a statement. Takes in the SQL and its parameters. Returns the rows it produced, if any """
+    async def fetch(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            async with self.connection.cursor() as cursor:
+                await cursor.execute(query, params)
+                return await cursor.fetchall()
+        finally:
+            self.requestMetrics.recordQuery(query, time.perf_counter() - started)
+
+
+    def inTransaction(self):
+        return self.connection.get_transaction_status()
+
+    async def commit(self):
+        await self.connection.commit()
+
+    async def rollback(self):
+        await self.connection.rollback()
+
+
+
+""" The statements the routes served on the event loop make, for either queue layout. Each method mirrors the one of the same name in storage.py or queueStore.py, taking the session where that takes the cursor, so a change to one of those must be made here too. Takes in the storage backend """
+class AsyncStore:
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.perTable = isinstance(storage.queues, PerTableQueueStore)
+        self._columns = {}
+
+
+    """ Method to get the table holding a componant's entries and the condition picking them out. Returns the table, a list of conditions and their parameters """
+    def _queue(self, componant):
+        if self.perTable:
+            return "`" + componant + "`", [], ()
+        return "`queueEntries`", ["`componant` = %s"], (componant,)
+
+
+    def _where(self, conditions):
+        return " WHERE (" + " AND ".join(conditions) + ")" if conditions else ""
+
+
+    async def loadNames(self, session):
+        if self.perTable:
+            rows = await session.fetch("SHOW TABLES;")
+            return [q[0] for q in rows if q[0].lower() not in self.storage.queues.nonQueueTables]
+        rows = await session.fetch("SELECT name FROM `Componants`")
+        return [c[0] for c in rows]
+
+
+    async def columns(self, session, componant):
+        if not self.perTable:
+            return list(queueColumns)
+        names = self._columns.get(componant)
+        if names is None:
+            names = [n[0] for n in await session.fetch("DESCRIBE `" + componant + "`")]
+            self._columns[componant] = names
+        return names
+
+
+    async def entries(self, session, componant, simple):
+        names = ["email", "ticket", "position"] if simple else await self.columns(session, componant)
+        table, conditions, params = self._queue(componant)
+        rows = await session.fetch("SELECT " + ", ".join("`" + n + "`" for n in names) + " FROM " + table + self._where(conditions) + " ORDER BY position", params)
+        return names, rows
+
+
+    async def countTicket(self, session, componant, ticket, forUpdate=False):
+        table, conditions, params = self._queue(componant)
+        rows = await session.fetch("SELECT COUNT(*) FROM " + table + self._where(conditions + ["`ticket` = %s"]) + (" FOR UPDATE" if forUpdate else ""), params + (ticket,))
+        return rows[0][0]
+
+
+    async def tail(self, session, componant, forUpdate=False):
+        table, conditions, params = self._queue(componant)
+        row = (await session.fetch("SELECT COALESCE(MAX(position), 0), COUNT(*) - SUM(position = 0) FROM " + table + self._where(conditions) + (" FOR UPDATE" if forUpdate else ""), params))[0]
+        return row[0], int(row[1] or 0)
+
+
+    async def lockTail(self, session, componant):
+        table, conditions, params = self._queue(componant)
+        await session.fetch("SELECT UUID FROM " + table + self._where(conditions) + " ORDER BY position DESC LIMIT 1 FOR UPDATE", params)
+
+
+    async def findTicket(self, session, componant, ticket, forUpdate=False):
+        table, conditions, params = self._queue(componant)
+        return await session.fetch("SELECT UUID, position, teamName, opened, ticket FROM " + table + self._where(conditions + ["`ticket` = %s"]) + (" FOR UPDATE" if forUpdate else ""), params + (ticket,))
+
+
+    async def insert(self, session, componant, entry):
+        if self.perTable:
+            await session.fetch("INSERT INTO `" + componant + "` (`UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s)", tuple(entry))
+        else:
+            await session.fetch("INSERT INTO `queueEntries` (`componant`, `UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", (componant,) + tuple(entry))
+
+
+    async def delete(self, session, componant, UUID):
+        await session.fetch("DELETE FROM " + self._queue(componant)[0] + " WHERE `UUID` = %s", (UUID,))
+
+
+    async def findUsers(self, session, fields, email):
+        return await session.fetch("SELECT " + ", ".join("`" + f + "`" for f in fields) + " FROM `Users` WHERE `email` = %s", (email,))
+
+
+    async def updateUser(self, session, email, values):
+        await session.fetch("UPDATE `Users` SET " + ", ".join("`" + c + "` = %s" for c in values) + " WHERE `email` = %s", tuple(values.values()) + (email,))
+
+
+    """ Method to get every code freeze as the code freeze timeline loads them. Returns a list of (begins, ends, inEffect) rows """
+    async def codeFreezes(self, session):
+        return await session.fetch("SELECT `begins`, `ends`, `inEffect` FROM `CodeFreezes`")
+
+
+    async def recordExit(self, session, componant, day, teamName, reason, bucket, waitSeconds):
+        await session.fetch("INSERT INTO `queueWaitStats` (`componant`, `day`, `teamName`, `bucket`, `exits`, `waitSeconds`) VALUES (%s, %s, %s, %s, 1, %s)" + self.storage.addOnConflict(["componant", "day", "teamName", "bucket"], ["exits", "waitSeconds"]), (componant, day, teamName or "", bucket, waitSeconds))
+        await session.fetch("INSERT INTO `queueExitReasons` (`componant`, `day`, `reasonClosed`, `exits`) VALUES (%s, %s, %s, 1)" + self.storage.addOnConflict(["componant", "day", "reasonClosed"], ["exits"]), (componant, day, reason or ""))
+
+
+
+""" Pool of aiomysql connections to the server in config. Holds at most config.asyncPoolSize connections; waiting for one gives up after config.poolTimeout seconds and idle connections are replaced after config.poolMaxIdle. Takes in the config module """
+class AsyncMySQL:
+
+    def __init__(self, config):
+        self.config = config
+        self._pool = None
+
+
+    """ Method to open the pool. Must be awaited on the loop that will use it before the first acquire """
+    async def start(self):
+        self._pool = await aiomysql.create_pool(host=self.config.host, user=self.config.user, password=self.config.password, db=self.config.database, minsize=0, maxsize=self.config.asyncPoolSize, autocommit=False, pool_recycle=self.config.poolMaxIdle)
+
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+
+
+    """ Method to lease a connection. Returns the connection, or None if none could be had in time """
+    async def acquire(self):
+        try:
+            return await asyncio.wait_for(self._pool.acquire(), self.config.poolTimeout)
+        except (asyncio.TimeoutError, MySQLError, OSError):
+            return None
+
+
+    """ Method to hand a connection back. Anything left uncommitted is rolled back first, as the pool closes connections still in a transaction """
+    async def release(self, connection):
+        try:
+            if connection.get_transaction_status():
+                await connection.rollback()
+        except (MySQLError, OSError):
+            connection.close()
+        self._pool.release(connection)
+
+
+    def isDuplicate(self, err):
+        return isinstance(err, MySQLError) and len(err.args) > 1 and err.args[0] == ER.DUP_ENTRY
+
+
+    """ Method to check if an error is a clash on a primary key, which is always a UUID """
+    def isDuplicateID(self, err):
+        return self.isDuplicate(err) and "PRIMARY" in str(err.args[1])
+
+
+    def isRetryable(self, err):
+        return isinstance(err, MySQLError) and len(err.args) > 1 and err.args[0] in (ER.LOCK_DEADLOCK, ER.LOCK_WAIT_TIMEOUT)
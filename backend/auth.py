@@ -0,0 +1,196 @@
+import threading, time, hmac, hashlib, os, json, base64
+from collections import OrderedDict
+
+
+
+""" TTL and LRU cache of verified credentials. Entries are keyed on a keyed digest of the email and password so plain passwords are never held, and can be dropped per email when the user's row changes. Each email has a generation that dropping its entries moves on, so a fill that read the row before the change can't store what it read """
+class CredentialCache:
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._byEmail = {}
+        self._generations = {}
+        self._clears = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+
+    def _key(self, email, password):
+        return hmac.new(self._secret, (email + "\0" + password).encode(), hashlib.sha256).digest()
+
+
+    """ Method to look up verified credentials. Returns the cached isAdmin value, or None if the credentials aren't cached or have expired """
+    def get(self, email, password):
+        key = self._key(email, password)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or not hmac.compare_digest(entry[0], email.encode()):
+                self.misses += 1
+                return None
+
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+
+    """ Method to get an email's generation. Must be read before the user's row is, and handed to put with what was read. Returns an opaque value """
+    def generation(self, email):
+        with self._lock:
+            return (self._clears, self._generations.get(email, 0))
+
+
+    """ Method to store credentials that were just verified against the database. Nothing is stored if the email's entries were dropped since its generation was read, as the row read may be out of date. Takes in the email, password, the user's isAdmin value and the generation read before the row """
+    def put(self, email, password, isAdmin, generation):
+        if self.size <= 0:
+            return
+
+        key = self._key(email, password)
+
+        with self._lock:
+            if generation != (self._clears, self._generations.get(email, 0)):
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (email.encode(), isAdmin, time.monotonic() + self.ttl)
+            self._byEmail.setdefault(email, set()).add(key)
+
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+
+
+    """ Method to drop every cached entry for an email. Must be called after any write to that user's row """
+    def invalidate(self, email):
+        with self._lock:
+            self._generations[email] = self._generations.get(email, 0) + 1
+            for key in list(self._byEmail.get(email, ())):
+                self._remove(key)
+
+
+    """ Method to drop every cached entry """
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._generations.clear()
+            self._entries.clear()
+            self._byEmail.clear()
+
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        email = entry[0].decode()
+        keys = self._byEmail.get(email)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._byEmail[email]
+
+
+
+# Shortest signing secret tokens are issued or accepted with. An empty or short secret would let anyone sign their own claims
+minimumSecretLength = 32
+
+
+""" Method to check a signing secret is long enough to issue and accept tokens with. Returns a boolean """
+def isUsableSecret(secret):
+    return isinstance(secret, str) and len(secret) >= minimumSecretLength
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+""" Method to create a signed session token. Raises ValueError if the secret is too short. Takes in the signing secret, a dictionary of claims and the lifetime in seconds. Returns the token as a string """
+def issueToken(secret, claims, lifetime):
+    if not isUsableSecret(secret):
+        raise ValueError("Token secret must be at least " + str(minimumSecretLength) + " characters")
+
+    now = time.time()
+    payload = dict(claims)
+    payload["iat"] = now
+    payload["exp"] = now + lifetime
+
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    signature = _b64encode(hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest())
+    return body + "." + signature
+
+
+""" Method to check a session token's signature and expiry without touching the database. Takes in the signing secret and the token. Returns the claims as a dictionary, or None if the token is invalid or expired, or the secret is too short to trust """
+def verifyToken(secret, token):
+    if not isUsableSecret(secret):
+        return None
+
+    try:
+        body, signature = token.split(".")
+        expected = _b64encode(hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(signature, expected):
+            return None
+        claims = json.loads(_b64decode(body))
+    except (ValueError, TypeError):
+        return None
+
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+# Tables holding auth state rather than componant queues
+authTables = ["TokenRevocations"]
+
+
+
+""" Revocation list checked on every token. Revoking an email invalidates every token issued to it before that moment. The list is held in memory so tokens are checked without the database, and is persisted to the `TokenRevocations` table so a restart can load it back. Entries are dropped once every token they could match has expired anyway """
+class TokenRevocations:
+
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.loaded = False
+        self._revokedAt = {}
+        self._lock = threading.Lock()
+
+
+    """ Method to add the revocations read from the database. Takes in a list of (email, revokedAt) rows """
+    def load(self, rows):
+        cutoff = time.time() - self.lifetime
+        with self._lock:
+            for email, revokedAt in rows:
+                if revokedAt >= cutoff and revokedAt > self._revokedAt.get(email, 0):
+                    self._revokedAt[email] = revokedAt
+            self.loaded = True
+
+
+    """ Method to revoke every token issued so far to an email. Returns the moment of revocation in seconds since the epoch """
+    def revoke(self, email):
+        now = time.time()
+        with self._lock:
+            self._revokedAt[email] = now
+            for e in [e for e, at in self._revokedAt.items() if at < now - self.lifetime]:
+                del self._revokedAt[e]
+        return now
+
+
+    """ Method to check if a token's claims have been revoked. Returns a boolean """
+    def isRevoked(self, claims):
+        with self._lock:
+            revokedAt = self._revokedAt.get(claims.get("email"))
+        return revokedAt is not None and claims.get("iat", 0) <= revokedAt
@@ -0,0 +1,290 @@
+""" Benchmark and load test for the queue endpoints. Runs the app in process through the Flask test client against a local storage backend, so no MySQL server is needed.
+
+Usage:
+    python benchmark.py load [options]          Drive a mixed workload and report latency, throughput and queries per request
+    python benchmark.py consistency [options]   Enter, exit and release concurrently, then check the queues are still consistent
+
+Options:
+    --backend memory|sqlite   Storage backend to run against (default memory). sqlite uses a temporary file
+    --threads N               Concurrent clients (default 8)
+    --requests N              Requests per client for load (default 500)
+    --componants N            Componants to seed (default 5)
+    --users N                 Users to seed (default 20)
+    --history N               Closed masterQueue entries to seed (default 5000)
+    --mix a=N,b=N             Relative weights of enter, exit, check and master for load (default enter=2,exit=2,check=5,master=1)
+
+Seeded users are admins so the Friday to Sunday release ban doesn't apply. Queries are counted as storage calls, each of which is one statement on the SQL backends """
+import sys, os, random, threading, tempfile, time, re, config
+from auth import isUsableSecret
+
+
+options = {
+    "backend": "memory",
+    "threads": 8,
+    "requests": 500,
+    "componants": 5,
+    "users": 20,
+    "history": 5000,
+    "mix": "enter=2,exit=2,check=5,master=1",
+}
+
+
+""" Counts storage calls made by each thread, so the calls made while serving a request can be read back once it returns """
+class QueryCounter:
+
+    uncounted = ("connect", "isDuplicate", "isRetryable", "columns")
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def wrap(self, target):
+        for name in dir(target):
+            method = getattr(target, name)
+            if not name.startswith("_") and name not in self.uncounted and callable(method):
+                setattr(target, name, self._counted(method))
+
+    def _counted(self, method):
+        def counted(*args, **kwargs):
+            self._local.count = getattr(self._local, "count", 0) + 1
+            return method(*args, **kwargs)
+        return counted
+
+    def reset(self):
+        self._local.count = 0
+
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+
+""" Method to point config at a throwaway local backend and import the app. Must run before anything else imports app. Returns the app module """
+def loadApp():
+    config.storageBackend = options["backend"]
+    if options["backend"] == "sqlite":
+        config.sqlitePath = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    config.poolSize = max(config.poolSize, options["threads"] + 2)
+    # The clients authenticate with tokens, so a throwaway secret stands in for a missing or short one
+    if not isUsableSecret(config.tokenSecret):
+        config.tokenSecret = os.urandom(32).hex()
+
+    import app
+    return app
+
+
+""" Method to seed users, componants and closed masterQueue history straight through the storage backend. Returns the componant names and a list of (email, token) pairs """
+def seed(api):
+    db = api.pool.acquire()
+    cursor = db.cursor()
+
+    componants = ["bench" + str(i) for i in range(options["componants"])]
+    for componant in componants:
+        api.storage.addComponant(cursor, componant)
+
+    password = api.passwordHasher.hash("password")
+    users = []
+    for i in range(options["users"]):
+        email = "bench" + str(i) + "@datto.com"
+        api.storage.addUser(cursor, {"UUID": "benchuser" + str(i), "firstName": "bench", "lastName": str(i), "email": email, "password": password, "team": "bench", "isAdmin": 1, "isDisabled": 0})
+        users.append(email)
+
+    now = time.time()
+    history = []
+    for i in range(options["history"]):
+        opened = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now - random.uniform(0, 30 * 86400)))
+        history.append(("benchhistory" + str(i), "HIST-" + str(i), "seeded", random.choice(componants), random.choice(users), "bench", 0, opened))
+    api.storage.addHistory(cursor, history)
+
+    db.commit()
+    db.close()
+    api.componentRegistry.invalidate()
+
+    client = api.app.test_client()
+    tokens = []
+    for email in users:
+        response = client.post('/login', json={"email": email, "password": "password"})
+        tokens.append((email, response.get_json()["token"]))
+
+    return componants, tokens
+
+
+""" Method to get the value at a percentile of a sorted list """
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def parseMix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        weights[name] = int(weight)
+    return weights
+
+
+def load(api, counter):
+    componants, tokens = seed(api)
+    weights = parseMix(options["mix"])
+    operations = list(weights)
+
+    entered = []
+    enteredLock = threading.Lock()
+    tickets = iter(range(sys.maxsize))
+    results = []
+    resultsLock = threading.Lock()
+
+    def run(index):
+        client = api.app.test_client()
+        email, token = tokens[index % len(tokens)]
+        headers = {"Authorization": "Bearer " + token}
+        samples = []
+
+        for i in range(options["requests"]):
+            operation = random.choices(operations, [weights[o] for o in operations])[0]
+
+            with enteredLock:
+                target = entered.pop(random.randrange(len(entered))) if operation == "exit" and entered else None
+            if operation == "exit" and target is None:
+                operation = "enter"
+
+            counter.reset()
+            started = time.perf_counter()
+
+            if operation == "enter":
+                componant = random.choice(componants)
+                ticket = "BENCH-" + str(next(tickets))
+                response = client.post('/enterQueue', json={"componant": componant, "ticket": ticket, "description": "benchmark"}, headers=headers)
+                if response.status_code == 200:
+                    with enteredLock:
+                        entered.append((componant, ticket))
+            elif operation == "exit":
+                response = client.delete('/exitQueue', json={"componant": target[0], "ticket": target[1], "reason": "benchmark"}, headers=headers)
+            elif operation == "check":
+                response = client.get('/checkQueue', json={"componant": random.choice(componants), "simple": True})
+            else:
+                response = client.get('/checkMasterQueue', json={"simple": True, "daysBack": 7, "byComponant": False})
+
+            samples.append((operation, time.perf_counter() - started, counter.count(), response.status_code))
+
+        with resultsLock:
+            results.extend(samples)
+
+    started = time.perf_counter()
+    runThreads(run)
+    elapsed = time.perf_counter() - started
+
+    print("backend " + options["backend"] + ", " + str(options["threads"]) + " threads, " + str(len(results)) + " requests in " + format(elapsed, ".2f") + "s, " + format(len(results) / elapsed, ".1f") + " requests/s")
+    print("")
+    print("operation   requests     errors   p50 ms   p95 ms   p99 ms   queries/request")
+    for operation in operations + ["all"]:
+        samples = [s for s in results if operation in ("all", s[0])]
+        if not samples:
+            continue
+        latencies = sorted(s[1] * 1000 for s in samples)
+        errors = sum(1 for s in samples if s[3] >= 400)
+        print(operation.ljust(10) + str(len(samples)).rjust(10) + str(errors).rjust(11) + "".join(format(percentile(latencies, f), ".2f").rjust(9) for f in (0.5, 0.95, 0.99)) + format(sum(s[2] for s in samples) / len(samples), ".1f").rjust(18))
+
+
+""" Method to check a componant's stored queue against its invariants. Returns a list of problems found """
+def queueProblems(api, componant):
+    # masterQueue is written behind the requests, so let it catch up first
+    api.historyWriter.flush()
+
+    db = api.pool.acquire()
+    cursor = db.cursor()
+    try:
+        names, entries = api.queueStore.entries(cursor, componant, False)
+        active = api.storage.historyPage(cursor, ["UUID", "componant", "active"], {"componant": componant, "active": 1}, None, None, False, sys.maxsize)
+    finally:
+        db.close()
+
+    entries = [dict(zip(names, e)) for e in entries]
+    positions = [e['position'] for e in entries]
+    tickets = [e['ticket'] for e in entries]
+    problems = []
+
+    # Several entries may be releasing at once, but everyone waiting must have a position of their own
+    waiting = [p for p in positions if p != 0]
+    if len(set(waiting)) != len(waiting):
+        problems.append(componant + ": duplicate positions " + str(sorted(waiting)))
+    if len(set(tickets)) != len(tickets):
+        problems.append(componant + ": duplicate tickets")
+    if set(e['UUID'] for e in entries) != set(a[0] for a in active):
+        problems.append(componant + ": queue and active masterQueue entries differ")
+    return problems
+
+
+def consistency(api, counter):
+    componants, tokens = seed(api)
+    componant = componants[0]
+    problems = []
+    problemsLock = threading.Lock()
+    perClient = 20
+
+    # Everyone enters at once. The positions handed out must be exactly 1 to n
+    reported = []
+    def enter(index):
+        client = api.app.test_client()
+        email, token = tokens[index % len(tokens)]
+        for i in range(perClient):
+            response = client.post('/enterQueue', json={"componant": componant, "ticket": "C-" + str(index) + "-" + str(i), "description": "consistency"}, headers={"Authorization": "Bearer " + token})
+            with problemsLock:
+                if response.status_code != 200:
+                    problems.append("enterQueue returned " + str(response.status_code))
+                else:
+                    reported.append(int(re.search(r"(\d+)$", response.get_data(as_text=True)).group(1)))
+    runThreads(enter)
+
+    expected = list(range(1, options["threads"] * perClient + 1))
+    if sorted(reported) != expected:
+        problems.append("enterQueue reported positions " + str(sorted(reported)[:10]) + "... instead of 1 to " + str(len(expected)))
+    problems += queueProblems(api, componant)
+
+    # Half of each client's tickets leave while priority entries and releases race them
+    def churn(index):
+        client = api.app.test_client()
+        email, token = tokens[index % len(tokens)]
+        headers = {"Authorization": "Bearer " + token}
+        for i in range(0, perClient, 2):
+            client.delete('/exitQueue', json={"componant": componant, "ticket": "C-" + str(index) + "-" + str(i), "reason": "consistency"}, headers=headers)
+            client.post('/priorityQueueEntry', json={"componant": componant, "ticket": "P-" + str(index) + "-" + str(i), "description": "consistency"}, headers=headers)
+            client.put('/releasing', json={"componant": componant, "ticket": "C-" + str(index) + "-" + str(i + 1)}, headers=headers)
+    runThreads(churn)
+    problems += queueProblems(api, componant)
+
+    if problems:
+        print("FAILED")
+        for problem in problems:
+            print("  " + problem)
+        sys.exit(1)
+    print("Consistent: " + str(len(reported)) + " concurrent entries, positions 1 to " + str(len(expected)) + " each handed out once")
+
+
+def runThreads(target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(options["threads"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ("load", "consistency"):
+        print(__doc__)
+        sys.exit(1)
+
+    arguments = sys.argv[2:]
+    for flag, value in zip(arguments[::2], arguments[1::2]):
+        name = flag.lstrip("-")
+        if name not in options:
+            print(__doc__)
+            sys.exit(1)
+        options[name] = value if isinstance(options[name], str) else int(value)
+
+    api = loadApp()
+    counter = QueryCounter()
+    counter.wrap(api.storage)
+    counter.wrap(api.storage.queues)
+
+    if sys.argv[1] == "load":
+        load(api, counter)
+    else:
+        consistency(api, counter)
@@ -0,0 +1,132 @@
+""" Invalidation bus between API nodes. When a node changes a queue, user, code freeze or the componant list it publishes a small message saying what changed, and every other node applies it to its own caches and event subscribers. Messages are dictionaries with a "type" and whatever keys that type needs; the bus adds the publishing node's id so a node can skip its own messages.
+
+    local   LocalBus. Delivers to the other LocalBus nodes started in the same process, so a single node deployment publishes to no one
+    file    FileBus. Appends messages to a shared file that every node tails. A stand-in for a real broker, for several processes on one host or a shared disk
+"""
+import threading, json, os, time
+from ids import newID
+
+
+_localNodes = []
+_localLock = threading.Lock()
+
+
+
+""" Bus between the nodes of one process. Messages are handed straight to every other started LocalBus, on the publisher's thread """
+class LocalBus:
+
+    def __init__(self):
+        self.node = newID()
+        self._handler = None
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+
+
+    """ Method to start delivering other nodes' messages. Takes in a function taking the message """
+    def start(self, handler):
+        self._handler = handler
+        with _localLock:
+            if self not in _localNodes:
+                _localNodes.append(self)
+
+
+    def stop(self):
+        with _localLock:
+            if self in _localNodes:
+                _localNodes.remove(self)
+
+
+    def publish(self, message):
+        message = dict(message, node=self.node)
+        self.published += 1
+        with _localLock:
+            others = [n for n in _localNodes if n is not self]
+        for other in others:
+            other._deliver(message)
+
+
+    def _deliver(self, message):
+        self.received += 1
+        try:
+            self._handler(message)
+        except Exception as err:
+            self.failed += 1
+            print("Bus message failed: " + str(err), flush=True)
+
+
+    def stats(self):
+        return {"published": self.published, "received": self.received, "failed": self.failed}
+
+
+
+""" Bus through a file shared by every node. Each message is one JSON line appended with O_APPEND, so lines from different processes never interleave. A daemon thread follows the file from where it ended when the bus was created and hands every other node's lines to the handler. The file is never trimmed; truncating it is safe, as readers start again from the top. Takes in the file's path and how often to check it for new lines, in seconds """
+class FileBus(LocalBus):
+
+    def __init__(self, path, pollInterval):
+        LocalBus.__init__(self)
+        self.path = path
+        self.pollInterval = pollInterval
+
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._offset = os.path.getsize(path)
+        self._thread = None
+
+
+    def start(self, handler):
+        self._handler = handler
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="FileBus", daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        pass
+
+
+    def publish(self, message):
+        line = json.dumps(dict(message, node=self.node), separators=(",", ":")) + "\n"
+        os.write(self._fd, line.encode())
+        self.published += 1
+
+
+    def _run(self):
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            pending = b""
+
+            while True:
+                chunk = file.readline()
+
+                if not chunk:
+                    if os.path.getsize(self.path) < file.tell():
+                        file.seek(0)
+                        pending = b""
+                    time.sleep(self.pollInterval)
+                    continue
+
+                # A line still being written comes back without its newline; keep it until the rest arrives
+                pending += chunk
+                if not pending.endswith(b"\n"):
+                    continue
+                line, pending = pending, b""
+
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self.failed += 1
+                    continue
+
+                if message.get("node") != self.node:
+                    self._deliver(message)
+
+
+
+""" Method to build the bus selected by config.busBackend. Takes in the config module. Returns a bus """
+def createBus(config):
+    if config.busBackend == "local":
+        return LocalBus()
+    elif config.busBackend == "file":
+        return FileBus(config.busPath, config.busPollInterval)
+    else:
+        raise ValueError("Unknown busBackend " + str(config.busBackend))
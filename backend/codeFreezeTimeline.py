@@ -0,0 +1,87 @@
+import threading, time, bisect
+from datetime import date, datetime, timedelta
+
+
+
+""" In memory timeline of the code freezes that are or will be in effect, sorted by begin date. Answers whether a day is frozen with a binary search and no database access. Loaded once with the given loader and then reloaded when the refresh interval has passed or on demand. Takes in a loader that takes a cursor and returns (begins, ends, inEffect) rows, and the refresh interval in seconds (0 to never refresh automatically) """
+class CodeFreezeTimeline:
+
+    def __init__(self, loader, refreshInterval):
+        self.loader = loader
+        self.refreshInterval = refreshInterval
+
+        self._begins = []
+        self._maxEnds = []
+        self._loadedAt = None
+        self._lock = threading.Lock()
+
+
+    """ Method to reload the freezes from the database. A freeze counts if it ends today or later, the same range updateCodeFreezes puts into effect, whether or not the scheduler has flipped inEffect on yet. Freezes ended early have an end date before today so never match. Takes in the cursor """
+    def load(self, cursor):
+        self.update(self.loader(cursor))
+
+
+    """ Method to replace the freezes with rows read elsewhere, such as on the event loop. Takes in a list of (begins, ends, inEffect) rows """
+    def update(self, rows):
+        today = date.today()
+        freezes = sorted((begins, ends) for begins, ends, inEffect in rows if ends >= today)
+
+        # maxEnds[i] is the latest end of any freeze beginning at or before begins[i], so overlapping freezes need no scan
+        maxEnds = []
+        for begins, ends in freezes:
+            maxEnds.append(max(ends, maxEnds[-1]) if maxEnds else ends)
+
+        with self._lock:
+            self._begins = [f[0] for f in freezes]
+            self._maxEnds = maxEnds
+            self._loadedAt = time.monotonic()
+
+
+    """ Method to mark the timeline as stale so the next lookup reloads it """
+    def invalidate(self):
+        with self._lock:
+            self._loadedAt = None
+
+
+    """ Method to check if the timeline needs loading. Returns a boolean """
+    def isStale(self):
+        loadedAt = self._loadedAt
+        return loadedAt is None or (self.refreshInterval > 0 and time.monotonic() - loadedAt > self.refreshInterval)
+
+
+    """ Method to check if a code freeze covers a day. Takes in the cursor, only used if the timeline needs loading, or None to use what is loaded, and optionally the day, today by default. Returns a boolean """
+    def inEffect(self, cursor, day=None):
+        if cursor is not None and self.isStale():
+            self.load(cursor)
+
+        day = day or date.today()
+        with self._lock:
+            index = bisect.bisect_right(self._begins, day) - 1
+            return index >= 0 and self._maxEnds[index] >= day
+
+
+
+""" Runs a task on a daemon thread once when started and then just after every local midnight, when code freezes begin and end """
+class MidnightScheduler:
+
+    def __init__(self, task):
+        self.task = task
+        self._thread = None
+
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="MidnightScheduler", daemon=True)
+            self._thread.start()
+
+
+    def _run(self):
+        while True:
+            try:
+                self.task()
+            except Exception as err:
+                print("Scheduled task failed: " + str(err), flush=True)
+
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            time.sleep((midnight - now).total_seconds() + 1)
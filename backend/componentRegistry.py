@@ -0,0 +1,59 @@
+import threading, time
+
+
+
+""" In memory set of the componants users can queue in. Loaded once with the given loader and then reloaded when the refresh interval has passed or on demand. Takes in a loader that takes a cursor and returns the componant names, and the refresh interval in seconds (0 to never refresh automatically) """
+class ComponentRegistry:
+
+    def __init__(self, loader, refreshInterval):
+        self.loader = loader
+        self.refreshInterval = refreshInterval
+
+        self._names = frozenset()
+        self._sorted = []
+        self._loadedAt = None
+        self._lock = threading.Lock()
+
+
+    """ Method to reload the componants from the database. Takes in the cursor. Returns the sorted list of names """
+    def load(self, cursor):
+        return self.update(self.loader(cursor))
+
+
+    """ Method to replace the componants with names read elsewhere, such as on the event loop. Takes in the names. Returns the sorted list of names """
+    def update(self, names):
+        names = frozenset(names)
+        with self._lock:
+            self._names = names
+            self._sorted = sorted(names)
+            self._loadedAt = time.monotonic()
+            return list(self._sorted)
+
+
+    """ Method to mark the registry as stale so the next lookup reloads it """
+    def invalidate(self):
+        with self._lock:
+            self._loadedAt = None
+
+
+    """ Method to check if the registry needs loading. Returns a boolean """
+    def isStale(self):
+        loadedAt = self._loadedAt
+        return loadedAt is None or (self.refreshInterval > 0 and time.monotonic() - loadedAt > self.refreshInterval)
+
+
+    def _ensureLoaded(self, cursor):
+        if cursor is not None and self.isStale():
+            self.load(cursor)
+
+
+    """ Method to get every componant name. Takes in the cursor, only used if the registry needs loading, or None to use what is loaded. Returns a sorted list of names """
+    def names(self, cursor):
+        self._ensureLoaded(cursor)
+        return list(self._sorted)
+
+
+    """ Method to check if a componant exists. Takes in the cursor, only used if the registry needs loading, or None to use what is loaded, and the componant name. Returns a boolean """
+    def contains(self, cursor, name):
+        self._ensureLoaded(cursor)
+        return name in self._names
@@ -8,4 +8,71 @@ database = "" #Insert database to be accessed here.
 
 activationLocations = [] #Insert 7 integers between 0 and 32 here
 
-salts = [""] #Insert list of salts here.
\ No newline at end of file
+salts = [""] #Insert list of salts here. Only used to check passwords still stored with the legacy MD5 hash, which are rehashed on their next login.
+
+passwordHashAlgorithm = "scrypt" #Algorithm for new password hashes, "scrypt" or "pbkdf2_sha256". Changing it or the costs below rehashes each password on its next login. The mysql backend needs `python migrateQueues.py widenPasswords` run once if `Users`.`password` is narrower than 255 characters.
+scryptCost = 16384 #scrypt N. Must be a power of 2. Memory used per hash is 128 * N * scryptBlockSize bytes.
+scryptBlockSize = 8 #scrypt r.
+scryptParallelism = 1 #scrypt p.
+pbkdf2Iterations = 600000 #Iterations of PBKDF2-HMAC-SHA256.
+passwordHashWorkers = 4 #Threads hashing passwords. Caps the cores a burst of logins can take from other requests.
+
+poolSize = 10 #Maximum number of open database connections.
+poolTimeout = 5 #Seconds to wait for a free connection before giving up.
+poolMaxIdle = 300 #Seconds a connection may sit unused before it is closed.
+poolHealthCheckAfter = 30 #Seconds a connection may sit unused before it is pinged on checkout.
+
+credentialCacheSize = 1000 #Maximum number of verified logins kept in memory. 0 disables the cache.
+credentialCacheTTL = 300 #Seconds a verified login is trusted before the password is checked against the database again.
+
+tokenSecret = "" #Insert a random string of at least 32 characters used to sign session tokens here. /login and bearer tokens are disabled until it is set.
+tokenLifetime = 3600 #Seconds a session token from /login stays valid.
+
+storageBackend = "mysql" #"mysql" uses the server above. "sqlite" uses the file at sqlitePath. "memory" keeps everything in the process and loses it on restart.
+sqlitePath = "queue.db" #Database file used by the sqlite backend. Created with every table if it doesn't exist.
+
+queueStorage = "perTable" #Only used by the mysql backend. "perTable" keeps each componant in its own table. "singleTable" keeps every entry in `queueEntries` (see migrateQueues.py).
+nonQueueTables = ["Users", "masterQueue", "CodeFreezes", "Componants", "queueEntries"] #Tables that are not componant queues when using perTable storage.
+componentRefreshInterval = 300 #Seconds between reloads of the componant list. 0 only reloads through /refreshQueueNames.
+
+transactionRetries = 3 #Times a queue transaction is retried after a deadlock or lock wait timeout.
+transactionRetryDelay = 0.05 #Seconds of random backoff per retry.
+
+eventBufferSize = 100 #Events held per /queueEvents subscriber before the oldest are dropped.
+eventHeartbeat = 15 #Seconds between keepalive comments on idle /queueEvents streams.
+
+queueCacheTTL = 5 #Seconds a cached /checkQueue response may be served. Bounds staleness from writes made by other processes.
+
+historyPageSize = 100 #Default number of entries per /masterQueueHistory page.
+historyMaxPageSize = 1000 #Largest limit a /masterQueueHistory caller may ask for.
+
+exportBatchSize = 1000 #Rows fetched from the database per batch by /exportMasterQueue.
+
+releaseModelWindow = 50 #Recent releases per componant used to estimate when each checkQueue entry will get to release.
+releaseModelDays = 30 #Days of masterQueue history the release estimates are seeded from at startup.
+
+busBackend = "local" #"local" for a single node. "file" shares cache invalidations and queue events between nodes through the file at busPath.
+busPath = "bus.ndjson" #File every node appends to and follows when busBackend is "file". Must be on storage all the nodes share.
+busPollInterval = 0.2 #Seconds between checks of busPath for other nodes' messages.
+
+journalPath = "queueJournal.ndjson" #Append only journal of every queue mutation, replayable with replayJournal.py. Empty to turn the journal off.
+journalGroupWindow = 0 #Seconds the journal waits to gather more records before each write and fsync. 0 still batches whatever arrives during the previous fsync.
+journalSync = True #Wait for a mutation's journal record to reach disk before responding.
+historyQueueSize = 10000 #Most masterQueue rows waiting to be written before endpoints block, for up to historyPutTimeout, until the background writer catches up.
+historyBatchSize = 200 #Most masterQueue rows the background writer writes per transaction.
+historyBatchInterval = 0.05 #Seconds the background writer waits for a batch to fill before writing what it has.
+historySpillPath = "historySpill.ndjson" #File unwritten masterQueue rows are saved to on shutdown and written from on the next start.
+historyStopTimeout = 10 #Seconds to wait for the background writer to drain on shutdown before spilling what is left.
+historyFlushTimeout = 10 #Seconds /emptyAllQueues waits for the background writer to drain before giving up with a 503.
+historyPutTimeout = 5 #Seconds an endpoint waits for room in a full masterQueue write queue before writing its rows itself.
+historyMaxRetries = 8 #Attempts the background writer makes at a failing batch before moving it to historyDeadLetterPath.
+historyDeadLetterPath = "historyDeadLetter.ndjson" #File masterQueue rows that couldn't be written are saved to. Not retried automatically; move it to historySpillPath and restart to retry.
+
+statsTopReasons = 10 #Most common exit reasons listed by /queueStats. The mysql backend needs `python migrateQueues.py addQueueStats` run once before exitQueue can record them.
+
+asgiWorkerThreads = 10 #Threads running Flask endpoints under asgi.py. Keep it at or below poolSize so every thread can get a connection.
+asyncPoolSize = 50 #Most aiomysql connections asgi.py holds for /checkQueue, /enterQueue and /exitQueue, which it serves on the event loop with the mysql backend. 0 hands them to the Flask threads like every other route.
+
+slowQuerySeconds = 0.5 #Statements taking at least this many seconds are printed with their SQL. 0 turns the slow query log off.
+
+codeFreezeRefreshInterval = 60 #Seconds between reloads of the code freeze timeline. Bounds staleness from freezes changed by other processes.
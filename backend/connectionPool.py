@@ -0,0 +1,196 @@
+import threading, time
+from collections import deque
+
+
+
+""" Wrapper handed out by the pool in place of a raw connection. Calling close() returns the connection to the pool instead of closing it, so closeConnection works unchanged. Takes in the pool, the connection and the pool's generation when it was leased """
+class PooledConnection:
+
+    def __init__(self, pool, connection, generation):
+        self._pool = pool
+        self._connection = connection
+        self._generation = generation
+        self._cursors = []
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __bool__(self):
+        return not self._released
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._connection.cursor(*args, **kwargs)
+        self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+
+        for cursor in self._cursors:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._cursors = []
+
+        self._pool.release(self._connection, self._generation)
+
+
+""" Bounded, thread safe pool of database connections. Takes in a factory that returns a new connection (or False on failure), the maximum number of connections, how long to wait for a free connection, how long a connection may sit idle before being evicted and how long it may sit idle before being pinged on checkout """
+class ConnectionPool:
+
+    def __init__(self, factory, size, timeout, maxIdle, healthCheckAfter):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.maxIdle = maxIdle
+        self.healthCheckAfter = healthCheckAfter
+
+        self._idle = deque()
+        self._total = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "evicted": 0,
+            "failedHealthChecks": 0,
+            "connectErrors": 0,
+        }
+
+
+    """ Method to lease a connection. Returns a PooledConnection, or False if no connection could be made or none became free within the timeout """
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            stale = []
+            connection = None
+            create = False
+
+            with self._condition:
+                while self._idle:
+                    candidate, lastUsed = self._idle.pop()
+                    idleFor = time.monotonic() - lastUsed
+                    if idleFor > self.maxIdle:
+                        stale.append(candidate)
+                        self._total -= 1
+                        self._stats["evicted"] += 1
+                        continue
+                    connection = (candidate, idleFor)
+                    break
+
+                if connection is None and not stale:
+                    if self._total < self.size:
+                        self._total += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            return False
+                        if not waited:
+                            self._stats["waits"] += 1
+                            waited = True
+                        self._condition.wait(remaining)
+                        continue
+
+            for s in stale:
+                self._closeQuietly(s)
+
+            if create:
+                return self._create()
+
+            if connection is None:
+                continue
+
+            candidate, idleFor = connection
+            if idleFor > self.healthCheckAfter and not self._healthy(candidate):
+                self._stats["failedHealthChecks"] += 1
+                self._discard(candidate)
+                continue
+
+            with self._condition:
+                self._stats["checkouts"] += 1
+                generation = self._generation
+            return PooledConnection(self, candidate, generation)
+
+
+    """ Method to return a connection to the pool. Any open transaction is rolled back so the next lease starts clean. A connection leased before the last closeAll is closed instead. Takes in the connection and the generation it was leased in """
+    def release(self, connection, generation):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+
+        with self._condition:
+            current = generation == self._generation
+            if current:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+
+        if not current:
+            self._discard(connection)
+
+
+    """ Method to get a snapshot of the pool's counters. Returns a dictionary """
+    def stats(self):
+        with self._condition:
+            returnable = dict(self._stats)
+            returnable["size"] = self.size
+            returnable["open"] = self._total
+            returnable["idle"] = len(self._idle)
+            returnable["inUse"] = self._total - len(self._idle)
+        return returnable
+
+
+    """ Method to close every idle connection. Connections currently leased are closed when they are returned """
+    def closeAll(self):
+        with self._condition:
+            self._generation += 1
+            idle = [c for c, lastUsed in self._idle]
+            self._idle.clear()
+            self._total -= len(idle)
+        for connection in idle:
+            self._closeQuietly(connection)
+
+
+    def _create(self):
+        connection = self.factory()
+        with self._condition:
+            if not connection:
+                self._total -= 1
+                self._stats["connectErrors"] += 1
+                self._condition.notify()
+                return False
+            self._stats["created"] += 1
+            self._stats["checkouts"] += 1
+            generation = self._generation
+        return PooledConnection(self, connection, generation)
+
+    def _healthy(self, connection):
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        self._closeQuietly(connection)
+        with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    def _closeQuietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
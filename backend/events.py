@@ -0,0 +1,118 @@
+import threading, json, queue, itertools, asyncio
+
+
+
+""" A single subscription to a componant. Holds a bounded buffer of events; if the subscriber falls too far behind the oldest events are dropped """
+class Subscriber:
+
+    def __init__(self, componant, size):
+        self.componant = componant
+        self._events = queue.Queue(size)
+
+    def push(self, event):
+        while True:
+            try:
+                self._events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._events.get_nowait()
+                except queue.Empty:
+                    pass
+
+    """ Method to wait for the next event. Returns the event, or None if nothing arrived within timeout seconds """
+    def next(self, timeout):
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+
+""" A subscription read from an asyncio event loop. Publishers run on worker threads, so events are handed to the loop rather than put on the buffer directly """
+class AsyncSubscriber:
+
+    def __init__(self, componant, size, loop):
+        self.componant = componant
+        self._events = asyncio.Queue(size)
+        self._loop = loop
+
+    def push(self, event):
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self._events.full():
+            self._events.get_nowait()
+        self._events.put_nowait(event)
+
+    """ Method to wait for the next event. Returns the event, or None if nothing arrived within timeout seconds """
+    async def next(self, timeout):
+        try:
+            return await asyncio.wait_for(self._events.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+
+""" In process fan out of queue events. One hub per process; endpoints publish after they commit and every subscriber of that componant gets a copy """
+class EventHub:
+
+    def __init__(self, bufferSize):
+        self.bufferSize = bufferSize
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+
+    def subscribe(self, componant):
+        return self._add(Subscriber(componant, self.bufferSize))
+
+
+    """ Method to subscribe from code running on an asyncio event loop. Takes in the componant and the loop. Returns an AsyncSubscriber """
+    def subscribeAsync(self, componant, loop):
+        return self._add(AsyncSubscriber(componant, self.bufferSize, loop))
+
+
+    def _add(self, subscriber):
+        with self._lock:
+            self._subscribers.setdefault(subscriber.componant, set()).add(subscriber)
+        return subscriber
+
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.componant)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.componant]
+
+
+    """ Method to check if anyone is listening to a componant, so publishers can skip building events nobody will read. Returns a boolean """
+    def hasSubscribers(self, componant):
+        return componant in self._subscribers
+
+
+    """ Method to send an event to every subscriber of a componant. Takes in the componant, the event type and a JSON serialisable payload """
+    def publish(self, componant, eventType, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(componant, ()))
+        if not subscribers:
+            return
+
+        event = (next(self._ids), eventType, data)
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+
+    """ Method to count the current subscribers. Returns a dictionary of componant to subscriber count """
+    def stats(self):
+        with self._lock:
+            return {c: len(s) for c, s in self._subscribers.items()}
+
+
+
+""" Method to format an event for a text/event-stream response. Returns a string """
+def formatEvent(event):
+    eventId, eventType, data = event
+    return "id: " + str(eventId) + "\nevent: " + eventType + "\ndata: " + json.dumps(data, default=str) + "\n\n"
@@ -0,0 +1,229 @@
+import threading, time, json, os
+from collections import deque
+
+
+
+""" Write behind queue for masterQueue. Endpoints hand it rows once their queue transaction has committed and return without waiting; a background thread writes them in batches of up to batchSize rows, or whatever has arrived after interval seconds, as one multi-row insert and one batched update per transaction. Writes stay in order, so an entry's close never lands before its insert.
+
+The queue holds at most size rows. When it is full, callers block for up to putTimeout seconds for the writer to catch up, so a slow database pushes back on the endpoints instead of growing memory; after that they write their rows themselves. A batch that still fails after maxRetries attempts is moved to deadLetterPath so it can't hold up the rows behind it. On stop, whatever can't be written in time is spilled to spillPath as JSON lines and queued again by the next start. Dead lettered rows use the same format and are not queued again automatically; move the file to spillPath to retry them. Takes in the storage backend, the connection pool, the queue size, batch size, batch interval in seconds, the spill file path, the retry limit, the put timeout in seconds and the dead letter file path """
+class HistoryWriter:
+
+    def __init__(self, storage, pool, size, batchSize, interval, spillPath, maxRetries, putTimeout, deadLetterPath):
+        self.storage = storage
+        self.pool = pool
+        self.size = size
+        self.batchSize = batchSize
+        self.interval = interval
+        self.spillPath = spillPath
+        self.maxRetries = maxRetries
+        self.putTimeout = putTimeout
+        self.deadLetterPath = deadLetterPath
+
+        self._queue = deque()
+        self._inFlight = []
+        self._condition = threading.Condition()
+        self._writeLock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.blocked = 0
+        self.blockedSeconds = 0.0
+        self.spilled = 0
+        self.overflowed = 0
+        self.deadLettered = 0
+
+
+    """ Method to queue spilled rows from the last run and start the writer thread """
+    def start(self):
+        if self._thread is not None:
+            return
+
+        if self.spillPath and os.path.exists(self.spillPath):
+            with open(self.spillPath) as file:
+                items = [tuple(json.loads(line)) for line in file if line.strip()]
+            with self._condition:
+                self._queue.extend((kind, tuple(row)) for kind, row in items)
+            os.remove(self.spillPath)
+            print("HistoryWriter: requeued " + str(len(items)) + " spilled rows", flush=True)
+
+        self._thread = threading.Thread(target=self._run, name="HistoryWriter", daemon=True)
+        self._thread.start()
+
+
+    """ Method to queue new masterQueue rows. Takes in a list of (UUID, ticket, description, componant, email, teamName, active, opened) tuples """
+    def add(self, rows):
+        self._put([("add", tuple(row)) for row in rows])
+
+
+    """ Method to queue closing a masterQueue entry. Takes in the UUID, the time it closed and the reason """
+    def close(self, UUID, closed, reason):
+        self._put([("close", (closed, reason, UUID))])
+
+
+    def _put(self, items):
+        with self._condition:
+            if len(self._queue) + len(items) > self.size and not self._stopping:
+                self.blocked += 1
+                started = time.perf_counter()
+                deadline = time.monotonic() + self.putTimeout
+                while len(self._queue) + len(items) > self.size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self.blockedSeconds += time.perf_counter() - started
+
+            if len(self._queue) + len(items) <= self.size or self._stopping:
+                self._queue.extend(items)
+                self._condition.notify_all()
+                return
+
+            # Still full, so write these rows here. A close whose insert is still queued takes a copy of the insert along; the queued one is then skipped as a duplicate
+            closing = set(row[2] for kind, row in items if kind == "close")
+            batch = [item for item in self._inFlight + list(self._queue) if item[0] == "add" and item[1][0] in closing] + items
+
+        if self._write(batch):
+            with self._condition:
+                self.overflowed += len(items)
+        else:
+            self._deadLetter(batch)
+
+
+    """ Method to wait until every queued row has been written. Takes in the most seconds to wait, or None for no limit. Returns a boolean indicating if the queue drained """
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._inFlight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+
+    """ Method to stop the writer. Waits up to timeout seconds for the queue to drain, then spills anything left so the next start can write it. Takes in the timeout """
+    def stop(self, timeout):
+        self.flush(timeout)
+
+        with self._condition:
+            self._stopping = True
+            # A batch still being written is spilled as well; rows it already wrote are skipped as duplicates when it is replayed
+            items = self._inFlight + list(self._queue)
+            self._queue.clear()
+            self._condition.notify_all()
+
+        if items and self.spillPath:
+            self._append(self.spillPath, items)
+            self.spilled += len(items)
+            print("HistoryWriter: spilled " + str(len(items)) + " rows to " + self.spillPath, flush=True)
+
+
+    """ Method to set aside rows that couldn't be written. Takes in a list of queued items """
+    def _deadLetter(self, items):
+        with self._condition:
+            self.deadLettered += len(items)
+        if self.deadLetterPath:
+            self._append(self.deadLetterPath, items)
+            print("HistoryWriter: moved " + str(len(items)) + " unwritable rows to " + self.deadLetterPath, flush=True)
+        else:
+            print("HistoryWriter: dropped " + str(len(items)) + " unwritable rows", flush=True)
+
+
+    """ Method to append queued items to a file as JSON lines. Takes in the file path and a list of queued items """
+    def _append(self, path, items):
+        with self._writeLock:
+            with open(path, "a") as file:
+                for item in items:
+                    file.write(json.dumps(item, default=str) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+
+    def stats(self):
+        with self._condition:
+            depth = len(self._queue) + len(self._inFlight)
+        return {"depth": depth, "size": self.size, "written": self.written, "batches": self.batches, "failures": self.failures, "blocked": self.blocked, "blockedSeconds": self.blockedSeconds, "spilled": self.spilled, "overflowed": self.overflowed, "deadLettered": self.deadLettered}
+
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+
+                # Give a partial batch until the interval is up to fill
+                deadline = time.monotonic() + self.interval
+                while len(self._queue) < self.batchSize and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                while self._queue and len(self._inFlight) < self.batchSize:
+                    self._inFlight.append(self._queue.popleft())
+                batch = list(self._inFlight)
+                self._condition.notify_all()
+
+            attempt = 0
+            written = self._write(batch)
+            while not written and attempt < self.maxRetries:
+                attempt += 1
+                if self._stopping:
+                    return
+                time.sleep(min(5, 0.1 * 2 ** attempt))
+                written = self._write(batch)
+
+            if not written:
+                self._deadLetter(batch)
+
+            with self._condition:
+                self._inFlight = []
+                if written:
+                    self.written += len(batch)
+                    self.batches += 1
+                self._condition.notify_all()
+
+
+    """ Method to write a batch in one transaction. If a row is already in masterQueue, as after replaying a spill, the batch is written again a row at a time skipping duplicates. Returns a boolean indicating success """
+    def _write(self, batch, oneByOne=False):
+        db = self.pool.acquire()
+        if not db:
+            self.failures += 1
+            return False
+
+        cursor = db.cursor()
+        try:
+            added = [row for kind, row in batch if kind == "add"]
+            closed = [row for kind, row in batch if kind == "close"]
+
+            if oneByOne:
+                for row in added:
+                    try:
+                        self.storage.addHistory(cursor, [row])
+                    except Exception as err:
+                        if not self.storage.isDuplicateID(err):
+                            raise
+            elif added:
+                self.storage.addHistory(cursor, added)
+
+            if closed:
+                self.storage.closeHistoryMany(cursor, closed)
+
+            db.commit()
+            return True
+        except Exception as err:
+            db.rollback()
+            if not (self.storage.isDuplicateID(err) and not oneByOne):
+                self.failures += 1
+                print("HistoryWriter: batch failed: " + str(err), flush=True)
+                return False
+        finally:
+            cursor.close()
+            db.close()
+
+        return self._write(batch, True)
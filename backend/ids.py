@@ -0,0 +1,30 @@
+import threading, time, os
+
+
+_lock = threading.Lock()
+_lastMillis = 0
+_sequence = 0
+
+
+""" Method to generate a time ordered UUID (version 7). The first 48 bits are the Unix time in milliseconds and the next 12 count up within a millisecond, so IDs from one process sort in creation order and new rows append to the end of an index. The remaining 62 bits are random. Returns the UUID as 32 lowercase hex characters, the format every UUID column already holds """
+def newID():
+    global _lastMillis, _sequence
+
+    with _lock:
+        millis = int(time.time() * 1000)
+        if millis > _lastMillis:
+            _lastMillis = millis
+            _sequence = int.from_bytes(os.urandom(2), "big") & 0x3FF
+        else:
+            _sequence += 1
+            if _sequence > 0xFFF:
+                _lastMillis += 1
+                _sequence = 0
+        millis, sequence = _lastMillis, _sequence
+
+    value = (millis & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= sequence << 64
+    value |= 0b10 << 62
+    value |= int.from_bytes(os.urandom(8), "big") & 0x3FFFFFFFFFFFFFFF
+    return format(value, "032x")
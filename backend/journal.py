@@ -0,0 +1,143 @@
+""" Append only audit journal of queue mutations, one JSON object per line. Records are appended once their transaction has committed and carry enough to rebuild the queues and masterQueue from an empty database (see replayJournal.py):
+
+    enter       componant, entry        An entry joined a queue. entry holds every queueEntries column
+    priority    componant, entry        A priority entry joined a queue
+    releasing   componant, UUID, ticket The entry started releasing, moving to position 0
+    exit        componant, UUID, ticket, closed, reason
+    describe    componant, ticket, email, description
+    empty       componants              Every queue and all of masterQueue were emptied
+
+Every record also has "at", the time it was appended, in ISO format.
+"""
+import threading, json, os, time, asyncio
+from datetime import datetime
+
+
+
+""" Stands in for a threading.Event when the waiter is a coroutine. The writer thread sets it, and the future is resolved on the waiter's loop """
+class LoopSignal:
+
+    def __init__(self, loop):
+        self.future = loop.create_future()
+        self._loop = loop
+
+    def set(self):
+        self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+
+""" Writes journal records with group commit. Appending only queues the record; a writer thread writes everything queued since its last write and fsyncs once for the whole batch, so concurrent requests share one fsync instead of paying for their own. Takes in the journal's path and how many seconds the writer waits for more records before each write, 0 to write as soon as anything is queued """
+class Journal:
+
+    def __init__(self, path, groupWindow):
+        self.path = path
+        self.groupWindow = groupWindow
+
+        self._file = open(path, "ab")
+        self._pending = []
+        self._condition = threading.Condition()
+
+        self.records = 0
+        self.batches = 0
+        self.failures = 0
+        self.syncSeconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="Journal", daemon=True)
+        self._thread.start()
+
+
+    """ Method to queue a record for writing. Takes in the record as a dictionary. Returns a threading.Event set once the record, and everything appended before it, is on disk """
+    def append(self, record):
+        return self._queue(record, threading.Event())
+
+
+    """ Method to queue a record for writing from an asyncio event loop. Takes in the record as a dictionary. Returns an asyncio future resolved once the record, and everything appended before it, is on disk """
+    def appendAsync(self, record):
+        return self._queue(record, LoopSignal(asyncio.get_running_loop())).future
+
+
+    def _queue(self, record, done):
+        with self._condition:
+            record = dict(record, at=datetime.now().isoformat())
+            self._pending.append(((json.dumps(record, separators=(",", ":"), default=str) + "\n").encode(), done))
+            self._condition.notify()
+        return done
+
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+            if self.groupWindow > 0:
+                time.sleep(self.groupWindow)
+
+            with self._condition:
+                batch, self._pending = self._pending, []
+
+            started = time.perf_counter()
+            try:
+                self._file.write(b"".join(line for line, done in batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as err:
+                self.failures += 1
+                print("Journal write failed: " + str(err), flush=True)
+
+            self.syncSeconds += time.perf_counter() - started
+            self.records += len(batch)
+            self.batches += 1
+
+            # Waiters are released even if the write failed; the database already holds the mutation
+            for line, done in batch:
+                done.set()
+
+
+    def stats(self):
+        return {"records": self.records, "batches": self.batches, "failures": self.failures, "syncSeconds": self.syncSeconds}
+
+
+
+""" Method to rebuild the queues and masterQueue from journal records. Takes in an iterable of journal lines and optionally a datetime; records appended after it are ignored. Returns a dictionary of componant to its entries ordered by position and a dictionary of UUID to masterQueue row """
+def replay(lines, until=None):
+    queues = {}
+    history = {}
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if until is not None and datetime.fromisoformat(record['at']) > until:
+            break
+
+        op = record['op']
+        if op in ("enter", "priority"):
+            entry = record['entry']
+            queues.setdefault(record['componant'], {})[entry['UUID']] = dict(entry)
+            history[entry['UUID']] = {
+                "UUID": entry['UUID'], "ticket": entry['ticket'], "description": entry['description'], "componant": record['componant'],
+                "email": entry['email'], "teamName": entry['teamName'], "active": 1, "opened": entry['opened'], "closed": None, "reasonClosed": None,
+            }
+        elif op == "releasing":
+            entry = queues.get(record['componant'], {}).get(record['UUID'])
+            if entry is not None:
+                entry['position'] = 0
+        elif op == "exit":
+            queues.get(record['componant'], {}).pop(record['UUID'], None)
+            if record['UUID'] in history:
+                history[record['UUID']].update(active=0, closed=record['closed'], reasonClosed=record['reason'])
+        elif op == "describe":
+            for entry in queues.get(record['componant'], {}).values():
+                if entry['ticket'] == record['ticket'] and entry['email'] == record['email']:
+                    entry['description'] = record['description']
+        elif op == "empty":
+            for componant in record['componants']:
+                queues.pop(componant, None)
+            history.clear()
+
+    return {c: sorted(entries.values(), key=lambda e: e['position']) for c, entries in queues.items()}, history
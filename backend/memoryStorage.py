@@ -0,0 +1,404 @@
+import threading
+from collections import deque
+from datetime import datetime, date, time, timedelta
+from storage import DuplicateEntry, userColumns, masterQueueColumns, codeFreezeColumns
+from queueStore import queueColumns
+
+
+def toDatetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def toDate(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+""" Method to compare a stored value with a filter value the way MySQL would, so "1" matches 1. Returns a boolean """
+def looselyEqual(stored, value):
+    return stored == value or str(stored) == str(value)
+
+
+
+class MemoryCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def close(self):
+        pass
+
+
+
+""" Connection to a MemoryStorage. The first write, or locking read, of a transaction takes the storage's lock and holds it until commit or rollback, so transactions run one at a time. Each change records how to undo itself and rollback plays them back in reverse """
+class MemoryConnection:
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._undo = None
+
+    @property
+    def in_transaction(self):
+        return self._undo is not None
+
+    """ Method to start a transaction if one isn't already open. Returns the transaction's undo log """
+    def begin(self):
+        if self._undo is None:
+            self._lock.acquire()
+            self._undo = []
+        return self._undo
+
+    def cursor(self):
+        return MemoryCursor(self)
+
+    def commit(self):
+        if self._undo is not None:
+            self._undo = None
+            self._lock.release()
+
+    def rollback(self):
+        if self._undo is not None:
+            for undo in reversed(self._undo):
+                undo()
+            self._undo = None
+            self._lock.release()
+
+    def close(self):
+        self.rollback()
+
+    def is_connected(self):
+        return True
+
+
+
+""" Queue store for MemoryStorage. Each componant is a deque of entry dictionaries kept in position order """
+class MemoryQueueStore:
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def _queue(self, componant):
+        return self._storage._queues[componant]
+
+    def _place(self, queue, entry):
+        index = 0
+        while index < len(queue) and queue[index]['position'] <= entry['position']:
+            index += 1
+        queue.insert(index, entry)
+
+    def _find(self, queue, UUID):
+        for entry in queue:
+            if entry['UUID'] == UUID:
+                return entry
+        return None
+
+
+    def loadNames(self, cursor):
+        with self._storage._lock:
+            return list(self._storage._queues)
+
+    def entries(self, cursor, componant, simple):
+        names = ["email", "ticket", "position"] if simple else list(queueColumns)
+        with self._storage._lock:
+            return names, [tuple(e[n] for n in names) for e in self._queue(componant)]
+
+    def countTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        with self._storage._lock:
+            return sum(1 for e in self._queue(componant) if e['ticket'] == ticket and (email is None or e['email'] == email))
+
+    def tail(self, cursor, componant, forUpdate=False):
+        with self._storage._lock:
+            queue = self._queue(componant)
+            return max((e['position'] for e in queue), default=0), sum(1 for e in queue if e['position'] != 0)
+
+    def rank(self, cursor, componant, position, forUpdate=False):
+        with self._storage._lock:
+            return sum(1 for e in self._queue(componant) if 0 < e['position'] < position) + 1
+
+    def lockTail(self, cursor, componant):
+        cursor.connection.begin()
+
+    def findTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        if forUpdate:
+            cursor.connection.begin()
+        with self._storage._lock:
+            return [(e['UUID'], e['position'], e['teamName'], e['opened'], e['ticket']) for e in self._queue(componant) if e['ticket'] == ticket and (email is None or e['email'] == email)]
+
+    def head(self, cursor, componant, forUpdate=False):
+        with self._storage._lock:
+            queue = self._queue(componant)
+            releasing = [(e['position'], e['email']) for e in queue if e['position'] == 0]
+            waiting = [(e['position'], e['email']) for e in queue if e['position'] > 0][:1]
+            return releasing + waiting
+
+    def insert(self, cursor, componant, entry):
+        entry = dict(zip(queueColumns, entry))
+        entry['opened'] = toDatetime(entry['opened'])
+
+        undo = cursor.connection.begin()
+        queue = self._queue(componant)
+        if any(e['ticket'] == entry['ticket'] for e in queue):
+            raise DuplicateEntry("Duplicate ticket " + entry['ticket'] + " in " + componant, "ticket")
+
+        self._place(queue, entry)
+        undo.append(lambda: queue.remove(entry))
+
+    def insertMany(self, cursor, entries):
+        for componant, entry in entries:
+            self.insert(cursor, componant, entry)
+
+    def updateDescription(self, cursor, componant, ticket, email, description):
+        undo = cursor.connection.begin()
+        for entry in self._queue(componant):
+            if entry['ticket'] == ticket and entry['email'] == email:
+                undo.append(lambda entry=entry, old=entry['description']: entry.update(description=old))
+                entry['description'] = description
+
+    def setPosition(self, cursor, componant, UUID, position):
+        undo = cursor.connection.begin()
+        queue = self._queue(componant)
+        entry = self._find(queue, UUID)
+        if entry is None:
+            return
+
+        def move(to):
+            queue.remove(entry)
+            entry['position'] = to
+            self._place(queue, entry)
+
+        undo.append(lambda old=entry['position']: move(old))
+        move(position)
+
+    def delete(self, cursor, componant, UUID):
+        undo = cursor.connection.begin()
+        queue = self._queue(componant)
+        entry = self._find(queue, UUID)
+        if entry is not None:
+            queue.remove(entry)
+            undo.append(lambda: self._place(queue, entry))
+
+    def emptyAll(self, cursor, componants):
+        undo = cursor.connection.begin()
+        for componant in componants:
+            queue = self._queue(componant)
+            undo.append(lambda queue=queue, old=list(queue): queue.extend(old))
+            queue.clear()
+
+
+
+""" Storage held in the process's memory. Nothing is persisted, so every restart begins with no users, componants or history """
+class MemoryStorage:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users = {}
+        self._history = {}
+        self._freezes = {}
+        self._queues = {}
+        self._waitStats = {}
+        self._exitReasons = {}
+        self._revocations = {}
+        self.queues = MemoryQueueStore(self)
+
+    def connect(self):
+        return MemoryConnection(self._lock)
+
+    def isDuplicate(self, err):
+        return isinstance(err, DuplicateEntry)
+
+    def isDuplicateID(self, err):
+        return isinstance(err, DuplicateEntry) and err.key == "UUID"
+
+    def isRetryable(self, err):
+        return False
+
+    def columns(self, cursor, table):
+        return {"Users": userColumns, "masterQueue": masterQueueColumns, "CodeFreezes": codeFreezeColumns}[table]
+
+    def columnWidth(self, cursor, table, column):
+        return None
+
+
+    """ Method to add a row to one of the tables. Raises DuplicateEntry if its UUID is taken """
+    def _add(self, cursor, rows, row):
+        undo = cursor.connection.begin()
+        if row['UUID'] in rows:
+            raise DuplicateEntry("Duplicate UUID " + row['UUID'], "UUID")
+        rows[row['UUID']] = row
+        undo.append(lambda: rows.pop(row['UUID']))
+
+    def _update(self, cursor, row, values):
+        undo = cursor.connection.begin()
+        undo.append(lambda old={c: row[c] for c in values}: row.update(old))
+        row.update(values)
+
+    def _remove(self, cursor, rows, UUID):
+        undo = cursor.connection.begin()
+        row = rows.pop(UUID, None)
+        if row is not None:
+            undo.append(lambda: rows.__setitem__(UUID, row))
+
+
+    def addComponant(self, cursor, name):
+        undo = cursor.connection.begin()
+        if name in self._queues:
+            raise DuplicateEntry("Duplicate componant " + name, "name")
+        self._queues[name] = deque()
+        undo.append(lambda: self._queues.pop(name))
+        return True
+
+
+    def _matchUsers(self, email, isAdmin, password):
+        return [u for u in self._users.values() if (email is None or u['email'] == email) and (isAdmin is None or looselyEqual(u['isAdmin'], isAdmin)) and (password is None or u['password'] == password)]
+
+    def countUsers(self, cursor, email=None, isAdmin=None):
+        with self._lock:
+            return len(self._matchUsers(email, isAdmin, None))
+
+    def findUsers(self, cursor, fields, email=None, isAdmin=None, password=None):
+        with self._lock:
+            return [tuple(u[f] for f in fields) for u in self._matchUsers(email, isAdmin, password)]
+
+    def addUser(self, cursor, values):
+        user = dict.fromkeys(userColumns)
+        user.update(isAdmin=0, isDisabled=1, bypassCodeFreeze=0)
+        user.update(values)
+        self._add(cursor, self._users, user)
+
+    def updateUser(self, cursor, email, values, password=None):
+        cursor.connection.begin()
+        for user in self._matchUsers(email, None, password):
+            self._update(cursor, user, values)
+
+    def deleteUser(self, cursor, UUID):
+        self._remove(cursor, self._users, UUID)
+
+    def revokeTokens(self, cursor, email, revokedAt, expiredBefore):
+        undo = cursor.connection.begin()
+        undo.append(lambda old=dict(self._revocations): (self._revocations.clear(), self._revocations.update(old)))
+        for e in [e for e, at in self._revocations.items() if at < expiredBefore]:
+            del self._revocations[e]
+        self._revocations[email] = revokedAt
+
+    def tokenRevocations(self, cursor, since):
+        with self._lock:
+            return [(email, at) for email, at in self._revocations.items() if at >= since]
+
+
+    def addHistory(self, cursor, rows):
+        cursor.connection.begin()
+        for row in rows:
+            entry = dict.fromkeys(masterQueueColumns)
+            entry.update(zip(["UUID", "ticket", "description", "componant", "email", "teamName", "active", "opened"], row))
+            entry['active'] = int(entry['active'])
+            entry['opened'] = toDatetime(entry['opened'])
+            self._add(cursor, self._history, entry)
+
+    def closeHistory(self, cursor, UUID, closed, reason):
+        cursor.connection.begin()
+        entry = self._history.get(UUID)
+        if entry is not None:
+            self._update(cursor, entry, {"active": 0, "closed": toDatetime(closed), "reasonClosed": reason})
+
+    def closeHistoryMany(self, cursor, rows):
+        for closed, reason, UUID in rows:
+            self.closeHistory(cursor, UUID, closed, reason)
+
+
+    def _since(self, daysBack):
+        return datetime.combine(date.today() - timedelta(days=daysBack), time())
+
+    def history(self, cursor, names, daysBack, byComponant):
+        with self._lock:
+            rows = list(self._history.values())
+        if daysBack:
+            since = self._since(daysBack)
+            rows = [r for r in rows if r['opened'] >= since]
+        rows.sort(key=(lambda r: (r['componant'], r['opened'])) if byComponant else (lambda r: r['opened']))
+        return [tuple(r[n] for n in names) for r in rows]
+
+    def historyPage(self, cursor, names, filters, daysBack, after, newestFirst, limit):
+        with self._lock:
+            rows = [r for r in self._history.values() if all(looselyEqual(r[c], v) for c, v in filters.items())]
+        if daysBack is not None:
+            since = self._since(daysBack)
+            rows = [r for r in rows if r['opened'] >= since]
+        if after is not None:
+            after = (toDatetime(after[0]), after[1])
+            rows = [r for r in rows if ((r['opened'], r['UUID']) < after if newestFirst else (r['opened'], r['UUID']) > after)]
+        rows.sort(key=lambda r: (r['opened'], r['UUID']), reverse=newestFirst)
+        return [tuple(r[n] for n in names) for r in rows[:limit]]
+
+    def historyBatches(self, cursor, names, batchSize):
+        rows = self.history(cursor, ["opened", "UUID"] + names, None, False)
+        rows.sort(key=lambda r: (r[0], r[1]))
+        for start in range(0, len(rows), batchSize):
+            yield [r[2:] for r in rows[start:start + batchSize]]
+
+    def emptyAll(self, cursor, componants):
+        self.queues.emptyAll(cursor, componants)
+        for UUID in list(self._history):
+            self._remove(cursor, self._history, UUID)
+        for rows in (self._waitStats, self._exitReasons):
+            undo = cursor.connection.begin()
+            undo.append(lambda rows=rows, old=dict(rows): rows.update(old))
+            rows.clear()
+
+
+    """ Method to add counters to a rollup row, creating it if needed """
+    def _increment(self, cursor, rows, key, counters):
+        undo = cursor.connection.begin()
+        old = rows.get(key)
+        undo.append(lambda: rows.pop(key) if old is None else rows.__setitem__(key, old))
+        rows[key] = [a + b for a, b in zip(old, counters)] if old is not None else list(counters)
+
+    def recordExit(self, cursor, componant, day, teamName, reason, bucket, waitSeconds):
+        day = toDate(day)
+        self._increment(cursor, self._waitStats, (componant, day, teamName or "", bucket), (1, waitSeconds))
+        self._increment(cursor, self._exitReasons, (componant, day, reason or ""), (1,))
+
+    def queueStats(self, cursor, daysBack, componant):
+        since = date.today() - timedelta(days=daysBack) if daysBack is not None else date.min
+        def wanted(key):
+            return key[1] >= since and (componant is None or key[0] == componant)
+
+        with self._lock:
+            waitRows = [key + tuple(counters) for key, counters in self._waitStats.items() if wanted(key)]
+            reasons = {}
+            for key, counters in self._exitReasons.items():
+                if wanted(key):
+                    reasons[key[2]] = reasons.get(key[2], 0) + counters[0]
+        return waitRows, list(reasons.items())
+
+
+    def addCodeFreeze(self, cursor, freeze):
+        freeze = dict(zip(codeFreezeColumns, freeze))
+        freeze.update(begins=toDate(freeze['begins']), ends=toDate(freeze['ends']), inEffect=int(freeze['inEffect']))
+        self._add(cursor, self._freezes, freeze)
+
+    def endActiveCodeFreezes(self, cursor):
+        cursor.connection.begin()
+        for freeze in self._freezes.values():
+            if freeze['inEffect']:
+                self._update(cursor, freeze, {"inEffect": 0, "ends": date.today() - timedelta(days=1)})
+
+    def updateCodeFreezes(self, cursor):
+        today = date.today()
+        cursor.connection.begin()
+        for freeze in self._freezes.values():
+            if freeze['begins'] <= today and freeze['ends'] >= today and not freeze['inEffect']:
+                self._update(cursor, freeze, {"inEffect": 1})
+            elif freeze['ends'] < today and freeze['inEffect']:
+                self._update(cursor, freeze, {"inEffect": 0})
+
+    def codeFreezes(self, cursor, names, activeOnly, futureOnly):
+        today = date.today()
+        with self._lock:
+            freezes = list(self._freezes.values())
+        if activeOnly:
+            freezes = [f for f in freezes if f['inEffect']]
+        elif futureOnly:
+            freezes = [f for f in freezes if f['begins'] > today and not f['inEffect']]
+        return [tuple(f[n] for n in names) for f in freezes]
+
+    def deleteCodeFreeze(self, cursor, UUID):
+        self._remove(cursor, self._freezes, UUID)
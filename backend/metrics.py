@@ -0,0 +1,113 @@
+import threading, time
+
+
+latencyBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+queryBuckets = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+
+""" A Prometheus histogram with one label. Observations are kept per label value as cumulative bucket counts, a sum and a count """
+class Histogram:
+
+    def __init__(self, name, description, label, buckets):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+
+        self._series = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, labelValue, value):
+        with self._lock:
+            series = self._series.get(labelValue)
+            if series is None:
+                series = self._series[labelValue] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+
+    """ Method to write the histogram in the Prometheus text format. Returns a list of lines """
+    def render(self):
+        lines = ["# HELP " + self.name + " " + self.description, "# TYPE " + self.name + " histogram"]
+        with self._lock:
+            series = sorted((k, list(v[0]), v[1], v[2]) for k, v in self._series.items())
+
+        for labelValue, counts, total, count in series:
+            label = self.label + '="' + labelValue + '"'
+            for bound, bucketCount in zip(self.buckets, counts):
+                lines.append(self.name + '_bucket{' + label + ',le="' + str(bound) + '"} ' + str(bucketCount))
+            lines.append(self.name + '_bucket{' + label + ',le="+Inf"} ' + str(count))
+            lines.append(self.name + '_sum{' + label + '} ' + repr(total))
+            lines.append(self.name + '_count{' + label + '} ' + str(count))
+        return lines
+
+
+
+""" Method to write a dictionary of numbers as Prometheus gauges, one per key. Returns a list of lines """
+def renderGauges(prefix, values):
+    lines = []
+    for key in sorted(values):
+        lines.append("# TYPE " + prefix + key + " gauge")
+        lines.append(prefix + key + " " + str(values[key]))
+    return lines
+
+
+
+""" What one request spent on the database. Filled in by InstrumentedCursor """
+class RequestMetrics:
+
+    def __init__(self, route, slowQuerySeconds):
+        self.route = route
+        self.slowQuerySeconds = slowQuerySeconds
+        self.queries = 0
+        self.dbSeconds = 0.0
+
+    """ Method to count a statement. Statements slower than slowQuerySeconds are printed with their SQL, but never their parameters as those can hold password hashes. Takes in the SQL and the seconds it took """
+    def recordQuery(self, query, seconds):
+        self.queries += 1
+        self.dbSeconds += seconds
+        if self.slowQuerySeconds and seconds >= self.slowQuerySeconds:
+            print("Slow query " + format(seconds, ".3f") + "s in " + self.route + ": " + " ".join(query.split()), flush=True)
+
+
+
+""" Cursor wrapper that counts statements and times them, including fetches """
+class InstrumentedCursor:
+
+    def __init__(self, cursor, requestMetrics):
+        self._cursor = cursor
+        self._metrics = requestMetrics
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, query, *args):
+        started = time.perf_counter()
+        try:
+            return method(query, *args)
+        finally:
+            self._metrics.recordQuery(query, time.perf_counter() - started)
+
+    def execute(self, query, *args):
+        return self._timed(self._cursor.execute, query, *args)
+
+    def executemany(self, query, *args):
+        return self._timed(self._cursor.executemany, query, *args)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._metrics.dbSeconds += time.perf_counter() - started
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
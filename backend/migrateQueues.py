@@ -0,0 +1,213 @@
+""" Migration tool for moving componant queues between storage modes.
+
+Usage:
+    python migrateQueues.py createTables           Create the `Componants` and `queueEntries` tables
+    python migrateQueues.py toSingleTable [--drop] Copy every per componant table into `queueEntries`, optionally dropping the old tables once their counts match
+    python migrateQueues.py addComponant <name>    Register a new componant for single table storage
+    python migrateQueues.py addConstraints         Add the unique ticket and position indexes to every per componant table
+    python migrateQueues.py addHistoryIndexes      Add the indexes used by /masterQueueHistory to `masterQueue`
+    python migrateQueues.py addQueueStats          Create the /queueStats rollup tables and fill them from the closed entries in `masterQueue`
+    python migrateQueues.py widenPasswords         Widen `Users`.`password` to hold scrypt and PBKDF2 hashes
+    python migrateQueues.py addTokenRevocations    Create the `TokenRevocations` table session token revocations are persisted in
+
+Set queueStorage = "singleTable" in config.py once the data has been copied.
+"""
+import sys, config, mysql.connector
+from datetime import datetime
+from queueStore import PerTableQueueStore, queueColumns
+from queueStats import statsTables, waitBucket
+from auth import authTables
+
+
+createComponants = """CREATE TABLE IF NOT EXISTS `Componants` (
+    `name` VARCHAR(64) NOT NULL,
+    PRIMARY KEY (`name`)
+)"""
+
+createQueueEntries = """CREATE TABLE IF NOT EXISTS `queueEntries` (
+    `UUID` VARCHAR(32) NOT NULL,
+    `componant` VARCHAR(64) NOT NULL,
+    `ticket` VARCHAR(45) NOT NULL,
+    `description` VARCHAR(400),
+    `email` VARCHAR(100) NOT NULL,
+    `teamName` VARCHAR(45),
+    `opened` DATETIME NOT NULL,
+    `position` INT NOT NULL,
+    PRIMARY KEY (`UUID`),
+    KEY `componantPosition` (`componant`, `position`),
+    UNIQUE KEY `componantTicket` (`componant`, `ticket`)
+)"""
+
+
+def createTables(db, cursor):
+    cursor.execute(createComponants)
+    cursor.execute(createQueueEntries)
+    db.commit()
+
+
+def toSingleTable(db, cursor, drop):
+    createTables(db, cursor)
+
+    componants = PerTableQueueStore(config.nonQueueTables + statsTables + authTables + ["Componants", "queueEntries"]).loadNames(cursor)
+    columns = ", ".join("`" + c + "`" for c in queueColumns)
+
+    # A rerun replaces what an earlier run copied, so the plain INSERT only fails on rows that really don't fit
+    for componant in componants:
+        cursor.execute("INSERT IGNORE INTO `Componants` (`name`) VALUES (%s)", (componant,))
+        cursor.execute("DELETE FROM `queueEntries` WHERE `componant` = %s", (componant,))
+        cursor.execute("INSERT INTO `queueEntries` (`componant`, " + columns + ") SELECT %s, " + columns + " FROM `" + componant + "`", (componant,))
+        print(componant + ": " + str(cursor.rowcount) + " entries copied")
+        db.commit()
+
+    if drop:
+        mismatched = []
+        for componant in componants:
+            cursor.execute("SELECT COUNT(*) FROM `" + componant + "`")
+            inTable = cursor.fetchall()[0][0]
+            cursor.execute("SELECT COUNT(*) FROM `queueEntries` WHERE `componant` = %s", (componant,))
+            inSingleTable = cursor.fetchall()[0][0]
+            if inTable != inSingleTable:
+                mismatched.append(componant + " has " + str(inTable) + " entries but " + str(inSingleTable) + " were copied")
+
+        if mismatched:
+            sys.exit("Not dropping any tables:\n" + "\n".join(mismatched))
+
+        for componant in componants:
+            cursor.execute("DROP TABLE `" + componant + "`")
+            print(componant + ": dropped")
+
+
+def addConstraints(db, cursor):
+    componants = PerTableQueueStore(config.nonQueueTables + statsTables + authTables + ["Componants", "queueEntries"]).loadNames(cursor)
+
+    for componant in componants:
+        cursor.execute("SHOW INDEX FROM `" + componant + "`")
+        indexes = set(i[2] for i in cursor.fetchall())
+
+        if "ticket" not in indexes:
+            cursor.execute("ALTER TABLE `" + componant + "` ADD UNIQUE KEY `ticket` (`ticket`)")
+        if "position" not in indexes:
+            cursor.execute("ALTER TABLE `" + componant + "` ADD KEY `position` (`position`)")
+        print(componant + ": indexed")
+
+
+historyIndexes = {
+    "openedUUID": "`opened`, `UUID`",
+    "componantOpened": "`componant`, `opened`, `UUID`",
+    "emailOpened": "`email`, `opened`, `UUID`",
+    "teamOpened": "`teamName`, `opened`, `UUID`",
+    "activeOpened": "`active`, `opened`, `UUID`",
+}
+
+
+def addHistoryIndexes(db, cursor):
+    cursor.execute("SHOW INDEX FROM `masterQueue`")
+    indexes = set(i[2] for i in cursor.fetchall())
+
+    for name, columns in historyIndexes.items():
+        if name not in indexes:
+            cursor.execute("ALTER TABLE `masterQueue` ADD KEY `" + name + "` (" + columns + ")")
+            print("masterQueue: added " + name)
+
+
+createQueueWaitStats = """CREATE TABLE IF NOT EXISTS `queueWaitStats` (
+    `componant` VARCHAR(64) NOT NULL,
+    `day` DATE NOT NULL,
+    `teamName` VARCHAR(45) NOT NULL,
+    `bucket` INT NOT NULL,
+    `exits` INT NOT NULL,
+    `waitSeconds` BIGINT NOT NULL,
+    PRIMARY KEY (`componant`, `day`, `teamName`, `bucket`),
+    KEY `day` (`day`)
+)"""
+
+createQueueExitReasons = """CREATE TABLE IF NOT EXISTS `queueExitReasons` (
+    `componant` VARCHAR(64) NOT NULL,
+    `day` DATE NOT NULL,
+    `reasonClosed` VARCHAR(100) NOT NULL,
+    `exits` INT NOT NULL,
+    PRIMARY KEY (`componant`, `day`, `reasonClosed`),
+    KEY `day` (`day`)
+)"""
+
+
+def addQueueStats(db, cursor):
+    cursor.execute(createQueueWaitStats)
+    cursor.execute(createQueueExitReasons)
+    cursor.execute("DELETE FROM `queueWaitStats`")
+    cursor.execute("DELETE FROM `queueExitReasons`")
+
+    waits = {}
+    reasons = {}
+    cursor.execute("SELECT `componant`, `teamName`, `opened`, `closed`, `reasonClosed` FROM `masterQueue` WHERE `active` = 0 AND `closed` IS NOT NULL")
+    for componant, teamName, opened, closed, reason in cursor.fetchall():
+        waitSeconds = max(0, int((closed - opened).total_seconds()))
+        waitKey = (componant, closed.date(), teamName or "", waitBucket(waitSeconds))
+        exits, total = waits.get(waitKey, (0, 0))
+        waits[waitKey] = (exits + 1, total + waitSeconds)
+        reasonKey = (componant, closed.date(), reason or "")
+        reasons[reasonKey] = reasons.get(reasonKey, 0) + 1
+
+    cursor.executemany("INSERT INTO `queueWaitStats` (`componant`, `day`, `teamName`, `bucket`, `exits`, `waitSeconds`) VALUES (%s, %s, %s, %s, %s, %s)", [k + v for k, v in waits.items()])
+    cursor.executemany("INSERT INTO `queueExitReasons` (`componant`, `day`, `reasonClosed`, `exits`) VALUES (%s, %s, %s, %s)", [k + (v,) for k, v in reasons.items()])
+    db.commit()
+    print("queueStats: " + str(len(waits)) + " wait rows and " + str(len(reasons)) + " reason rows")
+
+
+def widenPasswords(db, cursor):
+    cursor.execute("SELECT CHARACTER_MAXIMUM_LENGTH, IS_NULLABLE FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Users' AND COLUMN_NAME = 'password'")
+    width, nullable = cursor.fetchall()[0]
+
+    if width is not None and width >= 255:
+        print("Users.password: already holds " + str(width) + " characters")
+        return
+
+    cursor.execute("ALTER TABLE `Users` MODIFY `password` VARCHAR(255)" + ("" if nullable == "YES" else " NOT NULL"))
+    print("Users.password: widened from " + str(width) + " to 255 characters")
+
+
+createTokenRevocations = """CREATE TABLE IF NOT EXISTS `TokenRevocations` (
+    `email` VARCHAR(100) NOT NULL,
+    `revokedAt` DOUBLE NOT NULL,
+    PRIMARY KEY (`email`)
+)"""
+
+
+def addTokenRevocations(db, cursor):
+    cursor.execute(createTokenRevocations)
+    db.commit()
+    print("TokenRevocations: created")
+
+
+def addComponant(db, cursor, name):
+    cursor.execute("INSERT INTO `Componants` (`name`) VALUES (%s)", (name.lower(),))
+    db.commit()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ("createTables", "toSingleTable", "addComponant", "addConstraints", "addHistoryIndexes", "addQueueStats", "widenPasswords", "addTokenRevocations"):
+        print(__doc__)
+        sys.exit(1)
+
+    db = mysql.connector.connect(host=config.host, user=config.user, password=config.password, database=config.database)
+    cursor = db.cursor()
+
+    if sys.argv[1] == "createTables":
+        createTables(db, cursor)
+    elif sys.argv[1] == "toSingleTable":
+        toSingleTable(db, cursor, "--drop" in sys.argv[2:])
+    elif sys.argv[1] == "addConstraints":
+        addConstraints(db, cursor)
+    elif sys.argv[1] == "addHistoryIndexes":
+        addHistoryIndexes(db, cursor)
+    elif sys.argv[1] == "addQueueStats":
+        addQueueStats(db, cursor)
+    elif sys.argv[1] == "widenPasswords":
+        widenPasswords(db, cursor)
+    elif sys.argv[1] == "addTokenRevocations":
+        addTokenRevocations(db, cursor)
+    else:
+        addComponant(db, cursor, sys.argv[2])
+
+    cursor.close()
+    db.close()
@@ -0,0 +1,63 @@
+import mysql.connector
+from mysql.connector import errorcode
+from storage import SQLStorage
+from queueStore import createQueueStore
+
+
+
+""" Storage on a MySQL server. Componants are kept as config.queueStorage says """
+class MySQLStorage(SQLStorage):
+
+    today = "CURDATE()"
+    daysAgo = "( CURDATE() - INTERVAL %s DAY )"
+
+    def __init__(self, config):
+        SQLStorage.__init__(self, createQueueStore(config))
+        self.config = config
+
+
+    """ Method to create connection with the database. Returns the database connection if successful. Returns False if there is an error """
+    def connect(self):
+        try:
+            return mysql.connector.connect(host=self.config.host, user=self.config.user, password=self.config.password, database=self.config.database)
+        except mysql.connector.Error:
+            return False
+
+
+    def isDuplicate(self, err):
+        return isinstance(err, mysql.connector.Error) and err.errno == errorcode.ER_DUP_ENTRY
+
+
+    """ Method to check if an error is a clash on a primary key, which is always a UUID """
+    def isDuplicateID(self, err):
+        return self.isDuplicate(err) and "PRIMARY" in str(err.msg)
+
+
+    def isRetryable(self, err):
+        return isinstance(err, mysql.connector.Error) and err.errno in (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+    def describe(self, cursor, table):
+        cursor.execute("DESCRIBE `" + table + "`")
+        return [n[0] for n in cursor.fetchall()]
+
+
+    """ Method to get the most characters a text column holds. Returns an int, or None if the column isn't limited """
+    def columnWidth(self, cursor, table, column):
+        cursor.execute("SELECT CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s", (table, column,))
+        rows = cursor.fetchall()
+        return rows[0][0] if rows and rows[0][0] is not None else None
+
+
+    """ Method to get the clause that turns an INSERT whose key already exists into adding its counters to the existing row. Takes in the key columns and counter columns. Returns SQL """
+    def addOnConflict(self, keys, counters):
+        return " ON DUPLICATE KEY UPDATE " + ", ".join("`" + c + "` = `" + c + "` + VALUES(`" + c + "`)" for c in counters)
+
+
+    """ Method to remove every entry from the given componants and all of masterQueue. Safe updates are turned off around the unkeyed deletes """
+    def emptyAll(self, cursor, componants):
+        cursor.execute("SET SQL_SAFE_UPDATES = 0")
+        try:
+            SQLStorage.emptyAll(self, cursor, componants)
+        finally:
+            cursor.execute("SET SQL_SAFE_UPDATES = 1")
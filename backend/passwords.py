@@ -0,0 +1,117 @@
+import hashlib, hmac, os, base64, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+""" Method to hash a password the way every account created before PasswordHasher was. MD5 of the password and email, then MD5 again with each salt in turn. Takes in the email, password and list of salts. Returns the hash as hex """
+def legacyHash(email, password, salts):
+    password = hashlib.md5((password+email).encode())
+    for salt in salts:
+        password = hashlib.md5((password.hexdigest()+salt).encode())
+    return password.hexdigest()
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode()
+
+def _b64decode(data):
+    return base64.b64decode(data.encode())
+
+
+
+""" Hashes and verifies passwords with scrypt or PBKDF2. Each stored hash carries its algorithm, cost parameters and salt, e.g. "scrypt$16384$8$1$<salt>$<hash>" or "pbkdf2_sha256$600000$<salt>$<hash>", so the work factor can be raised without breaking existing logins. Hashes without a "$" are the legacy salted MD5 and are still accepted, but report needing a rehash. The hashing runs on a small thread pool so a burst of logins can use at most `workers` cores and leaves the rest for other requests. hash and verify wait for the pool; code on an event loop uses hashAsync and verifyAsync, which leave the loop free while the pool works, and rehashLater hashes without anyone waiting at all. Takes in the algorithm for new hashes ("scrypt" or "pbkdf2_sha256"), the scrypt cost, block size and parallelism, the PBKDF2 iteration count, the number of hashing threads and the legacy salts """
+class PasswordHasher:
+
+    algorithms = ("scrypt", "pbkdf2_sha256")
+
+    def __init__(self, algorithm, scryptCost, scryptBlockSize, scryptParallelism, pbkdf2Iterations, workers, legacySalts):
+        if algorithm not in self.algorithms:
+            raise ValueError("Unknown password hash algorithm " + str(algorithm))
+
+        self.algorithm = algorithm
+        self.scryptParams = (scryptCost, scryptBlockSize, scryptParallelism)
+        self.pbkdf2Iterations = pbkdf2Iterations
+        self.legacySalts = legacySalts
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="PasswordHasher")
+
+
+    """ Method to hash a new password with the configured algorithm and a fresh salt. Takes in the password. Returns the string to store """
+    def hash(self, password):
+        return self._executor.submit(self._hash, password).result()
+
+
+    """ Method to check a password against a stored hash. Takes in the email, the password and the stored hash. Returns a boolean """
+    def verify(self, email, password, stored):
+        if not stored:
+            return False
+        return self._executor.submit(self._verify, email, password, stored).result()
+
+
+    """ Method to hash a password from an asyncio event loop. Takes in the password. Returns an awaitable of the string to store """
+    def hashAsync(self, password):
+        return asyncio.wrap_future(self._executor.submit(self._hash, password))
+
+
+    """ Method to check a password from an asyncio event loop. Takes in the email, the password and the stored hash. Returns an awaitable of a boolean """
+    async def verifyAsync(self, email, password, stored):
+        if not stored:
+            return False
+        return await asyncio.wrap_future(self._executor.submit(self._verify, email, password, stored))
+
+
+    """ Method to hash a password in the background and hand the result to store, called on the hashing thread. Errors are printed rather than raised, so a failed upgrade leaves the old hash working. Takes in the password and a function taking the new hash """
+    def rehashLater(self, password, store):
+        def run():
+            try:
+                store(self._hash(password))
+            except Exception as err:
+                print("Password rehash failed: " + str(err), flush=True)
+        self._executor.submit(run)
+
+
+    """ Method to get the length of the strings hash stores with the current settings. Returns an int """
+    def storedLength(self):
+        return len("$".join([str(p) for p in self._current()] + [_b64encode(bytes(16)), _b64encode(bytes(32))]))
+
+
+    """ Method to check if a stored hash should be replaced, because it is legacy MD5 or was made with another algorithm or cost than the current ones. Takes in the stored hash. Returns a boolean """
+    def needsRehash(self, stored):
+        return self._params(stored) != self._current()
+
+
+    def _current(self):
+        if self.algorithm == "scrypt":
+            return ("scrypt",) + self.scryptParams
+        return ("pbkdf2_sha256", self.pbkdf2Iterations)
+
+
+    def _params(self, stored):
+        parts = stored.split("$")
+        if len(parts) == 1:
+            return ("md5",)
+        return (parts[0],) + tuple(int(p) for p in parts[1:-2])
+
+
+    def _derive(self, params, password, salt):
+        if params[0] == "scrypt":
+            n, r, p = params[1:]
+            return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 1024 * 1024, dklen=32)
+        if params[0] == "pbkdf2_sha256":
+            return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params[1])
+        raise ValueError("Unknown password hash algorithm " + params[0])
+
+
+    def _hash(self, password):
+        params = self._current()
+        salt = os.urandom(16)
+        return "$".join([str(p) for p in params] + [_b64encode(salt), _b64encode(self._derive(params, password, salt))])
+
+
+    def _verify(self, email, password, stored):
+        params = self._params(stored)
+        if params == ("md5",):
+            return hmac.compare_digest(legacyHash(email, password, self.legacySalts), stored)
+
+        parts = stored.split("$")
+        return hmac.compare_digest(self._derive(params, password, _b64decode(parts[-2])), _b64decode(parts[-1]))
@@ -0,0 +1,51 @@
+import threading, time, hashlib
+
+
+
+""" Cache of serialised checkQueue responses. Every componant has a version counter that mutations bump; a cached response is only served while the version it was built from is current and its TTL, which bounds staleness from writes made by other processes, hasn't run out """
+class QueueCache:
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+        self._versions = {}
+        self._responses = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+
+    """ Method to get the current version of a componant. Read this before querying the database and pass it to put """
+    def version(self, componant):
+        with self._lock:
+            return self._versions.get(componant, 0)
+
+
+    """ Method to record that a componant changed. Drops its cached responses """
+    def bump(self, componant):
+        with self._lock:
+            self._versions[componant] = self._versions.get(componant, 0) + 1
+            for key in [k for k in self._responses if k[0] == componant]:
+                del self._responses[key]
+
+
+    """ Method to look up a cached response. Returns a (body, mimetype, etag) tuple, or None on a miss """
+    def get(self, componant, variant):
+        with self._lock:
+            cached = self._responses.get((componant, variant))
+            if cached is None or cached[0] != self._versions.get(componant, 0) or cached[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return cached[2]
+
+
+    """ Method to store a response built from the given version of a componant. Callers must only pass componants that exist, as entries are otherwise only dropped by bump. Returns the (body, mimetype, etag) tuple that was stored """
+    def put(self, componant, variant, version, body, mimetype):
+        etag = hashlib.sha1(body).hexdigest()
+        response = (body, mimetype, etag)
+        with self._lock:
+            if version == self._versions.get(componant, 0):
+                self._responses[(componant, variant)] = (version, time.monotonic() + self.ttl, response)
+        return response
@@ -0,0 +1,66 @@
+""" Rollups behind /queueStats. exitQueue records each closed entry once, as a count and wait time added to its (componant, day, team, wait bucket) row and a count added to its (componant, day, reason) row. Reports are built from those rows alone, so their cost depends on how many componants, days and teams are asked about, never on the size of masterQueue """
+
+
+# Rollup tables, which perTable queue storage must not mistake for componants
+statsTables = ["queueWaitStats", "queueExitReasons"]
+
+# Upper bounds in seconds of the wait time buckets. Waits longer than the last bound go in one extra bucket
+waitBuckets = (300, 900, 1800, 3600, 7200, 14400, 28800, 86400, 172800, 345600, 604800, 1209600)
+
+
+""" Method to find the bucket a wait falls in. Takes in the wait in seconds. Returns the bucket's index """
+def waitBucket(seconds):
+    for i, bound in enumerate(waitBuckets):
+        if seconds <= bound:
+            return i
+    return len(waitBuckets)
+
+
+""" Method to estimate a quantile from the wait histogram. The estimate is the mean wait of the bucket the quantile lands in, which is exact when the bucket's waits are equal and always within the bucket's bounds. Takes in lists of the exits and total wait seconds per bucket and the quantile between 0 and 1. Returns seconds, or None if there are no exits """
+def waitQuantile(counts, sums, quantile):
+    total = sum(counts)
+    if total == 0:
+        return None
+
+    target = quantile * total
+    seen = 0
+    for count, waitSeconds in zip(counts, sums):
+        seen += count
+        if count and seen >= target:
+            return waitSeconds / count
+
+
+""" Method to build the /queueStats report. Takes in the (componant, day, teamName, bucket, exits, waitSeconds) rows and (reasonClosed, exits) rows from the storage backend and the number of exit reasons to list. Returns a dictionary """
+def buildReport(waitRows, reasonRows, topReasons):
+    componants = {}
+    perDay = {}
+    perTeam = {}
+
+    for componant, day, teamName, bucket, exits, waitSeconds in waitRows:
+        stats = componants.setdefault(componant, {"counts": [0] * (len(waitBuckets) + 1), "sums": [0] * (len(waitBuckets) + 1), "exits": 0, "waitSeconds": 0})
+        stats["counts"][bucket] += exits
+        stats["sums"][bucket] += waitSeconds
+        stats["exits"] += exits
+        stats["waitSeconds"] += waitSeconds
+
+        day = day.isoformat() if hasattr(day, "isoformat") else str(day)
+        perDay[day] = perDay.get(day, 0) + exits
+        perTeam[teamName] = perTeam.get(teamName, 0) + exits
+
+    reasons = {}
+    for reason, exits in reasonRows:
+        reasons[reason] = reasons.get(reason, 0) + exits
+
+    return {
+        "componants": {
+            componant: {
+                "exits": stats["exits"],
+                "meanWaitSeconds": stats["waitSeconds"] / stats["exits"],
+                "medianWaitSeconds": waitQuantile(stats["counts"], stats["sums"], 0.5),
+                "p95WaitSeconds": waitQuantile(stats["counts"], stats["sums"], 0.95),
+            } for componant, stats in componants.items()
+        },
+        "exitsPerDay": perDay,
+        "exitsPerTeam": perTeam,
+        "exitReasons": [{"reason": r, "exits": n} for r, n in sorted(reasons.items(), key=lambda item: -item[1])[:topReasons]],
+    }
@@ -0,0 +1,211 @@
+""" SQL for the componant queues. PerTableQueueStore keeps each componant in its own table, SingleTableQueueStore keeps every active entry in one `queueEntries` table keyed on (componant, position) and (componant, ticket). Both expose the same methods and take the cursor as their first argument.
+
+Position 0 means the entry is releasing. Any other position is only a monotonic ordering key: new entries are placed one past the tail and the rank shown to users is worked out when the queue is read, so removing an entry never renumbers the rest of the queue """
+
+from queueStats import statsTables
+from auth import authTables
+
+
+queueColumns = ["UUID", "ticket", "description", "email", "teamName", "opened", "position"]
+
+
+""" Method to replace the stored ordering keys of a componant's entries with the rank users see. The releasing entry becomes "Releasing" and everyone waiting is numbered from 1. Takes in a list of entry dictionaries ordered by position. Returns the same list """
+def rankEntries(entries):
+    rank = 1
+    for e in entries:
+        if e['position'] == 0:
+            e['position'] = "Releasing"
+        else:
+            e['position'] = rank
+            rank += 1
+    return entries
+
+
+
+class PerTableQueueStore:
+
+    def __init__(self, nonQueueTables):
+        self.nonQueueTables = [t.lower() for t in nonQueueTables]
+        self._columns = {}
+
+    def _table(self, componant):
+        return "`" + componant + "`"
+
+
+    """ Method to load the names of all componants. Every table that isn't a non queue table is a componant. Returns a list of names """
+    def loadNames(self, cursor):
+        cursor.execute("SHOW TABLES;")
+        return [q[0] for q in cursor.fetchall() if q[0].lower() not in self.nonQueueTables]
+
+
+    """ Method to get a componant table's column names. DESCRIBE only runs the first time each table is seen. Returns a list of names """
+    def columns(self, cursor, componant):
+        names = self._columns.get(componant)
+        if names is None:
+            cursor.execute("DESCRIBE " + self._table(componant))
+            names = [n[0] for n in cursor.fetchall()]
+            self._columns[componant] = names
+        return names
+
+
+    """ Method to get every entry in a componant ordered by position. Returns the column names and the rows """
+    def entries(self, cursor, componant, simple):
+        names = ["email", "ticket", "position"] if simple else self.columns(cursor, componant)
+        cursor.execute("SELECT " + ", ".join("`" + n + "`" for n in names) + " FROM " + self._table(componant) + " ORDER BY position")
+        return names, cursor.fetchall()
+
+
+    """ Method to count the entries for a ticket, optionally only those owned by an email. The reads below take forUpdate for use after lockTail: a locking read sees rows committed since the transaction's snapshot was taken, which a plain read under REPEATABLE READ does not. Returns an int """
+    def countTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        lock = " FOR UPDATE" if forUpdate else ""
+        if email is None:
+            cursor.execute("SELECT COUNT(*) FROM " + self._table(componant) + " WHERE `ticket` = %s" + lock, (ticket,))
+        else:
+            cursor.execute("SELECT COUNT(*) FROM " + self._table(componant) + " WHERE (`ticket` = %s AND `email` = %s)" + lock, (ticket, email,))
+        return cursor.fetchall()[0][0]
+
+
+    """ Method to get the tail of a componant. Returns the largest position and the number of entries waiting behind the releasing one """
+    def tail(self, cursor, componant, forUpdate=False):
+        cursor.execute("SELECT COALESCE(MAX(position), 0), COUNT(*) - SUM(position = 0) FROM " + self._table(componant) + (" FOR UPDATE" if forUpdate else ""))
+        row = cursor.fetchall()[0]
+        return row[0], int(row[1] or 0)
+
+
+    """ Method to get the rank of a waiting entry, 1 being next in line. Returns an int """
+    def rank(self, cursor, componant, position, forUpdate=False):
+        cursor.execute("SELECT COUNT(*) FROM " + self._table(componant) + " WHERE (`position` > 0 AND `position` < %s)" + (" FOR UPDATE" if forUpdate else ""), (position,))
+        return cursor.fetchall()[0][0] + 1
+
+
+    """ Method to lock the last entry of a componant, and the gap behind it, until the transaction ends. Every transaction that adds or promotes entries takes this lock first so they run one at a time per componant """
+    def lockTail(self, cursor, componant):
+        cursor.execute("SELECT UUID FROM " + self._table(componant) + " ORDER BY position DESC LIMIT 1 FOR UPDATE")
+        cursor.fetchall()
+
+
+    """ Method to find the entries for a ticket, optionally only those owned by an email. If forUpdate is set the rows stay locked until the transaction ends. Returns a list of (UUID, position, teamName, opened, ticket) rows """
+    def findTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        lock = " FOR UPDATE" if forUpdate else ""
+        if email is None:
+            cursor.execute("SELECT UUID, position, teamName, opened, ticket FROM " + self._table(componant) + " WHERE `ticket` = %s" + lock, (ticket,))
+        else:
+            cursor.execute("SELECT UUID, position, teamName, opened, ticket FROM " + self._table(componant) + " WHERE (`email` = %s AND `ticket` = %s)" + lock, (email, ticket,))
+        return cursor.fetchall()
+
+
+    """ Method to get the entry releasing (position 0) and the entry next in line. Returns a list of (position, email) rows ordered by position """
+    def head(self, cursor, componant, forUpdate=False):
+        # A locking read doesn't extend to its subqueries, so the subquery needs its own
+        lock = " FOR UPDATE" if forUpdate else ""
+        cursor.execute("SELECT position, email FROM " + self._table(componant) + " WHERE (`position` = 0 OR `position` = (SELECT MIN(position) FROM " + self._table(componant) + " WHERE `position` > 0" + lock + ")) ORDER BY position" + lock)
+        return cursor.fetchall()
+
+
+    """ Method to add an entry to a componant. Takes in the cursor, the componant and a tuple of values in queueColumns order """
+    def insert(self, cursor, componant, entry):
+        cursor.execute("INSERT INTO " + self._table(componant) + " (`UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s)", entry)
+
+
+    """ Method to add entries to several componants. Takes in the cursor and a list of (componant, entry) pairs """
+    def insertMany(self, cursor, entries):
+        for componant, entry in entries:
+            self.insert(cursor, componant, entry)
+
+
+    """ Method to change the description of a ticket owned by an email """
+    def updateDescription(self, cursor, componant, ticket, email, description):
+        cursor.execute("UPDATE " + self._table(componant) + " SET `description` = %s WHERE (`ticket` = %s AND `email` = %s);", (description, ticket, email,))
+
+
+    """ Method to set the position of an entry """
+    def setPosition(self, cursor, componant, UUID, position):
+        cursor.execute("UPDATE " + self._table(componant) + " SET `position` = %s WHERE (`UUID` = %s)", (position, UUID,))
+
+
+    """ Method to remove an entry """
+    def delete(self, cursor, componant, UUID):
+        cursor.execute("DELETE FROM " + self._table(componant) + " WHERE `UUID` = %s", (UUID,))
+
+
+    """ Method to remove every entry from the given componants """
+    def emptyAll(self, cursor, componants):
+        for componant in componants:
+            cursor.execute("DELETE FROM " + self._table(componant))
+
+
+
+class SingleTableQueueStore:
+
+    """ Method to load the names of all componants from the `Componants` table. Returns a list of names """
+    def loadNames(self, cursor):
+        cursor.execute("SELECT name FROM `Componants`")
+        return [c[0] for c in cursor.fetchall()]
+
+    def entries(self, cursor, componant, simple):
+        columns = ["email", "ticket", "position"] if simple else queueColumns
+        cursor.execute("SELECT " + ", ".join("`" + c + "`" for c in columns) + " FROM `queueEntries` WHERE `componant` = %s ORDER BY position", (componant,))
+        return list(columns), cursor.fetchall()
+
+    def countTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        lock = " FOR UPDATE" if forUpdate else ""
+        if email is None:
+            cursor.execute("SELECT COUNT(*) FROM `queueEntries` WHERE (`componant` = %s AND `ticket` = %s)" + lock, (componant, ticket,))
+        else:
+            cursor.execute("SELECT COUNT(*) FROM `queueEntries` WHERE (`componant` = %s AND `ticket` = %s AND `email` = %s)" + lock, (componant, ticket, email,))
+        return cursor.fetchall()[0][0]
+
+    def tail(self, cursor, componant, forUpdate=False):
+        cursor.execute("SELECT COALESCE(MAX(position), 0), COUNT(*) - SUM(position = 0) FROM `queueEntries` WHERE `componant` = %s" + (" FOR UPDATE" if forUpdate else ""), (componant,))
+        row = cursor.fetchall()[0]
+        return row[0], int(row[1] or 0)
+
+    def rank(self, cursor, componant, position, forUpdate=False):
+        cursor.execute("SELECT COUNT(*) FROM `queueEntries` WHERE (`componant` = %s AND `position` > 0 AND `position` < %s)" + (" FOR UPDATE" if forUpdate else ""), (componant, position,))
+        return cursor.fetchall()[0][0] + 1
+
+    def lockTail(self, cursor, componant):
+        cursor.execute("SELECT UUID FROM `queueEntries` WHERE `componant` = %s ORDER BY position DESC LIMIT 1 FOR UPDATE", (componant,))
+        cursor.fetchall()
+
+    def findTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        lock = " FOR UPDATE" if forUpdate else ""
+        if email is None:
+            cursor.execute("SELECT UUID, position, teamName, opened, ticket FROM `queueEntries` WHERE (`componant` = %s AND `ticket` = %s)" + lock, (componant, ticket,))
+        else:
+            cursor.execute("SELECT UUID, position, teamName, opened, ticket FROM `queueEntries` WHERE (`componant` = %s AND `email` = %s AND `ticket` = %s)" + lock, (componant, email, ticket,))
+        return cursor.fetchall()
+
+    def head(self, cursor, componant, forUpdate=False):
+        lock = " FOR UPDATE" if forUpdate else ""
+        cursor.execute("SELECT position, email FROM `queueEntries` WHERE (`componant` = %s AND (`position` = 0 OR `position` = (SELECT MIN(position) FROM `queueEntries` WHERE `componant` = %s AND `position` > 0" + lock + "))) ORDER BY position" + lock, (componant, componant,))
+        return cursor.fetchall()
+
+    def insert(self, cursor, componant, entry):
+        cursor.execute("INSERT INTO `queueEntries` (`componant`, `UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", (componant,) + tuple(entry))
+
+    def insertMany(self, cursor, entries):
+        cursor.executemany("INSERT INTO `queueEntries` (`componant`, `UUID`, `ticket`, `description`, `email`, `teamName`, `opened`, `position`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", [(componant,) + tuple(entry) for componant, entry in entries])
+
+    def updateDescription(self, cursor, componant, ticket, email, description):
+        cursor.execute("UPDATE `queueEntries` SET `description` = %s WHERE (`componant` = %s AND `ticket` = %s AND `email` = %s);", (description, componant, ticket, email,))
+
+    def setPosition(self, cursor, componant, UUID, position):
+        cursor.execute("UPDATE `queueEntries` SET `position` = %s WHERE (`UUID` = %s)", (position, UUID,))
+
+    def delete(self, cursor, componant, UUID):
+        cursor.execute("DELETE FROM `queueEntries` WHERE `UUID` = %s", (UUID,))
+
+    def emptyAll(self, cursor, componants):
+        cursor.execute("DELETE FROM `queueEntries`")
+
+
+
+""" Method to build the queue store selected by config.queueStorage. Takes in the config module. Returns a queue store """
+def createQueueStore(config):
+    if config.queueStorage == "singleTable":
+        return SingleTableQueueStore()
+    elif config.queueStorage == "perTable":
+        return PerTableQueueStore(config.nonQueueTables + statsTables + authTables)
+    else:
+        raise ValueError("Unknown queueStorage " + str(config.queueStorage))
@@ -0,0 +1,80 @@
+import threading
+from collections import deque
+from datetime import timedelta
+
+
+
+""" In memory model of how long each componant's queue takes to move on by one entry. A turn runs from when an entry could start releasing, the later of it being opened and the previous release leaving the queue, until it exits. The model keeps the last `window` turns per componant and estimates a turn as their median, so one forgotten ticket doesn't skew it. Takes in the window size """
+class ReleaseModel:
+
+    def __init__(self, window):
+        self.window = window
+
+        self._turns = {}
+        self._lastRelease = {}
+        self._releasing = {}
+        self._lock = threading.Lock()
+
+
+    """ Method to seed the model from masterQueue. masterQueue doesn't say which entries released, so every closed entry counts as a turn. Takes in (componant, opened, closed) rows """
+    def load(self, rows):
+        with self._lock:
+            self._turns.clear()
+            self._lastRelease.clear()
+            self._releasing.clear()
+            for componant, opened, closed in sorted((r for r in rows if r[2] is not None), key=lambda r: r[2]):
+                self._add(componant, opened, closed)
+
+
+    """ Method to record an entry starting to release. Lets the estimate for whoever is next count from then rather than from the previous release, in case the queue sat idle in between. Takes in the componant and the time """
+    def recordReleasing(self, componant, at):
+        with self._lock:
+            self._releasing[componant] = at
+
+
+    """ Method to record an entry leaving a queue. Only entries that were releasing count as turns. Takes in the componant, when the entry was opened and closed and whether it was releasing """
+    def recordExit(self, componant, opened, closed, released):
+        if released:
+            with self._lock:
+                self._add(componant, opened, closed)
+
+
+    def _add(self, componant, opened, closed):
+        lastRelease = self._lastRelease.get(componant)
+        started = max(opened, lastRelease) if lastRelease is not None else opened
+        self._turns.setdefault(componant, deque(maxlen=self.window)).append(max(0, (closed - started).total_seconds()))
+        self._lastRelease[componant] = closed
+
+
+    """ Method to get a componant's typical turn. Returns seconds, or None if no turns have been seen """
+    def turnSeconds(self, componant):
+        with self._lock:
+            turns = sorted(self._turns.get(componant, ()))
+        if not turns:
+            return None
+        middle = len(turns) // 2
+        return turns[middle] if len(turns) % 2 else (turns[middle - 1] + turns[middle]) / 2
+
+
+    """ Method to add an estimatedRelease to ranked checkQueue entries. An entry of rank n can start once whoever is releasing finishes their turn, counted from when they started releasing or the previous release left, and n - 1 more turns have passed. Entries already releasing, and every entry if the componant has no turns yet, get None. Takes in the componant, the entries as returned by rankEntries and the current time. Returns the same list """
+    def annotate(self, componant, entries, now):
+        turn = self.turnSeconds(componant)
+
+        if turn is None:
+            for e in entries:
+                e['estimatedRelease'] = None
+            return entries
+
+        with self._lock:
+            started = max((t for t in (self._lastRelease.get(componant), self._releasing.get(componant)) if t is not None), default=None)
+
+        current = 0
+        if any(e['position'] == "Releasing" for e in entries):
+            current = turn if started is None else max(0, turn - (now - started).total_seconds())
+
+        for e in entries:
+            if e['position'] == "Releasing":
+                e['estimatedRelease'] = None
+            else:
+                e['estimatedRelease'] = (now + timedelta(seconds=current + (e['position'] - 1) * turn)).replace(microsecond=0)
+        return entries
@@ -0,0 +1,37 @@
+""" Rebuild queue state from the audit journal (see journal.py) without touching the database.
+
+Usage:
+    python replayJournal.py <journal> queue <componant> [--until <time>]   Print a componant's queue, ranked as checkQueue shows it
+    python replayJournal.py <journal> queues [--until <time>]              Print every componant's queue
+    python replayJournal.py <journal> masterQueue [--until <time>]         Print masterQueue as NDJSON, one row per line
+
+<time> is an ISO date and time such as 2024-03-01T17:30:00. Records appended after it are ignored, giving the state as of that moment.
+"""
+import sys, json
+from datetime import datetime
+from journal import replay
+from queueStore import rankEntries
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    until = None
+    if "--until" in args:
+        index = args.index("--until")
+        until = datetime.fromisoformat(args[index + 1])
+        del args[index:index + 2]
+
+    if len(args) < 2 or args[1] not in ("queue", "queues", "masterQueue") or (args[1] == "queue" and len(args) < 3):
+        print(__doc__)
+        sys.exit(1)
+
+    with open(args[0]) as file:
+        queues, history = replay(file, until)
+
+    if args[1] == "queue":
+        print(json.dumps(rankEntries(queues.get(args[2].lower(), [])), indent=4))
+    elif args[1] == "queues":
+        print(json.dumps({c: rankEntries(entries) for c, entries in sorted(queues.items())}, indent=4))
+    else:
+        for row in sorted(history.values(), key=lambda r: (r['opened'], r['UUID'])):
+            print(json.dumps(row))
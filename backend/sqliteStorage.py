@@ -0,0 +1,242 @@
+import sqlite3
+from datetime import datetime, date
+from storage import SQLStorage
+from queueStore import SingleTableQueueStore
+
+
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+
+schema = """
+CREATE TABLE IF NOT EXISTS `Users` (
+    `UUID` VARCHAR(32) NOT NULL PRIMARY KEY,
+    `firstName` VARCHAR(45),
+    `lastName` VARCHAR(45),
+    `email` VARCHAR(100) NOT NULL,
+    `password` VARCHAR(255),
+    `team` VARCHAR(45),
+    `isAdmin` TINYINT NOT NULL DEFAULT 0,
+    `isDisabled` TINYINT NOT NULL DEFAULT 1,
+    `bypassCodeFreeze` TINYINT NOT NULL DEFAULT 0,
+    `approvedBy` VARCHAR(100),
+    `activationToken` VARCHAR(32)
+);
+CREATE INDEX IF NOT EXISTS `usersEmail` ON `Users` (`email`);
+
+CREATE TABLE IF NOT EXISTS `masterQueue` (
+    `UUID` VARCHAR(32) NOT NULL PRIMARY KEY,
+    `ticket` VARCHAR(45) NOT NULL,
+    `description` VARCHAR(400),
+    `componant` VARCHAR(64) NOT NULL,
+    `email` VARCHAR(100) NOT NULL,
+    `teamName` VARCHAR(45),
+    `active` TINYINT NOT NULL,
+    `opened` DATETIME NOT NULL,
+    `closed` DATETIME,
+    `reasonClosed` VARCHAR(100)
+);
+CREATE INDEX IF NOT EXISTS `openedUUID` ON `masterQueue` (`opened`, `UUID`);
+
+CREATE TABLE IF NOT EXISTS `CodeFreezes` (
+    `UUID` VARCHAR(32) NOT NULL PRIMARY KEY,
+    `begins` DATE NOT NULL,
+    `duration` INT NOT NULL,
+    `ends` DATE NOT NULL,
+    `inEffect` TINYINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS `Componants` (
+    `name` VARCHAR(64) NOT NULL PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS `queueEntries` (
+    `UUID` VARCHAR(32) NOT NULL PRIMARY KEY,
+    `componant` VARCHAR(64) NOT NULL,
+    `ticket` VARCHAR(45) NOT NULL,
+    `description` VARCHAR(400),
+    `email` VARCHAR(100) NOT NULL,
+    `teamName` VARCHAR(45),
+    `opened` DATETIME NOT NULL,
+    `position` INT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS `componantPosition` ON `queueEntries` (`componant`, `position`);
+CREATE UNIQUE INDEX IF NOT EXISTS `componantTicket` ON `queueEntries` (`componant`, `ticket`);
+
+CREATE TABLE IF NOT EXISTS `queueWaitStats` (
+    `componant` VARCHAR(64) NOT NULL,
+    `day` DATE NOT NULL,
+    `teamName` VARCHAR(45) NOT NULL,
+    `bucket` INT NOT NULL,
+    `exits` INT NOT NULL,
+    `waitSeconds` BIGINT NOT NULL,
+    PRIMARY KEY (`componant`, `day`, `teamName`, `bucket`)
+);
+CREATE INDEX IF NOT EXISTS `waitStatsDay` ON `queueWaitStats` (`day`);
+
+CREATE TABLE IF NOT EXISTS `queueExitReasons` (
+    `componant` VARCHAR(64) NOT NULL,
+    `day` DATE NOT NULL,
+    `reasonClosed` VARCHAR(100) NOT NULL,
+    `exits` INT NOT NULL,
+    PRIMARY KEY (`componant`, `day`, `reasonClosed`)
+);
+CREATE INDEX IF NOT EXISTS `exitReasonsDay` ON `queueExitReasons` (`day`);
+
+CREATE TABLE IF NOT EXISTS `TokenRevocations` (
+    `email` VARCHAR(100) NOT NULL PRIMARY KEY,
+    `revokedAt` DOUBLE NOT NULL
+);
+"""
+
+
+writeStatements = ("INSERT", "UPDATE", "DELETE")
+
+
+
+""" Cursor taking the %s placeholders the rest of the code is written with. The first write of a transaction takes the database's write lock """
+class SQLiteCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def _prepare(self, query):
+        if query.lstrip()[:6].upper() in writeStatements:
+            self.connection.begin()
+        return query.replace("%s", "?")
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._prepare(query), params)
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(self._prepare(query), rows)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+
+""" Connection with the parts of the mysql.connector interface the pool and endpoints use """
+class SQLiteConnection:
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    """ Method to start a transaction holding the write lock, if one isn't already open. Stands in for SELECT ... FOR UPDATE """
+    def begin(self):
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN IMMEDIATE")
+
+    def cursor(self):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+    def is_connected(self):
+        return True
+
+
+
+""" Single table queue store for SQLite. SQLite has no row locks, so the locking reads take the whole database's write lock instead """
+class SQLiteQueueStore(SingleTableQueueStore):
+
+    def lockTail(self, cursor, componant):
+        cursor.connection.begin()
+
+    def findTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        if forUpdate:
+            cursor.connection.begin()
+        return SingleTableQueueStore.findTicket(self, cursor, componant, ticket, email)
+
+    def countTicket(self, cursor, componant, ticket, email=None, forUpdate=False):
+        if forUpdate:
+            cursor.connection.begin()
+        return SingleTableQueueStore.countTicket(self, cursor, componant, ticket, email)
+
+    def tail(self, cursor, componant, forUpdate=False):
+        if forUpdate:
+            cursor.connection.begin()
+        return SingleTableQueueStore.tail(self, cursor, componant)
+
+    def rank(self, cursor, componant, position, forUpdate=False):
+        if forUpdate:
+            cursor.connection.begin()
+        return SingleTableQueueStore.rank(self, cursor, componant, position)
+
+    def head(self, cursor, componant, forUpdate=False):
+        if forUpdate:
+            cursor.connection.begin()
+        return SingleTableQueueStore.head(self, cursor, componant)
+
+
+
+""" Storage in a SQLite file at config.sqlitePath. The tables are created if they don't exist and componants are listed in `Componants` """
+class SQLiteStorage(SQLStorage):
+
+    today = "date('now', 'localtime')"
+    daysAgo = "date('now', 'localtime', '-' || %s || ' days')"
+
+    def __init__(self, config):
+        SQLStorage.__init__(self, SQLiteQueueStore())
+        self.path = config.sqlitePath
+
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA journal_mode = WAL")
+        db.executescript(schema)
+        db.close()
+
+
+    """ Method to open a connection to the database file. Returns the connection, or False if the file can't be opened """
+    def connect(self):
+        try:
+            return SQLiteConnection(sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES))
+        except sqlite3.Error:
+            return False
+
+
+    def isDuplicate(self, err):
+        return isinstance(err, sqlite3.IntegrityError)
+
+
+    def isDuplicateID(self, err):
+        return self.isDuplicate(err) and str(err).endswith(".UUID")
+
+
+    def isRetryable(self, err):
+        return isinstance(err, sqlite3.OperationalError) and "locked" in str(err)
+
+
+    def describe(self, cursor, table):
+        cursor.execute("PRAGMA table_info(`" + table + "`)")
+        return [n[1] for n in cursor.fetchall()]
+
+
+    """ SQLite doesn't enforce VARCHAR lengths, so no column is too narrow """
+    def columnWidth(self, cursor, table, column):
+        return None
+
+
+    def addOnConflict(self, keys, counters):
+        return " ON CONFLICT (" + ", ".join("`" + k + "`" for k in keys) + ") DO UPDATE SET " + ", ".join("`" + c + "` = `" + c + "` + excluded.`" + c + "`" for c in counters)
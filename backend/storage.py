@@ -0,0 +1,241 @@
+""" Storage backends for the API. Every backend exposes the same methods, each taking the cursor from getStarted as its first argument, so the endpoints never build SQL themselves.
+
+    mysql   MySQLStorage in mysqlStorage.py. The production backend
+    sqlite  SQLiteStorage in sqliteStorage.py. A single file database for local runs and small deployments
+    memory  MemoryStorage in memoryStorage.py. Dicts and deques held in the process, for tests and benchmarks
+
+Besides the methods below a backend has connect(), returning a new connection or False, isDuplicate(err), isDuplicateID(err) and isRetryable(err) to classify errors raised inside a transaction, columnWidth(cursor, table, column) giving the most characters a column holds or None if unlimited, and queues, the queue store (see queueStore.py). The /queueStats rollup tables are described in queueStats.py """
+from queueStore import SingleTableQueueStore
+
+userColumns = ["UUID", "firstName", "lastName", "email", "password", "team", "isAdmin", "isDisabled", "bypassCodeFreeze", "approvedBy", "activationToken"]
+masterQueueColumns = ["UUID", "ticket", "description", "componant", "email", "teamName", "active", "opened", "closed", "reasonClosed"]
+codeFreezeColumns = ["UUID", "begins", "duration", "ends", "inEffect"]
+
+
+
+""" Raised by backends without a database driver when a unique key would be broken. Takes in a message and the column that clashed """
+class DuplicateEntry(Exception):
+    def __init__(self, message, key):
+        Exception.__init__(self, message)
+        self.key = key
+
+
+
+""" The SQL shared by the database backends. Subclasses provide connect, isDuplicate, isDuplicateID, isRetryable, describe, columnWidth and addOnConflict, and set today and daysAgo to their dialect's expressions for the current date and the date %s days ago """
+class SQLStorage:
+
+    today = None
+    daysAgo = None
+
+    def __init__(self, queues):
+        self.queues = queues
+        self._columns = {}
+
+
+    """ Method to get a table's column names. The table is only described the first time it is seen, so a restart is needed after its columns change. Returns a list of names """
+    def columns(self, cursor, table):
+        names = self._columns.get(table)
+        if names is None:
+            names = self.describe(cursor, table)
+            self._columns[table] = names
+        return names
+
+
+    """ Method to register a new componant. Only possible when componants are listed in the `Componants` table. Returns a boolean indicating if the componant was added """
+    def addComponant(self, cursor, name):
+        if isinstance(self.queues, SingleTableQueueStore):
+            cursor.execute("INSERT INTO `Componants` (`name`) VALUES (%s)", (name,))
+            return True
+        return False
+
+
+    def _userFilter(self, email, isAdmin, password):
+        conditions = []
+        queryData = []
+        for column, value in (("email", email), ("isAdmin", isAdmin), ("password", password)):
+            if value is not None:
+                conditions.append("`" + column + "` = %s")
+                queryData.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), tuple(queryData)
+
+
+    """ Method to count users, optionally only those with an email or admin flag. Returns an int """
+    def countUsers(self, cursor, email=None, isAdmin=None):
+        where, queryData = self._userFilter(email, isAdmin, None)
+        cursor.execute("SELECT COUNT(*) FROM `Users`" + where, queryData)
+        return cursor.fetchall()[0][0]
+
+
+    """ Method to find users, optionally only those with an email, admin flag or password hash. Returns a list of rows holding the given fields """
+    def findUsers(self, cursor, fields, email=None, isAdmin=None, password=None):
+        where, queryData = self._userFilter(email, isAdmin, password)
+        cursor.execute("SELECT " + ", ".join("`" + f + "`" for f in fields) + " FROM `Users`" + where, queryData)
+        return cursor.fetchall()
+
+
+    """ Method to add a user. Takes in the cursor and a dictionary of column to value """
+    def addUser(self, cursor, values):
+        cursor.execute("INSERT INTO `Users` (" + ", ".join("`" + c + "`" for c in values) + ") VALUES (" + ", ".join(["%s"] * len(values)) + ")", tuple(values.values()))
+
+
+    """ Method to change the users with an email, optionally only if their password hash is still the given one. Takes in the cursor, the email, a dictionary of column to value and optionally the password hash """
+    def updateUser(self, cursor, email, values, password=None):
+        where, queryData = self._userFilter(email, None, password)
+        cursor.execute("UPDATE `Users` SET " + ", ".join("`" + c + "` = %s" for c in values) + where, tuple(values.values()) + queryData)
+
+
+    def deleteUser(self, cursor, UUID):
+        cursor.execute("DELETE FROM `Users` WHERE (`UUID` = %s)", (UUID,))
+
+
+    """ Method to persist a token revocation, replacing any earlier one for the email and dropping those every token has outlived. Takes in the cursor, the email, when its tokens were revoked and the time before which revocations can be dropped, both in seconds since the epoch """
+    def revokeTokens(self, cursor, email, revokedAt, expiredBefore):
+        cursor.execute("DELETE FROM `TokenRevocations` WHERE (`email` = %s OR `revokedAt` < %s)", (email, expiredBefore,))
+        cursor.execute("INSERT INTO `TokenRevocations` (`email`, `revokedAt`) VALUES (%s, %s)", (email, revokedAt,))
+
+
+    """ Method to get the token revocations made since a time in seconds since the epoch. Returns a list of (email, revokedAt) rows """
+    def tokenRevocations(self, cursor, since):
+        cursor.execute("SELECT `email`, `revokedAt` FROM `TokenRevocations` WHERE `revokedAt` >= %s", (since,))
+        return cursor.fetchall()
+
+
+    """ Method to add entries to masterQueue. Takes in the cursor and a list of (UUID, ticket, description, componant, email, teamName, active, opened) tuples """
+    def addHistory(self, cursor, rows):
+        cursor.executemany("INSERT INTO `masterQueue` (`UUID`, `ticket`, `description`, `componant`, `email`, `teamName`, `active`, `opened`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", rows)
+
+
+    """ Method to mark a masterQueue entry as closed """
+    def closeHistory(self, cursor, UUID, closed, reason):
+        cursor.execute("UPDATE `masterQueue` SET `active` = 0, `closed` = %s, `reasonClosed` = %s WHERE (`UUID` = %s)", (closed, reason, UUID,))
+
+
+    """ Method to mark several masterQueue entries as closed. Takes in the cursor and a list of (closed, reason, UUID) tuples """
+    def closeHistoryMany(self, cursor, rows):
+        cursor.executemany("UPDATE `masterQueue` SET `active` = 0, `closed` = %s, `reasonClosed` = %s WHERE (`UUID` = %s)", rows)
+
+
+    """ Method to get masterQueue entries, optionally only those opened in the last daysBack days, ordered by opened or by componant then opened. Returns a list of rows holding the given columns """
+    def history(self, cursor, names, daysBack, byComponant):
+        query = "SELECT " + ", ".join("`" + n + "`" for n in names) + " FROM `masterQueue`"
+        queryData = ()
+
+        if daysBack:
+            query += " WHERE `opened` >= " + self.daysAgo
+            queryData = (daysBack,)
+
+        query += " ORDER BY componant, opened" if byComponant else " ORDER BY opened"
+
+        cursor.execute(query, queryData)
+        return cursor.fetchall()
+
+
+    """ Method to get a page of masterQueue entries in (opened, UUID) order. Takes in the cursor, the columns to return, a dictionary of column to value filters, an optional daysBack, the (opened, UUID) of the last entry already returned or None, whether to return newest first and the number of rows to return. Returns a list of rows """
+    def historyPage(self, cursor, names, filters, daysBack, after, newestFirst, limit):
+        conditions = ["`" + column + "` = %s" for column in filters]
+        queryData = list(filters.values())
+
+        if daysBack is not None:
+            conditions.append("`opened` >= " + self.daysAgo)
+            queryData.append(daysBack)
+
+        if after is not None:
+            comparison = "<" if newestFirst else ">"
+            conditions.append("(`opened` " + comparison + " %s OR (`opened` = %s AND `UUID` " + comparison + " %s))")
+            queryData += [after[0], after[0], after[1]]
+
+        query = "SELECT " + ", ".join("`" + n + "`" for n in names) + " FROM `masterQueue`"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY opened DESC, UUID DESC" if newestFirst else " ORDER BY opened, UUID"
+        query += " LIMIT %s"
+        queryData.append(limit)
+
+        cursor.execute(query, tuple(queryData))
+        return cursor.fetchall()
+
+
+    """ Method to read every masterQueue entry in (opened, UUID) order without holding them all in memory. Returns a generator of lists of at most batchSize rows """
+    def historyBatches(self, cursor, names, batchSize):
+        cursor.execute("SELECT " + ", ".join("`" + n + "`" for n in names) + " FROM `masterQueue` ORDER BY opened, UUID")
+        while True:
+            rows = cursor.fetchmany(batchSize)
+            if not rows:
+                return
+            yield rows
+
+
+    """ Method to remove every entry from the given componants, all of masterQueue and the /queueStats rollups built from it """
+    def emptyAll(self, cursor, componants):
+        self.queues.emptyAll(cursor, componants)
+        cursor.execute("DELETE FROM `masterQueue`")
+        cursor.execute("DELETE FROM `queueWaitStats`")
+        cursor.execute("DELETE FROM `queueExitReasons`")
+
+
+    """ Method to add a closed entry to the /queueStats rollups. Takes in the cursor, the componant, the day it closed as "YYYY-MM-DD", its team, the reason it closed, its wait bucket (see queueStats.py) and its wait in seconds """
+    def recordExit(self, cursor, componant, day, teamName, reason, bucket, waitSeconds):
+        cursor.execute("INSERT INTO `queueWaitStats` (`componant`, `day`, `teamName`, `bucket`, `exits`, `waitSeconds`) VALUES (%s, %s, %s, %s, 1, %s)" + self.addOnConflict(["componant", "day", "teamName", "bucket"], ["exits", "waitSeconds"]), (componant, day, teamName or "", bucket, waitSeconds))
+        cursor.execute("INSERT INTO `queueExitReasons` (`componant`, `day`, `reasonClosed`, `exits`) VALUES (%s, %s, %s, 1)" + self.addOnConflict(["componant", "day", "reasonClosed"], ["exits"]), (componant, day, reason or ""))
+
+
+    """ Method to read the /queueStats rollups, optionally only for the last daysBack days and one componant. Returns a list of (componant, day, teamName, bucket, exits, waitSeconds) rows and a list of (reasonClosed, exits) rows """
+    def queueStats(self, cursor, daysBack, componant):
+        conditions = []
+        queryData = []
+        if daysBack is not None:
+            conditions.append("`day` >= " + self.daysAgo)
+            queryData.append(daysBack)
+        if componant is not None:
+            conditions.append("`componant` = %s")
+            queryData.append(componant)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        cursor.execute("SELECT `componant`, `day`, `teamName`, `bucket`, `exits`, `waitSeconds` FROM `queueWaitStats`" + where, tuple(queryData))
+        waitRows = cursor.fetchall()
+        cursor.execute("SELECT `reasonClosed`, SUM(`exits`) FROM `queueExitReasons`" + where + " GROUP BY `reasonClosed`", tuple(queryData))
+        return waitRows, cursor.fetchall()
+
+
+    """ Method to add a code freeze. Takes in the cursor and a (UUID, begins, duration, ends, inEffect) tuple """
+    def addCodeFreeze(self, cursor, freeze):
+        cursor.execute("INSERT INTO `CodeFreezes` (`UUID`, `begins`, `duration`, `ends`, `inEffect`) VALUES (%s, %s, %s, %s, %s)", freeze)
+
+
+    """ Method to end every code freeze in effect. Their end date becomes yesterday so they can't be put back into effect """
+    def endActiveCodeFreezes(self, cursor):
+        cursor.execute("UPDATE `CodeFreezes` SET `inEffect` = 0, `ends` = " + self.daysAgo + " WHERE `inEffect` = 1", (1,))
+
+
+    """ Method to put code freezes covering today into effect and take those that ended before today out of it. Freezes that began on a day this didn't run, such as while the process was down, are caught up too """
+    def updateCodeFreezes(self, cursor):
+        cursor.execute("UPDATE `CodeFreezes` SET `inEffect` = 1 WHERE begins <= " + self.today + " AND ends >= " + self.today + " AND inEffect = 0")
+        cursor.execute("UPDATE `CodeFreezes` SET `inEffect` = 0 WHERE ends < " + self.today + " AND inEffect = 1")
+
+
+    """ Method to get code freezes, either all of them, only those in effect or only those yet to start. Returns a list of rows holding the given columns """
+    def codeFreezes(self, cursor, names, activeOnly, futureOnly):
+        query = "SELECT " + ", ".join("`" + n + "`" for n in names) + " FROM `CodeFreezes`"
+        query += " WHERE `inEffect` = 1" if activeOnly else " WHERE (`begins` > " + self.today + " AND `inEffect` = 0)" if futureOnly else ""
+        cursor.execute(query)
+        return cursor.fetchall()
+
+
+    def deleteCodeFreeze(self, cursor, UUID):
+        cursor.execute("DELETE FROM `CodeFreezes` WHERE (`UUID` = %s)", (UUID,))
+
+
+
+""" Method to build the storage backend selected by config.storageBackend. Backends are imported here so only the selected one's driver needs to be installed. Takes in the config module. Returns a storage backend """
+def createStorage(config):
+    if config.storageBackend == "mysql":
+        from mysqlStorage import MySQLStorage
+        return MySQLStorage(config)
+    elif config.storageBackend == "sqlite":
+        from sqliteStorage import SQLiteStorage
+        return SQLiteStorage(config)
+    elif config.storageBackend == "memory":
+        from memoryStorage import MemoryStorage
+        return MemoryStorage()
+    else:
+        raise ValueError("Unknown storageBackend " + str(config.storageBackend))